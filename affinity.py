@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from cohort_engine import day_numbers
+
+# Mínimo padrão de cestas em que um par de produtos aparece junto para entrar na análise
+DEFAULT_MIN_BASKETS = 10
+
+# Limite de entradas de cada bloco da matriz de coocorrência (produtos do bloco x todos os produtos)
+BLOCK_ENTRIES = 20_000_000
+
+
+# Afinidade entre produtos (market basket): matriz esparsa cesta x produto (CSR, 1 se o produto está na cesta)
+# Cesta = cliente (todas as compras) ou pedido (cliente + dia); vendas sem cliente ou sem produto são ignoradas
+class ProductAffinity:
+    def __init__(self, customer_ids, products, dates=None):
+        customer_ids = pd.Series(customer_ids).reset_index(drop=True)
+        products = pd.Series(products).reset_index(drop=True)
+        clientes, self.customers = pd.factorize(customer_ids)
+        produtos, self.products = pd.factorize(products)
+        validas = (clientes >= 0) & (produtos >= 0)
+        clientes = clientes[validas]
+        produtos = produtos[validas]
+
+        # Código da cesta de cada venda e cliente de cada cesta
+        if dates is None:
+            cestas = clientes
+            self.basket_customer = np.arange(len(self.customers))
+        else:
+            dias = day_numbers(np.asarray(dates, dtype='datetime64[ns]'))[validas].astype(np.int64)
+            primeiro = int(dias.min()) if len(dias) else 0
+            amplitude = (int(dias.max()) - primeiro + 1) if len(dias) else 1
+            chaves, cestas = np.unique(clientes.astype(np.int64) * amplitude + (dias - primeiro), return_inverse=True)
+            self.basket_customer = chaves // amplitude
+
+        # Matriz binária: produtos repetidos na mesma cesta contam uma vez
+        self.matrix = sp.csr_matrix(
+            (np.ones(len(cestas), dtype=np.int32), (cestas, produtos)),
+            shape=(len(self.basket_customer), len(self.products))
+        )
+        self.matrix.sum_duplicates()
+        self.matrix.data[:] = 1
+
+    @property
+    def baskets(self):
+        return self.matrix.shape[0]
+
+    # Cestas de cada segmento (rotulos: Series indexada pelo ID do cliente)
+    def basket_mask(self, rotulos, valor):
+        return rotulos.reindex(self.customers).to_numpy()[self.basket_customer] == valor
+
+    # Pares de produtos com suporte, confiança e lift, calculados por produtos de matrizes esparsas (X^T X)
+    # em blocos de produtos, com memória limitada: produtos abaixo do mínimo de cestas não formam pares
+    # frequentes e são descartados antes, e cada bloco guarda só os `limite` melhores pares
+    # linhas: máscara das cestas consideradas (ex.: um segmento RFM); ordenar_por: 'Lift' ou 'Cestas'
+    def pairs(self, linhas=None, min_cestas=DEFAULT_MIN_BASKETS, limite=100, ordenar_por='Lift'):
+        matriz = self.matrix if linhas is None else self.matrix[np.asarray(linhas)]
+        n = matriz.shape[0]
+        contagem = np.asarray(matriz.sum(axis=0)).ravel()
+        frequentes = np.flatnonzero(contagem >= min_cestas)
+
+        # Só cestas com pelo menos dois produtos frequentes geram pares
+        matriz = matriz.tocsc()[:, frequentes].tocsr()
+        matriz = matriz[np.diff(matriz.indptr) >= 2]
+        transposta = matriz.T.tocsr()
+        contagem = contagem[frequentes]
+        m = len(frequentes)
+        bloco = max(1, BLOCK_ENTRIES // max(m, 1))
+
+        melhores = []
+        for inicio in range(0, m, bloco):
+            coocorrencia = (transposta[inicio:inicio + bloco] @ matriz).tocoo()
+            a = coocorrencia.row + inicio
+            b = coocorrencia.col
+            manter = (b > a) & (coocorrencia.data >= min_cestas)
+            a, b, juntos = a[manter], b[manter], coocorrencia.data[manter].astype(np.float64)
+            lift = juntos * n / (contagem[a] * contagem[b])
+            chave = lift if ordenar_por == 'Lift' else juntos
+            if len(chave) > limite:
+                topo = np.argpartition(-chave, limite)[:limite]
+                a, b, juntos, lift = a[topo], b[topo], juntos[topo], lift[topo]
+            melhores.append(pd.DataFrame({'a': a, 'b': b, 'Cestas': juntos, 'Lift': lift}))
+
+        pares = pd.concat(melhores, ignore_index=True) if melhores else pd.DataFrame(columns=['a', 'b', 'Cestas', 'Lift'])
+        pares = pares.sort_values([ordenar_por, 'Cestas' if ordenar_por == 'Lift' else 'Lift'],
+                                  ascending=False).head(limite)
+        a = pares['a'].to_numpy(dtype=np.int64)
+        b = pares['b'].to_numpy(dtype=np.int64)
+        juntos = pares['Cestas'].to_numpy(dtype=np.float64)
+        return pd.DataFrame({
+            'Produto A': self.products[frequentes[a]],
+            'Produto B': self.products[frequentes[b]],
+            'Cestas': juntos.astype(np.int64),
+            'Suporte': juntos / n if n else juntos,
+            'Confiança A→B': juntos / contagem[a],
+            'Confiança B→A': juntos / contagem[b],
+            'Lift': pares['Lift'].to_numpy(dtype=np.float64),
+        })
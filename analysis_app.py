@@ -0,0 +1,1687 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+import os
+import shutil
+import tempfile
+import json
+import hashlib
+import uuid
+from formatting import format_br
+from resource_manager import ANALYSIS_MEMORY_FACTOR, ResourceManager
+from sketches import CustomerSketchStore
+from cohort_engine import average_retention, cohort_matrices, day_numbers, period_index
+from ltv_model import predict_customer_value
+from backends import get_backend
+from ingestion import CHUNK_BYTES, check_size, file_extension, load_sales_files, parse_dates, spool_file
+from data_quality import quality_report
+from customer_index import CustomerIndex
+from job_runner import JobCancelled, JobRunner
+from figure_cache import FigureCache
+from repurchase import RepurchaseTiming
+from concentration import TOP_FRACTIONS, RevenueConcentration
+from affinity import DEFAULT_MIN_BASKETS, ProductAffinity
+from anomalies import DEFAULT_THRESHOLD, detect_anomalies
+from forecast import DEFAULT_HORIZON, MIN_COHORTS_PER_FACTOR, ChainLadderForecast, forecast_table
+from sampling import StratifiedCustomerSample, sample_metrics
+from workspaces import WorkspaceStore, new_access_token, owner_key, valid_access_token
+from survival import (DEFAULT_INACTIVITY_DAYS, kaplan_meier, kaplan_meier_by_group, median_survival,
+                      survival_arrays, survival_at)
+from dimensions import DimensionCube
+from period_comparison import (DailyAggregates, cohort_retention_curve, daily_frame, previous_period,
+                               range_metrics, same_period_last_year)
+
+# Função para construir os sketches de clientes distintos (por dia e por coorte)
+@st.cache_data(show_spinner=False)
+def build_customer_sketches(customer_ids, days, erro_relativo):
+    return CustomerSketchStore(customer_ids, days, erro_relativo)
+
+# Gerenciador de recursos do processo (compartilhado por todas as sessões)
+# Orçamento em ANALISE_MEMORIA_MB e número de análises simultâneas em ANALISE_ANALISES_SIMULTANEAS
+@st.cache_resource(show_spinner=False)
+def get_resource_manager():
+    orcamento_mb = os.environ.get('ANALISE_MEMORIA_MB')
+    return ResourceManager(
+        budget_bytes=int(orcamento_mb) * 1024 ** 2 if orcamento_mb else None,
+        max_concurrent=int(os.environ.get('ANALISE_ANALISES_SIMULTANEAS', 2)),
+        on_evict=forget_session_jobs
+    )
+
+# Esquece os trabalhos da sessão (completo e prévia) quando os dados dela saem da memória: os trabalhos
+# guardam resultados e, enquanto rodam, referências aos DataFrames que a descarga em disco quer soltar
+def forget_session_jobs(sessao):
+    executor = get_job_runner()
+    executor.cancel(sessao)
+    executor.cancel((sessao, 'previa'))
+
+# Motor de agregação configurado (compartilhado por todas as sessões, com as conversões de conjuntos em memória)
+@st.cache_resource(show_spinner=False)
+def get_analysis_backend():
+    return get_backend(ANALYSIS_BACKEND)
+
+# Identificador da sessão do navegador (gerado uma vez por sessão)
+def session_id():
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+# Chave dos arquivos enviados: nome, tamanho e o file_id do Streamlit, único por envio (um novo export com o mesmo
+# nome e o mesmo tamanho não reaproveita os dados do anterior); sem file_id, o hash blake2b do conteúdo inteiro,
+# lido em blocos
+def upload_key(uploaded_files):
+    chaves = []
+    for arquivo in uploaded_files:
+        identificador = getattr(arquivo, 'file_id', None)
+        if identificador is None:
+            resumo = hashlib.blake2b(digest_size=16)
+            arquivo.seek(0)
+            for bloco in iter(lambda: arquivo.read(CHUNK_BYTES), b''):
+                resumo.update(bloco)
+            arquivo.seek(0)
+            identificador = resumo.hexdigest()
+        chaves.append((arquivo.name, arquivo.size, identificador))
+    return tuple(chaves)
+
+# Executor dos trabalhos de análise em segundo plano (compartilhado por todas as sessões)
+# Número de trabalhos simultâneos em ANALISE_TRABALHOS_SIMULTANEOS
+@st.cache_resource(show_spinner=False)
+def get_job_runner():
+    return JobRunner(max_workers=int(os.environ.get('ANALISE_TRABALHOS_SIMULTANEOS', 2)))
+
+# Cache dos gráficos já serializados (compartilhado por todas as sessões)
+# Limite de memória em ANALISE_CACHE_GRAFICOS_MB
+@st.cache_resource(show_spinner=False)
+def get_figure_cache():
+    return FigureCache(max_bytes=int(os.environ.get('ANALISE_CACHE_GRAFICOS_MB', 64)) * 1024 ** 2)
+
+# Armazenamento dos espaços de trabalho (pasta em ANALISE_ESPACOS_DIR; cotas em ANALISE_ESPACOS_COTA_MB
+# por lead e ANALISE_ESPACOS_COTA_TOTAL_MB no total)
+@st.cache_resource(show_spinner=False)
+def get_workspace_store():
+    return WorkspaceStore(
+        root=os.environ.get('ANALISE_ESPACOS_DIR'),
+        owner_quota_bytes=int(os.environ.get('ANALISE_ESPACOS_COTA_MB', 2048)) * 1024 ** 2,
+        total_quota_bytes=int(os.environ.get('ANALISE_ESPACOS_COTA_TOTAL_MB', 20480)) * 1024 ** 2
+    )
+
+# Dono dos espaços de trabalho: uma chave de acesso aleatória por navegador, guardada no link da página
+# (parâmetro WORKSPACE_TOKEN_PARAM); quem tem o link abre os espaços. Sem chave válida no link, uma nova é gerada
+WORKSPACE_TOKEN_PARAM = 'chave'
+
+def workspace_owner():
+    chave = st.query_params.get(WORKSPACE_TOKEN_PARAM)
+    if not valid_access_token(chave):
+        chave = st.session_state.get('workspace_token') or new_access_token()
+        st.query_params[WORKSPACE_TOKEN_PARAM] = chave
+    st.session_state.workspace_token = chave
+    return owner_key(chave)
+
+# Posição de um valor salvo entre as opções de um widget (ou a posição padrão, se ele não existir mais)
+def default_index(opcoes, valor, padrao=0):
+    opcoes = list(opcoes)
+    return opcoes.index(valor) if valor in opcoes else padrao
+
+# Função para construir a tabela de clientes indexada (resumo por cliente + índice CSR das transações)
+# com a coorte de cada cliente e a segmentação RFM
+def build_customer_segments(customer_ids, dates, values, period):
+    indice_clientes = CustomerIndex(customer_ids, dates, values)
+    indice_clientes.add_cohort(period)
+    return indice_clientes, rfm_segmentation(indice_clientes.rfm())
+
+# Etapas do trabalho de análise em segundo plano sobre um conjunto de vendas (completo ou amostra)
+# pesos: peso de cada venda na prévia por amostragem (o gráfico de vendas é escalado para o total estimado)
+# chave: identificador do conteúdo de df, para o motor de agregação reaproveitar a conversão do conjunto
+# diario: inclui a série diária (dispensada quando o cubo de dimensões a responde)
+def analysis_stages(df, filtered_df, start_date, end_date, periodo, analysis_backend, pesos=None, chave=None,
+                    diario=True):
+    df_vendas = df if pesos is None else df.assign(**{'Valor da Venda': df['Valor da Venda'] * pesos})
+    etapas = [
+        ('vendas', "vendas de novos e recorrentes",
+         lambda r: analysis_backend.sales_by_customer_type(df_vendas, start_date, end_date, periodo, chave)),
+        ('coortes', "análise de coorte",
+         lambda r: cohort_matrices(filtered_df['ID do Cliente'], filtered_df['Data da Venda'],
+                                   filtered_df['Valor da Venda'], periodo)),
+        ('clientes', "tabela de clientes e segmentação RFM",
+         lambda r: build_customer_segments(filtered_df['ID do Cliente'], filtered_df['Data da Venda'],
+                                           filtered_df['Valor da Venda'], periodo)),
+        ('recompra', "intervalos entre compras",
+         lambda r: RepurchaseTiming(filtered_df['ID do Cliente'], filtered_df['Data da Venda'])),
+    ]
+    if pesos is None:
+        etapas.insert(0, ('totais', "totais por cliente",
+                          lambda r: analysis_backend.customer_totals(df, start_date, end_date, chave)))
+        if diario:
+            etapas.insert(2, ('diario', "série diária de receita e transações",
+                              lambda r: daily_frame(filtered_df['ID do Cliente'], filtered_df['Data da Venda'],
+                                                    filtered_df['Valor da Venda'])))
+        etapas.insert(len(etapas) - 1, ('concentracao', "concentração de receita (Pareto/ABC)",
+                                        lambda r: RevenueConcentration(r['clientes'][1]['Monetary'])))
+    return etapas
+
+# Espera o resultado de uma etapa do trabalho em segundo plano, atualizando a barra de progresso
+# (uma interação com a página interrompe a espera; o trabalho é cancelado se as entradas mudarem)
+def wait_for_stage(trabalho, etapa, barra):
+    try:
+        while not trabalho.wait(etapa, timeout=0.25):
+            if trabalho.error is not None:
+                raise trabalho.error
+            if trabalho.done:
+                raise KeyError(f"a etapa '{etapa}' não faz parte do trabalho")
+            rotulo = trabalho.current_label() or "preparando"
+            barra.progress(trabalho.progress(), text=f"Calculando em segundo plano: {rotulo}...")
+    except JobCancelled:
+        # Cancelado por uma execução mais recente da página: esta execução está obsoleta
+        st.stop()
+    if trabalho.done:
+        barra.empty()
+    return trabalho.results[etapa]
+
+# Função para construir os agregados diários com somas acumuladas (base do modo de comparação)
+@st.cache_data(show_spinner=False)
+def build_daily_aggregates(customer_ids, dates, values):
+    return DailyAggregates(daily_frame(customer_ids, dates, values))
+
+# Função para calcular as matrizes de coorte do conjunto completo (compartilhadas pelos dois lados da comparação)
+@st.cache_data(show_spinner=False)
+def build_full_cohort_matrices(customer_ids, dates, values, period):
+    return cohort_matrices(customer_ids, dates, values, period)
+
+# Função para construir a matriz esparsa cesta x produto da análise de afinidade (dates=None: cesta = cliente)
+@st.cache_data(show_spinner=False)
+def build_product_affinity(customer_ids, products, dates):
+    return ProductAffinity(customer_ids, products, dates)
+
+# Função para projetar a receita das coortes (tabela por período do calendário e matriz acumulada completa)
+# ages: idade de cada coorte no último período dos dados (None em resultados salvos antes de existir)
+@st.cache_data(show_spinner=False)
+def build_revenue_forecast(cumulative_revenue, horizonte, ultimo_periodo, period, ages=None):
+    previsao = ChainLadderForecast(cumulative_revenue, ages=ages)
+    return (forecast_table(previsao, horizonte, ultimo_periodo, period), previsao.completed(),
+            int(previsao.truncated.sum()))
+
+# Função para construir o cubo de dimensões (códigos das categorias e agregados por combinação e dia)
+@st.cache_data(show_spinner=False)
+def build_dimension_cube(dimensoes, customer_ids, days, values, erro_relativo):
+    return DimensionCube(dimensoes, customer_ids, days, values, erro_relativo)
+
+# Opções de agregação (compartilhadas pelos motores de cálculo)
+AGG_OPTIONS = {
+    "Diário": "D",
+    "Semanal": "W",
+    "Mensal": "M",
+    "Trimestral": "Q",
+    "Anual": "Y"
+}
+
+# Motor de cálculo da análise: "pandas" (padrão) ou "duckdb" (out-of-core, para arquivos CSV/Parquet)
+ANALYSIS_ENGINE = os.environ.get('ANALISE_ENGINE', 'pandas').lower()
+
+# Motor de agregação em DataFrame do caminho pandas: "pandas" (padrão) ou "polars" (LazyFrames, usa todos os núcleos)
+ANALYSIS_BACKEND = os.environ.get('ANALISE_BACKEND', 'pandas').lower()
+
+# Prévia por amostragem: a partir de ANALISE_PREVIA_MIN_LINHAS vendas, uma amostra de clientes com cerca de
+# ANALISE_PREVIA_LINHAS vendas é exibida enquanto o cálculo completo roda em segundo plano
+PREVIEW_MIN_ROWS = int(os.environ.get('ANALISE_PREVIA_MIN_LINHAS', 1_000_000))
+PREVIEW_ROWS = int(os.environ.get('ANALISE_PREVIA_LINHAS', 200_000))
+
+# Gráficos de coorte: os heatmaps mostram as ANALISE_GRAFICO_MAX_COORTES coortes mais recentes e os gráficos de
+# linhas, as ANALISE_GRAFICO_LINHAS_COORTES mais recentes mais a média ponderada de todas as coortes
+CHART_MAX_COHORTS = int(os.environ.get('ANALISE_GRAFICO_MAX_COORTES', 120))
+CHART_LINE_COHORTS = int(os.environ.get('ANALISE_GRAFICO_LINHAS_COORTES', 12))
+AVERAGE_COHORT_LABEL = 'Média (todas as coortes)'
+
+# Limite de tamanho de cada arquivo enviado ou descompactado de um .zip/.gz (em MB, ANALISE_ARQUIVO_MAX_MB)
+UPLOAD_MAX_BYTES = int(os.environ.get('ANALISE_ARQUIVO_MAX_MB', 2048)) * 1024 ** 2
+
+# Métricas principais exatas: contagens de clientes pelos sketches e totais por cliente do motor de agregação
+# diario: série diária já agregada (cubo de dimensões) para a receita e o número de vendas, em vez das vendas filtradas
+def exact_metrics(filtered_df, customer_sketches, start_date, end_date, totais_cliente, diario=None):
+    if diario is None:
+        receita_total = filtered_df['Valor da Venda'].sum()
+        numero_total_vendas = len(filtered_df)
+    else:
+        receita_total = diario['Receita'].sum()
+        numero_total_vendas = int(diario['Vendas'].sum())
+    dia_inicio = np.datetime64(start_date, 'D').astype(np.int32)
+    dia_fim = np.datetime64(end_date, 'D').astype(np.int32)
+    sketch_clientes = customer_sketches.unique_customers(dia_inicio, dia_fim)
+    sketch_novos = customer_sketches.new_customers(dia_inicio, dia_fim)
+    clientes_unicos = sketch_clientes.count()
+    novos_clientes = sketch_novos.count()
+
+    # Cálculos por cliente (apenas para vendas com ID de cliente), no motor de agregação da implantação
+    receita_por_cliente = totais_cliente['Receita']
+    receita_media_cliente = receita_por_cliente.mean()
+    receita_mediana_cliente = receita_por_cliente.median()
+
+    # Ticket médio
+    ticket_medio = receita_total / numero_total_vendas
+
+    # Transações por cliente
+    transacoes_por_cliente = totais_cliente['Transacoes']
+    numero_medio_transacoes = transacoes_por_cliente.mean()
+    numero_mediano_transacoes = transacoes_por_cliente.median()
+
+    return {
+        'receita_total': receita_total,
+        'clientes_unicos': clientes_unicos,
+        'novos_clientes': novos_clientes,
+        'numero_total_vendas': numero_total_vendas,
+        'ticket_medio': ticket_medio,
+        'numero_medio_transacoes': numero_medio_transacoes,
+        'numero_mediano_transacoes': numero_mediano_transacoes,
+        'receita_media_cliente': receita_media_cliente,
+        'receita_mediana_cliente': receita_mediana_cliente,
+        'erro_padrao': None if sketch_clientes.is_exact and sketch_novos.is_exact else customer_sketches.standard_error
+    }
+
+# Exibição das métricas principais e de LTV; devolve a margem de contribuição escolhida
+def render_key_metrics(metricas):
+    st.subheader("Métricas Principais")
+
+    # Na prévia por amostragem, as métricas são estimativas com intervalo de 95% (exibido na ajuda de cada uma)
+    intervalos = metricas.get('intervalos') or {}
+
+    def metrica(rotulo, chave, moeda=False):
+        prefixo = "R$ " if moeda else ""
+        ajuda = None
+        if chave in intervalos:
+            inferior, superior = intervalos[chave]
+            ajuda = f"Estimativa da amostra. Intervalo de 95%: {prefixo}{format_br(inferior)} a {prefixo}{format_br(superior)}"
+        st.metric(rotulo, f"{'≈ ' if intervalos else ''}{prefixo}{format_br(metricas[chave])}", help=ajuda)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        metrica("Receita Total", 'receita_total', moeda=True)
+        metrica("Clientes Únicos", 'clientes_unicos')
+        metrica("Número Total de Vendas", 'numero_total_vendas')
+    with col2:
+        metrica("Ticket Médio por Transação", 'ticket_medio', moeda=True)
+        metrica("Número Médio de Transações por Cliente", 'numero_medio_transacoes')
+        metrica("Número Mediano de Transações por Cliente", 'numero_mediano_transacoes')
+    with col3:
+        metrica("Receita Média por Cliente", 'receita_media_cliente', moeda=True)
+        metrica("Receita Mediana por Cliente", 'receita_mediana_cliente', moeda=True)
+        metrica("Novos Clientes no Período", 'novos_clientes')
+
+    if metricas.get('erro_padrao'):
+        st.caption(f"Contagens de clientes aproximadas (HyperLogLog), erro padrão de ±{metricas['erro_padrao']:.1%}.")
+
+    # Métricas de LTV
+    st.subheader("Métricas de LTV")
+    margem_contribuicao = st.slider("Margem de Contribuição (%)", 0, 100, 50)
+
+    ltv_medio = metricas['receita_media_cliente'] * (margem_contribuicao / 100)
+    ltv_mediano = metricas['receita_mediana_cliente'] * (margem_contribuicao / 100)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("LTV Médio por Cliente", f"R$ {format_br(ltv_medio)}")
+    with col2:
+        st.metric("LTV Mediano por Cliente", f"R$ {format_br(ltv_mediano)}")
+
+    return margem_contribuicao
+
+# Gráfico de vendas (novos vs recorrentes)
+# atipicos: dias atípicos (índice de datas, coluna Tipo), marcados sobre a barra do período que os contém
+def render_sales_chart(sales_agg, aggregation, atipicos=None):
+    st.subheader(f"Vendas: Novos vs Recorrentes ({aggregation})")
+
+    def sales_chart():
+        fig = px.bar(sales_agg, 
+                     x=sales_agg.index, 
+                     y=['Novo', 'Recorrente'], 
+                     title=f'Vendas por {aggregation} (Novos vs Recorrentes)',
+                     labels={'value': 'Valor de Vendas', 'Data da Venda': 'Data'},
+                     barmode='stack')
+        if atipicos is not None and len(atipicos) and len(sales_agg):
+            # Os rótulos dos períodos são o fim de cada período: o período de um dia é o primeiro rótulo >= dia
+            posicoes = np.minimum(sales_agg.index.searchsorted(atipicos.index, side='left'), len(sales_agg) - 1)
+            textos = pd.Series(atipicos['Tipo'].to_numpy() + ' em ' + atipicos.index.strftime('%d/%m/%Y'))
+            marcas = textos.groupby(posicoes).agg('<br>'.join)
+            fig.add_scatter(x=sales_agg.index[marcas.index], y=sales_agg.sum(axis=1).iloc[marcas.index],
+                            mode='markers', marker=dict(color='red', size=11, symbol='x'), name='Dias atípicos',
+                            text=marcas.to_numpy(), hovertemplate='%{text}<extra></extra>')
+        return fig
+
+    entradas_atipicos = atipicos['Tipo'] if atipicos is not None else None
+    fig = get_figure_cache().figure(('vendas', sales_agg, aggregation, entradas_atipicos), sales_chart)
+
+    st.plotly_chart(fig)
+
+# Nomes dos dias da semana (segunda-feira = 0)
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+# Dias atípicos na receita e nas transações diárias: escore robusto (mediana e MAD) contra a linha de base do
+# mesmo dia da semana ou a mediana móvel; devolve os dias atípicos para a marcação no gráfico de vendas
+def render_anomalies(diario):
+    st.subheader("Dias Atípicos")
+    col1, col2 = st.columns(2)
+    with col1:
+        linha_de_base = st.radio("Linha de base", ["Mesmo dia da semana", "Mediana móvel"], horizontal=True)
+    with col2:
+        limiar = st.slider("Escore robusto mínimo para marcar um dia", 2.0, 8.0, DEFAULT_THRESHOLD, 0.5)
+
+    anomalias = detect_anomalies(diario, 'sazonal' if linha_de_base == "Mesmo dia da semana" else 'movel', limiar)
+    atipicos = anomalias[anomalias['Atípico']]
+
+    def anomaly_chart():
+        fig = px.line(anomalias.reset_index(), x='Data', y=['Receita', 'Receita Esperada'],
+                      title='Receita Diária e Linha de Base')
+        fig.add_scatter(x=atipicos.index, y=atipicos['Receita'], mode='markers', name='Dias atípicos',
+                        marker=dict(color='red', size=9), text=atipicos['Tipo'],
+                        hovertemplate='%{text}: R$ %{y:,.2f}<extra></extra>')
+        fig.update_layout(yaxis_title='Receita (R$)', yaxis_tickformat=',.0f')
+        return fig
+
+    st.plotly_chart(get_figure_cache().figure(('anomalias', anomalias[['Receita', 'Receita Esperada', 'Atípico']]),
+                                              anomaly_chart),
+                    use_container_width=True)
+
+    if atipicos.empty:
+        st.caption(f"Nenhum dia atípico em {format_br(len(anomalias))} dias com o escore mínimo de {limiar:.1f}.")
+        return atipicos
+
+    tabela = atipicos[['Tipo', 'Receita', 'Receita Esperada', 'Transações', 'Transações Esperadas']].copy()
+    tabela.insert(0, 'Dia da Semana', [DIAS_SEMANA[d] for d in atipicos.index.dayofweek])
+    tabela.index = tabela.index.strftime('%d/%m/%Y')
+    st.dataframe(tabela.style.format({
+        'Receita': lambda v: f"R$ {format_br(v)}",
+        'Receita Esperada': lambda v: f"R$ {format_br(v)}",
+        'Transações': '{:.0f}',
+        'Transações Esperadas': '{:.0f}',
+    }))
+    st.caption(f"{len(atipicos)} de {format_br(len(anomalias))} dias fora do padrão (picos de receita ou de transações, "
+               "como promoções, e quedas, como dias com importação incompleta). Os dias ficam marcados no gráfico "
+               "de vendas.")
+    return atipicos
+
+# Comparação entre dois intervalos: variação das métricas, receita de novos vs recorrentes e retenção das coortes
+def render_period_comparison(intervalos, metricas, curvas):
+    (inicio_atual, fim_atual), (inicio_comp, fim_comp) = intervalos
+    rotulo_atual = f"{inicio_atual.strftime('%d/%m/%Y')} a {fim_atual.strftime('%d/%m/%Y')}"
+    rotulo_comp = f"{inicio_comp.strftime('%d/%m/%Y')} a {fim_comp.strftime('%d/%m/%Y')}"
+    atual, comparacao = metricas
+
+    st.subheader("Comparação entre Períodos")
+    st.caption(f"{rotulo_atual} comparado com {rotulo_comp}")
+
+    def variacao(chave):
+        if not comparacao[chave] or pd.isna(comparacao[chave]) or pd.isna(atual[chave]):
+            return None
+        return f"{atual[chave] / comparacao[chave] - 1:+.1%}"
+
+    indicadores = [
+        ("Receita Total", 'receita_total', True),
+        ("Número Total de Vendas", 'numero_total_vendas', False),
+        ("Ticket Médio por Transação", 'ticket_medio', True),
+        ("Clientes Únicos", 'clientes_unicos', False),
+        ("Novos Clientes no Período", 'novos_clientes', False),
+        ("Receita Média por Cliente", 'receita_media_cliente', True),
+        ("Receita de Novos", 'receita_novos', True),
+        ("Receita de Recorrentes", 'receita_recorrentes', True),
+    ]
+    colunas = st.columns(4)
+    for i, (rotulo, chave, moeda) in enumerate(indicadores):
+        valor = format_br(atual[chave]) if pd.notna(atual[chave]) else '-'
+        colunas[i % 4].metric(rotulo, f"R$ {valor}" if moeda else valor, delta=variacao(chave))
+
+    receitas = pd.DataFrame({
+        'Intervalo': [rotulo_atual, rotulo_atual, rotulo_comp, rotulo_comp],
+        'Tipo': ['Novo', 'Recorrente', 'Novo', 'Recorrente'],
+        'Receita': [atual['receita_novos'], atual['receita_recorrentes'],
+                    comparacao['receita_novos'], comparacao['receita_recorrentes']],
+    })
+    fig_receitas = px.bar(receitas, x='Tipo', y='Receita', color='Intervalo', barmode='group',
+                          title='Receita de Novos vs Recorrentes')
+    st.plotly_chart(fig_receitas, use_container_width=True)
+
+    curva_atual, curva_comp = curvas
+    retencao = pd.concat({rotulo_atual: curva_atual, rotulo_comp: curva_comp}, names=['Intervalo', 'Periods'])
+    if len(retencao):
+        retencao = retencao.rename('Retenção').reset_index()
+        fig_retencao = px.line(retencao, x='Periods', y='Retenção', color='Intervalo',
+                               title='Retenção Média das Coortes Iniciadas em Cada Intervalo')
+        fig_retencao.update_yaxes(tickformat='.0%')
+        st.plotly_chart(fig_retencao, use_container_width=True)
+
+# Função para calcular a retenção das coortes a partir das matrizes coorte × período
+def calculate_cohorts(matrices):
+    return matrices['retention']
+
+# Curvas por coorte de uma matriz para os gráficos de linhas: só as CHART_LINE_COHORTS coortes mais recentes,
+# mais a média ponderada pelo tamanho de todas (em D/W há milhares de coortes, uma série por coorte)
+def cohort_lines(matrices, medida, nome):
+    matriz = matrices[medida]
+    linhas = matriz.iloc[-CHART_LINE_COHORTS:].reset_index().melt(
+        id_vars='CohortDate', var_name='Periods', value_name=nome
+    )
+    if len(matriz) > CHART_LINE_COHORTS:
+        media = average_retention(matrices, medida=medida)
+        linhas = pd.concat([linhas, pd.DataFrame({'CohortDate': AVERAGE_COHORT_LABEL,
+                                                  'Periods': media.index,
+                                                  nome: media.to_numpy()})], ignore_index=True)
+    linhas['Periods'] = linhas['Periods'].astype(int)
+    return linhas.dropna(subset=[nome])
+
+# Função para calcular a receita média cumulativa por cliente (dividida pelo tamanho da coorte)
+def calculate_cumulative_revenue(matrices):
+    return cohort_lines(matrices, 'cumulative_arpu', 'CumulativeRevenue')
+
+# Destaca a série da média de todas as coortes nos gráficos de linhas
+def highlight_average(fig):
+    fig.update_traces(selector=dict(name=AVERAGE_COHORT_LABEL), line=dict(width=4, dash='dash', color='black'))
+    return fig
+
+# Análise de coorte a partir das matrizes coorte × período
+def render_cohort_charts(cohort_matrices_data, aggregation):
+    st.subheader("Análise de Coorte")
+    if cohort_matrices_data is None:
+        st.warning("Não há vendas com ID de cliente suficientes para a análise de coorte.")
+        return
+
+    cohort_df = calculate_cohorts(cohort_matrices_data)
+    graficos = get_figure_cache()
+
+    # Coortes mais velhas que o horizonte da matriz (granularidades finas em bases longas)
+    truncadas = cohort_matrices_data.get('truncated')
+    if truncadas is not None and truncadas.any():
+        st.caption(f"{int(truncadas.sum())} coortes têm mais de {cohort_df.shape[1]} períodos de idade e "
+                   f"são exibidas só até o período {cohort_df.shape[1] - 1}.")
+
+    # Linhas dos heatmaps limitadas às coortes mais recentes, como as colunas são limitadas por MAX_PERIODS
+    heatmap_df = cohort_df.iloc[-CHART_MAX_COHORTS:]
+    receita_heatmap = cohort_matrices_data['revenue_retention'].iloc[-CHART_MAX_COHORTS:]
+    if len(cohort_df) > CHART_MAX_COHORTS:
+        st.caption(f"Os heatmaps mostram as {CHART_MAX_COHORTS} coortes mais recentes de {len(cohort_df)}.")
+    if len(cohort_df) > CHART_LINE_COHORTS:
+        st.caption(f"Os gráficos de linhas mostram as {CHART_LINE_COHORTS} coortes mais recentes e a média "
+                   f"de todas as {len(cohort_df)} coortes, ponderada pelo tamanho.")
+
+    # Em granularidades finas a matriz tem centenas de células por linha: sem rótulo em cada célula
+    heatmap_text = '.0%' if cohort_df.shape[1] <= 36 else False
+
+    def cohort_heatmap():
+        fig_cohort_heatmap = px.imshow(heatmap_df, 
+                                       text_auto=heatmap_text, 
+                                       aspect="auto", 
+                                       color_continuous_scale='RdYlGn',
+                                       zmin=0, 
+                                       zmax=1)
+
+        fig_cohort_heatmap.update_layout(
+            title=f'Retenção de Coorte - Heatmap ({aggregation})',
+            xaxis_title='Períodos',
+            yaxis_title='Coorte',
+            coloraxis_colorbar=dict(
+                title='Taxa de Retenção',
+                tickformat='.0%'
+            )
+        )
+
+        fig_cohort_heatmap.update_traces(textfont_size=10)
+        return fig_cohort_heatmap
+
+    st.plotly_chart(graficos.figure(('retencao_heatmap', heatmap_df, aggregation), cohort_heatmap),
+                    use_container_width=True)
+    
+    # Gráfico de retenção de coorte baseado em linhas
+    def cohort_line():
+        cohort_pivot = cohort_lines(cohort_matrices_data, 'retention', 'Retention')
+
+        fig_cohort_line = px.line(cohort_pivot, 
+                                  x='Periods', 
+                                  y='Retention', 
+                                  color='CohortDate', 
+                                  title=f'Retenção de Coorte ({aggregation})')
+
+        fig_cohort_line.update_layout(
+            xaxis_title='Períodos',
+            yaxis_title='Taxa de Retenção',
+            yaxis_tickformat='.0%'
+        )
+        return highlight_average(fig_cohort_line)
+
+    st.plotly_chart(graficos.figure(('retencao_linhas', cohort_df, aggregation), cohort_line),
+                    use_container_width=True)
+
+    # Gráfico de receita média cumulativa por cliente por coorte
+    st.subheader("Receita Média Cumulativa por Cliente")
+
+    arpu_cumulativa = cohort_matrices_data['cumulative_arpu']
+
+    if arpu_cumulativa.notna().any().any():
+        def cumulative_revenue_line():
+            avg_revenue = calculate_cumulative_revenue(cohort_matrices_data)
+            fig_cumulative_revenue = px.line(avg_revenue, 
+                                             x='Periods', 
+                                             y='CumulativeRevenue', 
+                                             color='CohortDate', 
+                                             title=f'Receita Média Cumulativa por Cliente ({aggregation})')
+
+            fig_cumulative_revenue.update_layout(
+                xaxis_title='Períodos',
+                yaxis_title='Receita Média Cumulativa (R$)',
+                yaxis_tickformat=',.0f'
+            )
+            return highlight_average(fig_cumulative_revenue)
+
+        st.plotly_chart(graficos.figure(('receita_cumulativa', arpu_cumulativa, aggregation), cumulative_revenue_line),
+                        use_container_width=True)
+
+        # Retenção de receita: receita de cada período sobre a receita do período inicial da coorte
+        def revenue_retention_heatmap():
+            fig_revenue_retention = px.imshow(receita_heatmap,
+                                              text_auto=heatmap_text,
+                                              aspect="auto",
+                                              color_continuous_scale='RdYlGn',
+                                              zmin=0,
+                                              zmax=1)
+
+            fig_revenue_retention.update_layout(
+                title=f'Retenção de Receita por Coorte ({aggregation})',
+                xaxis_title='Períodos',
+                yaxis_title='Coorte',
+                coloraxis_colorbar=dict(
+                    title='Receita vs. Período 0',
+                    tickformat='.0%'
+                )
+            )
+
+            fig_revenue_retention.update_traces(textfont_size=10)
+            return fig_revenue_retention
+
+        st.plotly_chart(graficos.figure(('retencao_receita', receita_heatmap, aggregation),
+                                        revenue_retention_heatmap),
+                        use_container_width=True)
+    else:
+        st.warning("Não há dados suficientes para gerar o gráfico de Receita Média Cumulativa por Cliente.")
+
+# Previsão de receita das coortes atuais: fatores chain-ladder das coortes maduras preenchem o triângulo
+# inferior direito da receita acumulada; a faixa de 90% vem da variância dos fatores (Mack) por simulação
+def render_revenue_forecast(cohort_matrices_data, aggregation, ultimo_periodo):
+    st.subheader("Previsão de Receita das Coortes Atuais")
+    if cohort_matrices_data is None or len(cohort_matrices_data['sizes']) <= MIN_COHORTS_PER_FACTOR:
+        st.info(f"São necessárias pelo menos {MIN_COHORTS_PER_FACTOR + 1} coortes para projetar a receita.")
+        return
+    if cohort_matrices_data.get('truncated') is not None and cohort_matrices_data['truncated'].all():
+        st.info("Todas as coortes são mais antigas que o horizonte da matriz nesta granularidade: "
+                "escolha uma agregação maior para projetar a receita.")
+        return
+
+    period = AGG_OPTIONS[aggregation]
+    horizonte = st.slider("Períodos à frente na previsão", 1, 3 * DEFAULT_HORIZON[period], DEFAULT_HORIZON[period])
+    tabela, acumulada, truncadas = build_revenue_forecast(cohort_matrices_data['cumulative_revenue'], horizonte,
+                                                          ultimo_periodo, period, cohort_matrices_data.get('ages'))
+
+    def forecast_chart():
+        dados = tabela.reset_index()
+        fig = px.line(dados, x='Período', y=['Receita Realizada', 'Receita Projetada'],
+                      title=f'Receita Realizada e Projetada das Coortes Atuais ({aggregation})')
+        fig.add_scatter(x=dados['Período'], y=dados['Limite Superior'], mode='lines', line=dict(width=0),
+                        showlegend=False, hoverinfo='skip')
+        fig.add_scatter(x=dados['Período'], y=dados['Limite Inferior'], mode='lines', line=dict(width=0),
+                        fill='tonexty', fillcolor='rgba(99, 110, 250, 0.2)', name='Faixa de 90%')
+        fig.update_layout(xaxis_title='Período', yaxis_title='Receita (R$)', yaxis_tickformat=',.0f')
+        return fig
+
+    st.plotly_chart(get_figure_cache().figure(('previsao', tabela, aggregation), forecast_chart),
+                    use_container_width=True)
+
+    futuro = tabela['Receita Projetada'].notna()
+    col1, col2 = st.columns(2)
+    col1.metric(f"Receita Projetada ({horizonte} períodos)", f"R$ {format_br(tabela.loc[futuro, 'Receita Projetada'].sum())}")
+    col2.metric("Primeiro Período Projetado", f"R$ {format_br(tabela.loc[futuro, 'Receita Projetada'].iloc[0])}",
+                help=f"Faixa de 90%: R$ {format_br(tabela.loc[futuro, 'Limite Inferior'].iloc[0])} a "
+                     f"R$ {format_br(tabela.loc[futuro, 'Limite Superior'].iloc[0])}")
+    st.caption("Apenas clientes já adquiridos: a receita de coortes futuras não entra na projeção. "
+               "A soma das faixas de cada período não é a faixa do total.")
+    if truncadas:
+        st.caption(f"{truncadas} coortes mais antigas que o horizonte da matriz ({acumulada.shape[1]} períodos) "
+                   "ajudam a estimar os fatores, mas ficam fora da receita realizada e da projetada.")
+
+    with st.expander("Receita acumulada por coorte com o triângulo projetado"):
+        # Em granularidades finas a matriz é grande demais para formatar célula a célula
+        if acumulada.size <= 50_000:
+            st.dataframe(acumulada.style.format(lambda v: f"R$ {format_br(v)}", na_rep='-'))
+        else:
+            st.dataframe(acumulada.round(2))
+
+# Quartis de uma medida RFM; com muitos empates (ex.: amostra pequena com vários clientes de recência 0)
+# os limites se repetem e os quartis passam a ser tirados da ordem dos clientes
+def quartile_scores(valores, labels):
+    try:
+        return pd.qcut(valores, q=4, labels=labels)
+    except ValueError:
+        return pd.qcut(valores.rank(method='first'), q=4, labels=labels)
+
+# Função para segmentar os clientes por RFM
+def rfm_segmentation(rfm):
+    r_labels = range(4, 0, -1)
+    f_labels = range(1, 5)
+    m_labels = range(1, 5)
+    
+    r_quartiles = quartile_scores(rfm['Recency'], r_labels)
+    f_quartiles = quartile_scores(rfm['Frequency'], f_labels)
+    m_quartiles = quartile_scores(rfm['Monetary'], m_labels)
+    
+    rfm['R'] = r_quartiles
+    rfm['F'] = f_quartiles
+    rfm['M'] = m_quartiles
+    
+    def rfm_segment(row):
+        if row['R'] >= 3 and row['F'] == 1:
+            return 'New Customers'
+        elif row['R'] == 4 and row['F'] == 4 and row['M'] == 4:
+            return 'Best Customers'
+        elif row['R'] >= 3 and row['F'] >= 3 and row['M'] >= 3:
+            return 'Loyal Customers'
+        elif row['R'] >= 3 and row['F'] <= 2 and row['M'] <= 2:
+            return 'Lost Customers'
+        elif row['R'] <= 2 and row['F'] <= 2 and row['M'] <= 2:
+            return 'Lost Cheap Customers'
+        else:
+            return 'Other'
+    
+    rfm['Segment'] = rfm.apply(rfm_segment, axis=1)
+    return rfm
+
+# Segmentação RFM, LTV preditivo e detalhes do segmento selecionado
+# Concentração de receita: participação do topo de clientes, índice de Gini, curva de Pareto e classes ABC
+def render_concentration(concentracao):
+    st.subheader("Concentração de Receita (Pareto / ABC)")
+    colunas = st.columns(len(TOP_FRACTIONS) + 1)
+    for coluna, fracao in zip(colunas, TOP_FRACTIONS):
+        coluna.metric(f"Receita dos {fracao:.0%} Maiores Clientes", f"{concentracao.top_share(fracao):.1%}")
+    colunas[-1].metric("Índice de Gini", f"{concentracao.gini():.2f}",
+                       help="0 = receita igual entre os clientes; perto de 1 = receita concentrada em poucos clientes")
+
+    curva = concentracao.pareto_curve()
+
+    def pareto_chart():
+        fig = px.line(curva, x='% dos Clientes', y='% da Receita',
+                      title='Curva de Pareto: Receita Acumulada pelos Maiores Clientes')
+        fig.add_scatter(x=[0, 1], y=[0, 1], mode='lines', line=dict(dash='dash', color='gray'),
+                        name='Receita igual entre clientes')
+        fig.update_xaxes(tickformat='.0%')
+        fig.update_yaxes(tickformat='.0%')
+        return fig
+
+    st.plotly_chart(get_figure_cache().figure(('pareto', curva), pareto_chart), use_container_width=True)
+
+    limite_a, limite_b = concentracao.limites
+    st.dataframe(concentracao.summary().style.format({
+        'Clientes': lambda v: format_br(v),
+        'Receita': lambda v: f"R$ {format_br(v)}",
+        '% dos Clientes': '{:.1%}',
+        '% da Receita': '{:.1%}',
+    }))
+    st.caption(f"Classe A: clientes que somam os primeiros {limite_a:.0%} da receita; classe B: até {limite_b:.0%}; "
+               "classe C: o restante. A classe de cada cliente aparece na segmentação RFM.")
+
+# pesos: na prévia por amostragem, peso de cada cliente sorteado (inverso da fração sorteada no seu estrato);
+# contagens e totais por segmento passam a ser estimativas para a base inteira
+def render_rfm(rfm_segmented, margem_contribuicao, pesos=None):
+    st.subheader("Segmentação RFM")
+
+    if pesos is None:
+        pesos = pd.Series(1.0, index=rfm_segmented.index)
+    else:
+        pesos = pesos.reindex(rfm_segmented.index).fillna(1.0)
+        st.caption("Prévia: quantidades de clientes e totais por segmento estimados para a base inteira "
+                   "a partir dos clientes sorteados (ponderados pelo estrato).")
+    segment_counts = pesos.groupby(rfm_segmented['Segment']).sum().sort_values(ascending=False)
+    receita_segmento = (rfm_segmented['Monetary'] * pesos).groupby(rfm_segmented['Segment']).sum()
+
+    def rfm_treemap():
+        fig_rfm = px.treemap(
+            names=segment_counts.index,
+            parents=[""] * len(segment_counts),
+            values=segment_counts.values,
+            title='Segmentação RFM'
+        )
+
+        # Adicionar informações de clientes e receita ao hover
+        hover_data = []
+        for segment in segment_counts.index:
+            segment_df = rfm_segmented[rfm_segmented['Segment'] == segment]
+            clients = ", ".join(segment_df.index.astype(str)[:5])  # Converter para string e mostrar apenas os primeiros 5 clientes
+            total_revenue = receita_segmento[segment]
+            hover_data.append(f"Clientes: {clients}...<br>Receita Total: R$ {format_br(total_revenue)}")
+
+        fig_rfm.data[0].customdata = hover_data
+        fig_rfm.data[0].hovertemplate = '%{label}<br>Quantidade: %{value:,.0f}<br>%{customdata}'
+        return fig_rfm
+
+    fig_rfm = get_figure_cache().figure(('rfm_treemap', rfm_segmented[['Segment', 'Monetary']], pesos), rfm_treemap)
+    st.plotly_chart(fig_rfm, use_container_width=True)
+
+    # LTV preditivo (BG/NBD + Gamma-Gamma) por segmento
+    st.subheader("LTV Preditivo (12 meses)")
+    if (rfm_segmented['PurchaseDays'] > 1).sum() < 20:
+        st.info("São necessários pelo menos 20 clientes com compras em mais de um dia para ajustar o modelo de LTV preditivo.")
+    else:
+        try:
+            # Partida a quente com os parâmetros do último ajuste desta sessão
+            previsao, bgnbd_params, gg_params = predict_customer_value(
+                rfm_segmented,
+                dias=365,
+                bgnbd_initial=st.session_state.get('bgnbd_params'),
+                gg_initial=st.session_state.get('gamma_gamma_params')
+            )
+            st.session_state.bgnbd_params = bgnbd_params
+            st.session_state.gamma_gamma_params = gg_params
+
+            rfm_segmented['Compras Esperadas (12m)'] = previsao['ExpectedPurchases']
+            rfm_segmented['Valor Esperado (12m)'] = previsao['ExpectedValue']
+            rfm_segmented['LTV Preditivo (12m)'] = previsao['ExpectedValue'] * (margem_contribuicao / 100)
+
+            # Médias e totais ponderados pelos pesos dos clientes (todos 1 fora da prévia)
+            colunas_ltv = {'ComprasEsperadas': 'Compras Esperadas (12m)', 'ValorEsperado': 'Valor Esperado (12m)',
+                           'LTVPreditivo': 'LTV Preditivo (12m)'}
+            por_segmento = rfm_segmented[list(colunas_ltv.values())].mul(pesos, axis=0).groupby(rfm_segmented['Segment']).sum()
+            ltv_segmentos = pd.DataFrame({'Clientes': segment_counts.round().astype(int)})
+            for nome, coluna in colunas_ltv.items():
+                ltv_segmentos[nome] = por_segmento[coluna] / segment_counts
+            ltv_segmentos['ValorEsperadoTotal'] = por_segmento['Valor Esperado (12m)']
+            ltv_segmentos = ltv_segmentos.rename_axis('Segment').sort_values('ValorEsperadoTotal', ascending=False)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Valor Esperado Total (12m)", f"R$ {format_br(por_segmento['Valor Esperado (12m)'].sum())}")
+            with col2:
+                st.metric("LTV Preditivo Médio (12m)",
+                          f"R$ {format_br(por_segmento['LTV Preditivo (12m)'].sum() / pesos.sum())}")
+
+            st.dataframe(ltv_segmentos.rename(columns={
+                'Clientes': 'Clientes' if pesos.eq(1).all() else 'Clientes (estimados)',
+                'ComprasEsperadas': 'Compras Esperadas por Cliente',
+                'ValorEsperado': 'Valor Esperado por Cliente (R$)',
+                'LTVPreditivo': 'LTV Preditivo por Cliente (R$)',
+                'ValorEsperadoTotal': 'Valor Esperado Total (R$)'
+            }))
+        except Exception as e:
+            st.warning(f"Não foi possível ajustar o modelo de LTV preditivo: {str(e)}")
+
+    # Seleção interativa do segmento
+    selected_segment = st.selectbox("Selecione um segmento para ver detalhes:", segment_counts.index)
+
+    # Exibir detalhes do segmento selecionado
+    if selected_segment:
+        segment_df = rfm_segmented[rfm_segmented['Segment'] == selected_segment]
+        
+        st.subheader(f"Detalhes do Segmento: {selected_segment}")
+        if pesos.eq(1).all():
+            st.write(f"Número de Clientes: {len(segment_df)}")
+        else:
+            st.write(f"Número de Clientes (estimado): {int(round(segment_counts[selected_segment]))} "
+                     f"({len(segment_df)} na amostra, listados abaixo)")
+        st.write(f"Receita Total: R$ {format_br(receita_segmento[selected_segment])}")
+        
+        colunas_detalhe = ['R', 'F', 'M', 'Monetary'] + [c for c in ['Classe ABC', 'Valor Esperado (12m)', 'LTV Preditivo (12m)'] if c in segment_df.columns]
+        st.dataframe(segment_df[colunas_detalhe])
+        
+        # Opção de download
+        csv = segment_df.to_csv(index=True)
+        st.download_button(
+            label="Download dados dos clientes deste segmento",
+            data=csv,
+            file_name=f"clientes_segmento_{selected_segment}.csv",
+            mime="text/csv",
+        )
+
+    return rfm_segmented
+
+# Consulta de um cliente pelo ID: resumo, segmento, coorte, LTV e histórico de compras (acesso direto pelo índice)
+def render_customer_lookup(indice_clientes, transacoes):
+    st.subheader("Consulta de Cliente")
+    busca = st.text_input("Digite o ID do cliente")
+    if not busca:
+        return
+
+    codigo = indice_clientes.code_of(busca)
+    if codigo is None:
+        st.warning(f"Cliente {busca} não encontrado no período selecionado.")
+        return
+
+    cliente = indice_clientes.customer(codigo)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Segmento", cliente.get('Segment', '-'))
+    col2.metric("Coorte", cliente.get('Cohort', '-'))
+    col3.metric("Compras", format_br(cliente['Frequency']))
+    col4.metric("Receita", f"R$ {format_br(cliente['Monetary'])}")
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Primeira Compra", cliente['FirstPurchase'].strftime('%d/%m/%Y'))
+    col2.metric("Última Compra", cliente['LastPurchase'].strftime('%d/%m/%Y'))
+    col3.metric("R / F / M", f"{cliente.get('R', '-')} / {cliente.get('F', '-')} / {cliente.get('M', '-')}")
+    if 'LTV Preditivo (12m)' in cliente.index and pd.notna(cliente['LTV Preditivo (12m)']):
+        col4.metric("LTV Preditivo (12m)", f"R$ {format_br(cliente['LTV Preditivo (12m)'])}")
+
+    st.dataframe(transacoes.iloc[indice_clientes.transaction_positions(codigo)], hide_index=True)
+
+# Curvas de sobrevivência (Kaplan–Meier) por coorte ou segmento: clientes ainda ativos entram como censurados,
+# então coortes recentes não aparecem artificialmente piores
+def render_survival(indice_clientes):
+    st.subheader("Sobrevivência de Clientes (Kaplan–Meier)")
+    col1, col2 = st.columns(2)
+    with col1:
+        dias_inatividade = st.number_input("Dias sem compra para considerar o cliente perdido",
+                                           min_value=1, value=DEFAULT_INACTIVITY_DAYS, step=30)
+    with col2:
+        agrupar_por = st.selectbox("Curvas por", ["Coorte", "Segmento RFM"])
+
+    resumo = indice_clientes.summary
+    duracoes, churn = survival_arrays(resumo, dias_inatividade)
+    grupos = resumo['Cohort' if agrupar_por == "Coorte" else 'Segment'].astype(str).to_numpy()
+
+    # As maiores curvas (até 8) e a curva de todos os clientes
+    principais = pd.Series(grupos).value_counts().index[:8]
+    selecionados = np.isin(grupos, principais)
+    curvas = pd.concat([
+        pd.concat({'Todos': kaplan_meier(duracoes, churn)}, names=['Grupo']),
+        kaplan_meier_by_group(duracoes[selecionados], churn[selecionados], grupos[selecionados])
+    ])
+
+    def survival_chart():
+        fig = px.line(curvas.reset_index(), x='Dias', y='Sobrevivência', color='Grupo', line_shape='hv',
+                      title=f'Probabilidade de o Cliente Continuar Ativo ({agrupar_por})')
+        fig.update_yaxes(tickformat='.0%', range=[0, 1.02])
+        return fig
+
+    st.plotly_chart(get_figure_cache().figure(('sobrevivencia', curvas, agrupar_por), survival_chart),
+                    use_container_width=True)
+
+    marcos = [90, 180, 365]
+    tabela = survival_at(curvas, marcos).rename(columns=lambda d: f"Ativos após {d} dias")
+    tabela.insert(0, 'Tempo de Vida Mediano (dias)', median_survival(curvas))
+    tabela.insert(0, 'Clientes', curvas.groupby(level='Grupo', sort=False)['Em Risco'].max())
+    st.dataframe(tabela.style.format({c: '{:.0%}' for c in tabela.columns[2:]} |
+                                     {'Tempo de Vida Mediano (dias)': '{:.0f}', 'Clientes': '{:.0f}'},
+                                     na_rep='-'))
+    st.caption(f"Churn observado: {churn.mean():.1%} dos clientes sem compra há mais de {dias_inatividade} dias. "
+               "Os demais são tratados como censurados (ainda ativos no fim dos dados).")
+
+# Intervalos entre compras: distribuição, percentis por coorte ou segmento e probabilidade de recompra em até N dias
+# (referência para os limites de recência da segmentação RFM)
+def render_repurchase_timing(tempos_recompra, rotulos):
+    st.subheader("Intervalo entre Compras")
+    if len(tempos_recompra) == 0:
+        st.info("Não há clientes com compras em mais de um dia no período para analisar os intervalos entre compras.")
+        return
+
+    percentis = tempos_recompra.percentiles()
+    limite = int(max(30, min(tempos_recompra.intervals.max(), np.ceil(np.quantile(tempos_recompra.intervals, 0.99)))))
+    graficos = get_figure_cache()
+
+    distribuicao = tempos_recompra.distribution(limite)
+    fig_distribuicao = graficos.figure(
+        ('intervalos', distribuicao),
+        lambda: px.bar(distribuicao.reset_index(), x='Dias', y='Intervalos',
+                       title='Distribuição dos Dias entre Compras Consecutivas (até o percentil 99)')
+    )
+    st.plotly_chart(fig_distribuicao, use_container_width=True)
+
+    probabilidade = tempos_recompra.repurchase_probability(max(limite, 365))
+
+    def repurchase_curve():
+        fig = px.line(probabilidade.reset_index(), x='Dias', y='Probabilidade de Recompra',
+                      title='Probabilidade de Nova Compra em até N Dias')
+        fig.update_yaxes(tickformat='.0%')
+        return fig
+
+    st.plotly_chart(graficos.figure(('recompra', probabilidade), repurchase_curve), use_container_width=True)
+
+    mediana, p90 = percentis.loc['Todos', 'P50'], percentis.loc['Todos', 'P90']
+    st.caption(f"Metade das recompras acontece em até {mediana:.0f} dias e 90% em até {p90:.0f} dias. "
+               f"Probabilidade de recompra em até 30, 90 e 180 dias: "
+               + ", ".join(f"{probabilidade.get(d, np.nan):.0%}" for d in [30, 90, 180]) + ".")
+
+    agrupar_por = st.selectbox("Percentis dos intervalos por", list(rotulos.keys()))
+    tabela = tempos_recompra.percentiles(rotulos[agrupar_por])
+    st.dataframe(tabela.style.format({'Intervalos': '{:.0f}'} | {c: '{:.0f} dias' for c in tabela.columns[1:]}))
+
+# Afinidade entre produtos (opcional): pares comprados juntos, no geral ou por segmento RFM
+# Devolve a coluna de produto escolhida (ou None)
+def render_product_affinity(transacoes, colunas, rfm_segmented, padrao=None):
+    st.subheader("Afinidade entre Produtos")
+    coluna_produto = st.selectbox("Coluna de produto ou SKU (opcional)", [None] + colunas,
+                                  index=default_index([None] + colunas, padrao),
+                                  format_func=lambda c: "Nenhuma" if c is None else c)
+    if coluna_produto is None:
+        st.caption("Escolha a coluna de produto para ver os pares de produtos comprados juntos.")
+        return None
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        cesta = st.radio("Cesta", ["Pedido (cliente + dia)", "Cliente (todas as compras)"])
+    with col2:
+        segmento = st.selectbox("Segmento RFM", ["Todos"] + list(rfm_segmented['Segment'].value_counts().index))
+    with col3:
+        min_cestas = st.number_input("Mínimo de cestas com o par", min_value=2, value=DEFAULT_MIN_BASKETS)
+    with col4:
+        ordenar_por = st.radio("Ordenar por", ["Lift", "Cestas"])
+
+    with st.spinner("Montando a matriz de cestas e produtos..."):
+        afinidade = build_product_affinity(
+            transacoes['ID do Cliente'], transacoes[coluna_produto],
+            transacoes['Data da Venda'] if cesta.startswith("Pedido") else None
+        )
+    linhas = None if segmento == "Todos" else afinidade.basket_mask(rfm_segmented['Segment'], segmento)
+    pares = afinidade.pairs(linhas, min_cestas=int(min_cestas), limite=20, ordenar_por=ordenar_por)
+
+    cestas_consideradas = afinidade.baskets if linhas is None else int(linhas.sum())
+    if pares.empty:
+        st.info(f"Nenhum par de produtos aparece junto em pelo menos {int(min_cestas)} de "
+                f"{format_br(cestas_consideradas)} cestas.")
+        return coluna_produto
+
+    st.dataframe(pares.style.format({
+        'Cestas': lambda v: format_br(v),
+        'Suporte': '{:.2%}',
+        'Confiança A→B': '{:.1%}',
+        'Confiança B→A': '{:.1%}',
+        'Lift': '{:.2f}',
+    }), hide_index=True)
+    st.caption(f"{format_br(cestas_consideradas)} cestas e {format_br(len(afinidade.products))} produtos. "
+               "Suporte: fração das cestas com os dois produtos; confiança A→B: fração das cestas com A que "
+               "também têm B; lift acima de 1: comprados juntos mais do que o acaso explicaria.")
+    return coluna_produto
+
+# Visão por dimensão: totais e receita por categoria (do cubo pré-agregado), retenção e segmentos RFM
+# por categoria de aquisição (categoria da primeira compra do cliente)
+def render_dimension_breakdown(dimension_cube, filtros, dimensao, start_date, end_date, aggregation,
+                               transacoes, posicoes, rfm_segmented):
+    st.subheader(f"Análise por {dimensao}")
+    period = AGG_OPTIONS[aggregation]
+    dia_inicio = int(np.datetime64(start_date, 'D').astype(np.int64))
+    dia_fim = int(np.datetime64(end_date, 'D').astype(np.int64))
+
+    totais = dimension_cube.group_totals(filtros, dimensao, dia_inicio, dia_fim)
+    st.dataframe(totais.style.format({
+        'Receita': lambda v: f"R$ {format_br(v)}",
+        'Vendas': '{:.0f}',
+        'Clientes': '{:.0f}',
+        'Ticket Médio': lambda v: f"R$ {format_br(v)}",
+        'Receita por Cliente': lambda v: f"R$ {format_br(v)}" if pd.notna(v) else '-',
+    }))
+
+    # Receita por período das principais categorias (as demais somadas em "Outros")
+    principais = list(totais.index[:10])
+    diario = dimension_cube.group_daily(filtros, dimensao, dia_inicio, dia_fim)
+    if len(diario.columns) > len(principais):
+        outras = [c for c in diario.columns if c not in principais]
+        diario = diario[principais].assign(Outros=diario[outras].sum(axis=1))
+    receita_periodo = diario.resample(period).sum()
+    fig = px.bar(receita_periodo, x=receita_periodo.index, y=receita_periodo.columns,
+                 title=f'Receita por {aggregation} e {dimensao}',
+                 labels={'value': 'Receita', 'Dia': 'Data', 'variable': dimensao}, barmode='stack')
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Categoria de aquisição de cada cliente
+    aquisicao = dimension_cube.acquisition_category(dimensao, transacoes['ID do Cliente'],
+                                                    transacoes['Data da Venda'], posicoes)
+    if aquisicao.empty:
+        return
+    categoria_venda = transacoes['ID do Cliente'].map(aquisicao)
+
+    curvas = {}
+    for categoria in aquisicao.value_counts().index[:6]:
+        vendas_categoria = transacoes[(categoria_venda == categoria).to_numpy()]
+        matrices = cohort_matrices(vendas_categoria['ID do Cliente'], vendas_categoria['Data da Venda'],
+                                   vendas_categoria['Valor da Venda'], period)
+        if matrices is not None:
+            curvas[categoria] = average_retention(matrices)
+    if curvas:
+        retencao = pd.concat(curvas, names=[dimensao, 'Periods']).rename('Retenção').reset_index()
+        fig_retencao = px.line(retencao, x='Periods', y='Retenção', color=dimensao,
+                               title=f'Retenção Média por {dimensao} de Aquisição')
+        fig_retencao.update_yaxes(tickformat='.0%')
+        st.plotly_chart(fig_retencao, use_container_width=True)
+
+    mix = pd.crosstab(aquisicao.reindex(rfm_segmented.index).to_numpy(), rfm_segmented['Segment'].to_numpy(),
+                      normalize='index')
+    mix.index.name = dimensao
+    mix.columns.name = 'Segmento'
+    fig_mix = px.imshow(mix, text_auto='.0%', aspect='auto', color_continuous_scale='Blues',
+                        title=f'Segmentos RFM por {dimensao} de Aquisição')
+    st.plotly_chart(fig_mix, use_container_width=True)
+
+# Painel compacto de qualidade dos dados (substitui as antigas informações de debug)
+def render_quality_report(relatorio):
+    # Alerta sobre vendas sem ID de cliente
+    if relatorio['receita_sem_id'] > 0:
+        st.warning(f"Atenção: Existem R$ {format_br(relatorio['receita_sem_id'])} em vendas sem ID de cliente. Isso afeta o cálculo das métricas por cliente.")
+
+    with st.expander("Qualidade dos Dados"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Linhas Válidas", f"{format_br(relatorio['linhas_validas'])} de {format_br(relatorio['linhas_lidas'])}")
+        col2.metric("Datas Inválidas", format_br(relatorio['datas_invalidas']))
+        col3.metric("Vendas sem ID", format_br(relatorio['vendas_sem_id']))
+        col4.metric("Receita sem ID", f"R$ {format_br(relatorio['receita_sem_id'])}")
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Valores Inválidos", format_br(relatorio['valores_invalidos']))
+        col2.metric("Valores Negativos", format_br(relatorio['valores_negativos']))
+        col3.metric("Valores Zerados", format_br(relatorio['valores_zero']))
+        col4.metric("Linhas Duplicadas", format_br(relatorio['linhas_duplicadas']))
+
+        if relatorio['limite_outlier'] is not None:
+            st.write(f"Vendas acima de R$ {format_br(relatorio['limite_outlier'])} (outliers): "
+                     f"{format_br(relatorio['outliers'])}, somando R$ {format_br(relatorio['receita_outliers'])}")
+
+        st.download_button(
+            label="Download do relatório de qualidade (JSON)",
+            data=json.dumps(relatorio, ensure_ascii=False, indent=2),
+            file_name="relatorio_qualidade.json",
+            mime="application/json",
+        )
+
+# Seleção do espaço de trabalho no sidebar; ao abrir um espaço, os resultados salvos ficam na sessão e
+# os gráficos salvos entram no cache (as escolhas salvas viram os padrões dos widgets). Devolve o espaço aberto
+def render_workspace_picker():
+    armazenamento = get_workspace_store()
+    dono = workspace_owner()
+    espacos = {espaco.id: espaco for espaco in armazenamento.list(dono)}
+
+    st.sidebar.subheader("Espaços de Trabalho")
+    with st.sidebar.expander("Chave de acesso"):
+        st.caption("Os espaços de trabalho ficam vinculados à chave de acesso deste navegador, que está no link "
+                   "da página. Guarde o link (ou a chave) para voltar a eles; não compartilhe a chave.")
+        st.code(st.session_state.workspace_token, language=None)
+        outra = st.text_input("Usar outra chave de acesso", type="password").strip()
+        if outra and outra != st.session_state.workspace_token:
+            if valid_access_token(outra):
+                st.query_params[WORKSPACE_TOKEN_PARAM] = outra
+                st.session_state.espaco_aberto = None
+                st.rerun()
+            st.error("Chave de acesso inválida.")
+    escolhido = st.sidebar.selectbox(
+        "Abrir espaço de trabalho",
+        [None] + list(espacos),
+        format_func=lambda i: "Nenhum (enviar arquivos)" if i is None
+        else f"{espacos[i].name} ({format_br(espacos[i].size_bytes / 1024 ** 2)} MB)"
+    )
+    if escolhido is None:
+        st.session_state.espaco_aberto = None
+        return None
+
+    if st.session_state.get('espaco_aberto') != escolhido:
+        espaco = armazenamento.open(dono, escolhido)
+        resultados = espaco.load_results()
+        graficos = get_figure_cache()
+        for chave, spec in espaco.load_figures().items():
+            graficos.put(chave, spec)
+        if 'qualidade' in resultados:
+            st.session_state.quality_report = resultados['qualidade']
+            st.session_state.quality_report_key = (('espaco', escolhido),) + resultados['chave_qualidade']
+        st.session_state.resultados_espaco = resultados
+        st.session_state.espaco_aberto = escolhido
+
+    if st.sidebar.button("Excluir este espaço de trabalho"):
+        armazenamento.delete(dono, escolhido)
+        st.session_state.espaco_aberto = None
+        st.rerun()
+    return espacos[escolhido]
+
+# Salvar a análise atual como espaço de trabalho: dados já com as colunas padronizadas (ID, data e valor),
+# escolhas da análise, relatório de qualidade, resultados do trabalho concluído e gráficos exibidos
+def render_workspace_save(dados, mapeamento, chave_trabalho, trabalho, chaves_graficos, nome_padrao):
+    st.sidebar.subheader("Salvar Análise")
+    nome = st.sidebar.text_input("Nome do espaço de trabalho", value=nome_padrao)
+    if not st.sidebar.button("Salvar espaço de trabalho") or not nome.strip():
+        return
+
+    # As chaves salvas são as que a página vai calcular ao reabrir o espaço (colunas padronizadas)
+    colunas = ('ID do Cliente', 'Data da Venda', 'Valor da Venda')
+    resultados = {'chave_qualidade': colunas, 'qualidade': st.session_state.quality_report}
+    if trabalho.done and trabalho.error is None and not trabalho.cancelled:
+        resultados['chave_analise'] = colunas + chave_trabalho[4:]
+        resultados['resultados'] = dict(trabalho.results)
+
+    resumo_arquivos, duplicadas = st.session_state.resumo_arquivos
+    metadados = {
+        'mapeamento': mapeamento,
+        'arquivos': resumo_arquivos.to_dict(orient='records'),
+        'duplicadas': int(duplicadas),
+    }
+    try:
+        with st.spinner("Salvando o espaço de trabalho..."):
+            espaco = get_workspace_store().save(workspace_owner(), nome.strip(), dados, metadados, resultados,
+                                                get_figure_cache().specs(chaves_graficos))
+        st.sidebar.success(f"Espaço de trabalho \"{espaco.name}\" salvo ({format_br(espaco.size_bytes / 1024 ** 2)} MB).")
+    except (ValueError, OSError) as e:
+        st.sidebar.error(f"Não foi possível salvar o espaço de trabalho: {str(e)}")
+
+# Função para gravar os arquivos enviados em disco (uma vez por conjunto de arquivos), para leitura direta pelo DuckDB
+# Os arquivos são copiados em blocos para uma pasta da sessão, apagada quando outro conjunto é enviado
+def spool_upload(uploaded_files):
+    chave = upload_key(uploaded_files)
+    if st.session_state.get('upload_spool_key') != chave:
+        if st.session_state.get('upload_spool_dir'):
+            shutil.rmtree(st.session_state.upload_spool_dir, ignore_errors=True)
+        pasta = tempfile.mkdtemp(prefix='analise_upload_')
+        caminhos = []
+        for arquivo in uploaded_files:
+            arquivo.seek(0)
+            caminhos.append(spool_file(arquivo, arquivo.name, pasta, UPLOAD_MAX_BYTES))
+        st.session_state.upload_spool_key = chave
+        st.session_state.upload_spool_dir = pasta
+        st.session_state.upload_spool_path = caminhos
+        st.session_state.duckdb_engine = None
+    return st.session_state.upload_spool_path
+
+# Análise com o motor DuckDB: o arquivo não é carregado no pandas, só os resultados agregados voltam
+def duckdb_app(uploaded_files, remover_duplicadas):
+    from duckdb_engine import DuckDBEngine, formula_expression, quote_identifier
+
+    paths = spool_upload(uploaded_files)
+    if st.session_state.get('duckdb_engine') is None or st.session_state.get('duckdb_dedupe') != remover_duplicadas:
+        st.session_state.duckdb_engine = DuckDBEngine(paths, memory_limit=os.environ.get('ANALISE_DUCKDB_MEMORIA'),
+                                                      deduplicate=remover_duplicadas)
+        st.session_state.duckdb_dedupe = remover_duplicadas
+    engine = st.session_state.duckdb_engine
+    colunas = engine.columns()
+
+    # Seleção de colunas
+    st.subheader("Seleção de Colunas")
+    id_column = st.selectbox("Selecione a coluna para ID do Cliente", colunas)
+    date_column = st.selectbox("Selecione a coluna para Data da Venda", colunas)
+
+    min_date, max_date = engine.date_bounds(date_column)
+    if min_date is None:
+        st.error("A coluna de data selecionada não contém datas válidas.")
+        return
+
+    # Criar o widget de seleção de data no sidebar
+    start_date, end_date = st.sidebar.date_input(
+        "Intervalo de Datas",
+        [min_date, max_date],
+        min_value=min_date,
+        max_value=max_date
+    )
+
+    # Seleção do nível de agregação (no sidebar para ser global)
+    aggregation = st.sidebar.selectbox("Selecione o nível de agregação para toda a análise", list(AGG_OPTIONS.keys()), index=2)
+    period = AGG_OPTIONS[aggregation]
+
+    # Opção para escolher como calcular o Valor da Venda
+    valor_venda_opcao = st.radio(
+        "Como você quer definir o Valor da Venda?",
+        ("Selecionar coluna", "Usar fórmula")
+    )
+
+    if valor_venda_opcao == "Selecionar coluna":
+        value_column = st.selectbox("Selecione a coluna para Valor da Venda", colunas)
+        value_expression = quote_identifier(value_column)
+    else:
+        st.subheader("Cálculo do Valor da Venda")
+        value_columns = st.multiselect("Selecione as colunas para o cálculo do Valor da Venda", colunas)
+        column_inputs = {col: st.text_input(f"Alias para {col}", col) for col in value_columns}
+        formula = st.text_input("Fórmula para o Valor da Venda (use os aliases e operadores +, -, *, /, e parênteses)")
+        if not formula:
+            st.info("Informe a fórmula para continuar a análise.")
+            return
+        # Os aliases viram nomes de coluna citados; os operadores são os mesmos em SQL (outro texto é recusado)
+        try:
+            value_expression = formula_expression(formula, column_inputs)
+        except ValueError as e:
+            st.error(str(e))
+            return
+
+    try:
+        engine.prepare(id_column, date_column, value_expression)
+        metricas = engine.key_metrics(start_date, end_date)
+        chave_qualidade = (id_column, date_column, value_expression)
+        if st.session_state.get('quality_report_key') != chave_qualidade:
+            st.session_state.quality_report = engine.quality_report(date_column)
+            st.session_state.quality_report_key = chave_qualidade
+    except Exception as e:
+        st.error(f"Erro ao preparar os dados no DuckDB: {str(e)}")
+        return
+
+    margem_contribuicao = render_key_metrics(metricas)
+    if not metricas['numero_total_vendas']:
+        st.warning("Nenhuma venda no intervalo de datas selecionado.")
+        return
+    render_sales_chart(engine.new_vs_recurring(start_date, end_date, period), aggregation)
+    matrizes_coorte = engine.cohort_matrices(start_date, end_date, period)
+    render_cohort_charts(matrizes_coorte, aggregation)
+    render_revenue_forecast(matrizes_coorte, aggregation, int(period_index(day_numbers([end_date]), period)[0]))
+    rfm_segmented = rfm_segmentation(engine.rfm(start_date, end_date))
+    concentracao = RevenueConcentration(rfm_segmented['Monetary'])
+    render_concentration(concentracao)
+    rfm_segmented['Classe ABC'] = concentracao.classes()
+    render_rfm(rfm_segmented, margem_contribuicao)
+    render_quality_report(st.session_state.quality_report)
+
+# Análise com o motor pandas: o conjunto de dados completo é carregado em memória
+# carregar() devolve (df, resumo dos arquivos, duplicadas removidas); espaco: espaço de trabalho aberto (ou None)
+# admissao: admissão do gerenciador de recursos, retida pelos trabalhos em segundo plano até eles terminarem
+def pandas_app(chave_dados, carregar, gerenciador, sessao, espaco=None, admissao=None):
+    # Leitura dos dados (arquivos em paralelo, ou o espaço de trabalho com memory map); o DataFrame fica com
+    # a sessão no gerenciador de recursos, que o descarrega em disco quando a sessão fica ociosa ou a memória aperta
+    df = gerenciador.load(sessao, chave_dados)
+    if df is None or st.session_state.get('resumo_arquivos_chave') != chave_dados:
+        try:
+            with st.spinner("Carregando os dados..."):
+                df, resumo_arquivos, duplicadas = carregar()
+        except Exception as e:
+            st.error(f"Erro ao ler os arquivos: {str(e)}")
+            return
+        gerenciador.store(sessao, chave_dados, df)
+        st.session_state.resumo_arquivos = (resumo_arquivos, duplicadas)
+        st.session_state.resumo_arquivos_chave = chave_dados
+    resumo_arquivos, duplicadas = st.session_state.resumo_arquivos
+
+    # Escolhas salvas no espaço de trabalho aberto (padrões dos widgets) e registro dos gráficos exibidos
+    padroes = espaco.metadata['mapeamento'] if espaco is not None else {}
+    chaves_graficos = get_figure_cache().track()
+
+    if len(resumo_arquivos) > 1:
+        with st.expander(f"{len(resumo_arquivos)} arquivos combinados ({format_br(len(df))} vendas)"):
+            st.dataframe(resumo_arquivos, hide_index=True)
+            if duplicadas:
+                st.write(f"Transações duplicadas removidas: {format_br(duplicadas)}")
+
+    # Após carregar o DataFrame
+
+    # Seleção de colunas
+    st.subheader("Seleção de Colunas")
+    id_column = st.selectbox("Selecione a coluna para ID do Cliente", df.columns,
+                             index=default_index(df.columns, padroes.get('coluna_id')))
+    date_column = st.selectbox("Selecione a coluna para Data da Venda", df.columns,
+                               index=default_index(df.columns, padroes.get('coluna_data')))
+    opcoes_dimensao = [c for c in df.columns if c not in (id_column, date_column)]
+    dimension_columns = st.multiselect(
+        "Selecione colunas de dimensão para filtrar e agrupar (opcional: loja, canal, produto...)",
+        opcoes_dimensao,
+        default=[c for c in padroes.get('colunas_dimensao', []) if c in opcoes_dimensao]
+    )
+    
+    # Renomeação das colunas
+    df = df.rename(columns={id_column: 'ID do Cliente', date_column: 'Data da Venda'})
+    
+    # Converter a coluna de data para datetime (mesmos formatos aceitos pelo motor DuckDB)
+    df['Data da Venda'] = parse_dates(df['Data da Venda'])
+    
+    # Remover linhas com datas inválidas (contadas para o relatório de qualidade)
+    datas_invalidas = int(df['Data da Venda'].isna().sum())
+    df = df.dropna(subset=['Data da Venda'])
+
+    # Determinar as datas mínima e máxima do DataFrame
+    min_date = df['Data da Venda'].min().date()
+    max_date = df['Data da Venda'].max().date()
+
+    # Criar o widget de seleção de data no sidebar
+    intervalo_padrao = [min_date, max_date]
+    if padroes.get('intervalo'):
+        intervalo_padrao = [min(max(pd.Timestamp(d).date(), min_date), max_date) for d in padroes['intervalo']]
+    start_date, end_date = st.sidebar.date_input(
+        "Intervalo de Datas",
+        intervalo_padrao,
+        min_value=min_date,
+        max_value=max_date
+    )
+
+    # Modo de comparação: o segundo intervalo sai dos mesmos agregados diários, sem nova leitura dos dados
+    modo_comparacao = st.sidebar.selectbox(
+        "Comparar com",
+        ["Sem comparação", "Período anterior", "Mesmo período do ano anterior", "Intervalo personalizado"]
+    )
+    intervalo_comparacao = None
+    if modo_comparacao == "Período anterior":
+        intervalo_comparacao = previous_period(start_date, end_date)
+    elif modo_comparacao == "Mesmo período do ano anterior":
+        intervalo_comparacao = same_period_last_year(start_date, end_date)
+    elif modo_comparacao == "Intervalo personalizado":
+        inicio_padrao, fim_padrao = previous_period(start_date, end_date)
+        intervalo_comparacao = st.sidebar.date_input(
+            "Intervalo de comparação",
+            [max(inicio_padrao, min_date), max(fim_padrao, min_date)],
+            min_value=min_date,
+            max_value=max_date
+        )
+        if len(intervalo_comparacao) != 2:
+            intervalo_comparacao = None
+
+    # Sketches de clientes distintos do dataset completo: trocar o filtro só combina sketches
+    erro_contagem = st.sidebar.select_slider(
+        "Erro máximo das contagens aproximadas de clientes",
+        options=[0.005, 0.01, 0.02, 0.05],
+        value=0.01,
+        format_func=lambda v: f"{v:.1%}"
+    )
+
+    # Opções de agregação
+    agg_options = AGG_OPTIONS
+
+    # Seleção do nível de agregação (no sidebar para ser global)
+    aggregation = st.sidebar.selectbox("Selecione o nível de agregação para toda a análise", list(agg_options.keys()),
+                                       index=default_index(agg_options, padroes.get('agregacao'), 2))
+
+    # Função para calcular o Valor da Venda
+    @st.cache_data
+    def calculate_sale_value(df, formula, column_inputs):
+        try:
+            data = {alias: df[col] for col, alias in column_inputs.items()}
+            for alias in column_inputs.values():
+                formula = formula.replace(alias, f"data['{alias}']")
+            df['Valor da Venda'] = eval(formula)
+            return df
+        except Exception as e:
+            st.error(f"Erro ao aplicar a fórmula: {str(e)}")
+            return None
+
+    # Opção para escolher como calcular o Valor da Venda
+    valor_venda_opcao = st.radio(
+        "Como você quer definir o Valor da Venda?",
+        ("Selecionar coluna", "Usar fórmula")
+    )
+
+    # O Valor da Venda é definido no DataFrame completo; o filtro de datas é aplicado depois
+    if valor_venda_opcao == "Selecionar coluna":
+        value_column = st.selectbox("Selecione a coluna para Valor da Venda", df.columns,
+                                    index=default_index(df.columns, padroes.get('coluna_valor')))
+        df['Valor da Venda'] = df[value_column]
+        definicao_valor = value_column
+    else:
+        st.subheader("Cálculo do Valor da Venda")
+        value_columns = st.multiselect("Selecione as colunas para o cálculo do Valor da Venda", df.columns)
+        column_inputs = {col: st.text_input(f"Alias para {col}", col) for col in value_columns}
+        formula = st.text_input("Fórmula para o Valor da Venda (use os aliases e operadores +, -, *, /, e parênteses)")
+        definicao_valor = (formula, tuple(column_inputs.items()))
+        
+        if st.button("Aplicar Fórmula"):
+            df = calculate_sale_value(df, formula, column_inputs)
+            if df is not None:
+                st.success("Fórmula aplicada com sucesso!")
+
+    if df is None or 'Valor da Venda' not in df.columns:
+        st.info("Aplique a fórmula do Valor da Venda para continuar a análise.")
+        return
+
+    # Base completa com as colunas padronizadas (é o que um espaço de trabalho guarda)
+    df_padronizado = df
+
+    # Relatório de qualidade dos dados: uma passada no conjunto completo, guardado na sessão junto com ele
+    chave_qualidade = (chave_dados, id_column, date_column, definicao_valor)
+    if st.session_state.get('quality_report_key') != chave_qualidade:
+        st.session_state.quality_report = quality_report(df, datas_invalidas)
+        st.session_state.quality_report_key = chave_qualidade
+
+    dias_venda = df['Data da Venda'].values.astype('datetime64[D]').astype(np.int32)
+
+    # Dimensões: filtros por códigos inteiros pré-calculados e agregados por (combinação de categorias, dia)
+    dimension_cube = None
+    filtros_dimensao = {}
+    agrupamento = None
+    filtro_pelo_cubo = False
+    if dimension_columns:
+        dimension_cube = build_dimension_cube(df[dimension_columns], df['ID do Cliente'], dias_venda,
+                                              df['Valor da Venda'], erro_contagem)
+        posicoes_cubo = np.arange(len(df))
+        st.sidebar.subheader("Dimensões")
+        for dimensao in dimension_columns:
+            categorias = dimension_cube.categories[dimensao]
+            filtros_dimensao[dimensao] = st.sidebar.multiselect(
+                f"Filtrar {dimensao}", categorias,
+                default=[c for c in padroes.get('filtros', {}).get(dimensao, []) if c in categorias]
+            )
+        agrupamento = st.sidebar.selectbox("Agrupar por", ["Nenhum"] + dimension_columns,
+                                           index=default_index(["Nenhum"] + dimension_columns, padroes.get('agrupamento')))
+        agrupamento = None if agrupamento == "Nenhum" else agrupamento
+
+        # Com filtros, os KPIs, a série diária e as contagens de clientes únicos e novos (coortes do intervalo)
+        # vêm das células (combinação, dia) e dos sketches do cubo; as vendas filtradas só alimentam as visões
+        # que precisam das transações de cada cliente: totais por cliente (médias e medianas), novos vs.
+        # recorrentes, matrizes de coorte, RFM/LTV, consulta de cliente, sobrevivência, recompra, concentração,
+        # afinidade e, na comparação entre períodos, a receita de novos e as curvas de retenção
+        if any(filtros_dimensao.values()):
+            filtro_pelo_cubo = True
+            mascara_dimensao = dimension_cube.row_mask(filtros_dimensao)
+            df = df.loc[mascara_dimensao]
+            dias_venda = dias_venda[mascara_dimensao]
+            posicoes_cubo = posicoes_cubo[mascara_dimensao]
+            if df.empty:
+                st.warning("Nenhuma venda corresponde aos filtros de dimensão selecionados.")
+                return
+
+    # Aplicar o filtro de data
+    mask = (df['Data da Venda'].dt.date >= start_date) & (df['Data da Venda'].dt.date <= end_date)
+    filtered_df = df.loc[mask]
+
+    # Cálculos pesados em segundo plano, em etapas: cada parte da página é exibida assim que sua etapa termina
+    # Mudar qualquer entrada (colunas, filtros, datas, agregação) cancela o trabalho anterior
+    analysis_backend = get_analysis_backend()
+    periodo = agg_options[aggregation]
+    chave_trabalho = (chave_dados, id_column, date_column, definicao_valor,
+                      tuple((d, tuple(c)) for d, c in filtros_dimensao.items()), start_date, end_date,
+                      periodo, ANALYSIS_BACKEND)
+    executor = get_job_runner()
+
+    # Espaço de trabalho reaberto com as mesmas escolhas: os resultados salvos valem como trabalho concluído
+    salvos = st.session_state.get('resultados_espaco', {}) if espaco is not None else {}
+    etapas = analysis_stages(df, filtered_df, start_date, end_date, periodo, analysis_backend,
+                             chave=chave_trabalho[:5], diario=not filtro_pelo_cubo)
+    if (salvos.get('chave_analise') == chave_trabalho[1:]
+            and all(nome in salvos['resultados'] for nome, _, _ in etapas)):
+        executor.restore(sessao, chave_trabalho, etapas, salvos['resultados'])
+    trabalho = executor.submit(sessao, chave_trabalho, etapas)
+    if admissao is not None:
+        trabalho.on_done(admissao.hold())
+
+    # Prévia por amostragem em bases grandes: enquanto o cálculo completo não termina, a página inteira é
+    # calculada sobre uma amostra estratificada de clientes (pelo período da primeira compra) e trocada
+    # pelos resultados exatos assim que eles ficam prontos
+    amostra = None
+    usar_previa = len(df) >= PREVIEW_MIN_ROWS and st.sidebar.checkbox(
+        "Mostrar prévia por amostragem enquanto o cálculo completo roda", value=True)
+    if usar_previa and not trabalho.done:
+        chave_amostra = chave_trabalho[:5] + (periodo,)
+        if st.session_state.get('preview_sample_key') != chave_amostra:
+            with st.spinner("Sorteando a amostra de clientes..."):
+                st.session_state.preview_sample = StratifiedCustomerSample(
+                    df['ID do Cliente'], df['Data da Venda'], min(1.0, PREVIEW_ROWS / len(df)), periodo)
+            st.session_state.preview_sample_key = chave_amostra
+        amostra = st.session_state.preview_sample
+        trabalho_completo = trabalho
+        df = df.loc[amostra.row_mask]
+        mask = mask[amostra.row_mask]
+        filtered_df = df.loc[mask]
+        trabalho = executor.submit((sessao, 'previa'), chave_trabalho + ('previa',),
+                                   analysis_stages(df, filtered_df, start_date, end_date, periodo,
+                                                   analysis_backend, pesos=amostra.row_weight))
+        if admissao is not None:
+            trabalho.on_done(admissao.hold())
+        st.info(f"Prévia: resultados estimados com {format_br(len(amostra.customers))} de "
+                f"{format_br(amostra.total_customers)} clientes, sorteados por período da primeira compra. "
+                "Os resultados exatos substituem a prévia automaticamente quando o cálculo completo terminar.")
+    barra_progresso = st.empty()
+
+    # Cálculos principais
+    diario = None
+    if filtro_pelo_cubo:
+        diario = dimension_cube.daily_frame(filtros_dimensao, np.datetime64(start_date, 'D').astype(np.int64),
+                                            np.datetime64(end_date, 'D').astype(np.int64))
+    if amostra is not None:
+        metricas = sample_metrics(amostra, filtered_df, start_date, end_date)
+    else:
+        if filtro_pelo_cubo:
+            customer_sketches = dimension_cube.customer_sketches(filtros_dimensao)
+        else:
+            customer_sketches = build_customer_sketches(df['ID do Cliente'], dias_venda, erro_contagem)
+        metricas = exact_metrics(filtered_df, customer_sketches, start_date, end_date,
+                                 wait_for_stage(trabalho, 'totais', barra_progresso), diario)
+    margem_contribuicao = render_key_metrics(metricas)
+
+    # Comparação entre períodos, a partir dos agregados diários e das coortes do conjunto completo
+    if intervalo_comparacao is not None and amostra is not None:
+        st.info("A comparação entre períodos aparece quando o cálculo completo terminar.")
+    elif intervalo_comparacao is not None:
+        agregados_diarios = build_daily_aggregates(df['ID do Cliente'], df['Data da Venda'], df['Valor da Venda'])
+        coortes_completas = build_full_cohort_matrices(df['ID do Cliente'], df['Data da Venda'],
+                                                       df['Valor da Venda'], agg_options[aggregation])
+        intervalos = [(start_date, end_date), tuple(intervalo_comparacao)]
+        render_period_comparison(
+            intervalos,
+            [range_metrics(agregados_diarios, customer_sketches, inicio, fim) for inicio, fim in intervalos],
+            [cohort_retention_curve(coortes_completas, inicio, fim, agg_options[aggregation]) for inicio, fim in intervalos]
+        )
+
+    # Gráfico de vendas (novos vs recorrentes)
+    # Gráfico de vendas com os dias atípicos da série diária marcados (na prévia, só o gráfico)
+    sales_agg = wait_for_stage(trabalho, 'vendas', barra_progresso)
+    if amostra is None:
+        grafico_vendas = st.container()
+        if not filtro_pelo_cubo:
+            diario = wait_for_stage(trabalho, 'diario', barra_progresso)
+        atipicos = render_anomalies(diario) if diario is not None else None
+        with grafico_vendas:
+            render_sales_chart(sales_agg, aggregation, atipicos)
+    else:
+        render_sales_chart(sales_agg, aggregation)
+
+    # Análise de Coorte
+    cohort_matrices_data = wait_for_stage(trabalho, 'coortes', barra_progresso)
+    render_cohort_charts(cohort_matrices_data, aggregation)
+
+    # Previsão de receita das coortes (na prévia, só com o cálculo completo)
+    if amostra is None:
+        ultimo_periodo = int(period_index(day_numbers([filtered_df['Data da Venda'].max()]), periodo)[0])
+        render_revenue_forecast(cohort_matrices_data, aggregation, ultimo_periodo)
+
+    # Tabela de clientes indexada (base do RFM e da consulta por cliente)
+    indice_clientes, rfm_segmented = wait_for_stage(trabalho, 'clientes', barra_progresso)
+
+    # Concentração de receita (Pareto/ABC); na prévia, só com o cálculo completo (a amostra tem pesos por estrato)
+    rfm_segmented = rfm_segmented.copy()
+    if amostra is None:
+        concentracao = wait_for_stage(trabalho, 'concentracao', barra_progresso)
+        render_concentration(concentracao)
+        rfm_segmented['Classe ABC'] = concentracao.classes()
+
+    # Treemap RFM interativo (sobre uma cópia: o resultado do trabalho é reaproveitado nas próximas interações)
+    rfm_segmented = render_rfm(rfm_segmented, margem_contribuicao,
+                               amostra.customers['Peso'] if amostra is not None else None)
+    colunas_cliente = ['R', 'F', 'M', 'Segment'] + [c for c in ['Valor Esperado (12m)', 'LTV Preditivo (12m)'] if c in rfm_segmented.columns]
+    indice_clientes.attach(rfm_segmented[colunas_cliente])
+    render_customer_lookup(indice_clientes, filtered_df)
+
+    # Sobrevivência (churn com censura à direita) por coorte ou segmento
+    render_survival(indice_clientes)
+
+    # Intervalos entre compras consecutivas (por coorte ou segmento)
+    tempos_recompra = wait_for_stage(trabalho, 'recompra', barra_progresso)
+    render_repurchase_timing(tempos_recompra, {
+        "Coorte": indice_clientes.summary.set_index('ID do Cliente')['Cohort'],
+        "Segmento RFM": rfm_segmented['Segment'],
+    })
+
+    # Afinidade entre produtos (coluna de produto opcional); na prévia, só com o cálculo completo
+    coluna_produto = padroes.get('coluna_produto')
+    if amostra is None:
+        colunas_produto = [c for c in filtered_df.columns
+                           if c not in ('ID do Cliente', 'Data da Venda', 'Valor da Venda')]
+        coluna_produto = render_product_affinity(filtered_df, colunas_produto, rfm_segmented, coluna_produto)
+
+    # Visão agrupada pela dimensão escolhida
+    if agrupamento is not None and amostra is None:
+        render_dimension_breakdown(dimension_cube, filtros_dimensao, agrupamento, start_date, end_date,
+                                   aggregation, filtered_df, posicoes_cubo[mask.to_numpy()], rfm_segmented)
+
+    # Qualidade dos dados
+    render_quality_report(st.session_state.quality_report)
+
+    # Salvar como espaço de trabalho (com os resultados exatos, se o cálculo completo já terminou)
+    mapeamento = {
+        'coluna_id': 'ID do Cliente',
+        'coluna_data': 'Data da Venda',
+        'coluna_valor': 'Valor da Venda',
+        'colunas_dimensao': dimension_columns,
+        'filtros': {d: list(c) for d, c in filtros_dimensao.items()},
+        'agrupamento': agrupamento,
+        'intervalo': [start_date.isoformat(), end_date.isoformat()],
+        'agregacao': aggregation,
+        'formula': definicao_valor[0] if isinstance(definicao_valor, tuple) else None,
+        'coluna_produto': coluna_produto,
+    }
+    nome_padrao = espaco.name if espaco is not None else os.path.splitext(str(resumo_arquivos['Arquivo'].iloc[0]))[0]
+    render_workspace_save(df_padronizado, mapeamento, chave_trabalho,
+                          trabalho_completo if amostra is not None else trabalho, chaves_graficos, nome_padrao)
+
+    # Prévia exibida: espera o cálculo completo e recarrega a página com os resultados exatos
+    if amostra is not None:
+        wait_for_stage(trabalho_completo, trabalho_completo.stages[-1][0], barra_progresso)
+        st.rerun()
+
+# Função principal da aplicação
+def main_app():
+    st.title(f"Bem-vindo à nossa Ferramenta de Análise de Vendas, {st.session_state.user_data['nome']}!")
+
+    # Espaço de trabalho salvo: reabre os dados já padronizados, as escolhas e os resultados da análise
+    espaco = render_workspace_picker()
+    uploaded_files = None
+    remover_duplicadas = False
+    if espaco is not None:
+        st.caption(f"Espaço de trabalho: {espaco.name}")
+        chave_dados = ('espaco', espaco.id)
+        tamanho_arquivos = espaco.size_bytes
+
+        def carregar():
+            return (espaco.load_dataset(), pd.DataFrame(espaco.metadata['arquivos']),
+                    espaco.metadata['duplicadas'])
+    else:
+        # Upload dos arquivos (vários exports mensais ou por loja são combinados em uma única base)
+        uploaded_files = st.file_uploader("Escolha um ou mais arquivos CSV, CSV.GZ, XLSX, Parquet ou ZIP",
+                                          type=["csv", "gz", "xlsx", "parquet", "zip"], accept_multiple_files=True)
+        if not uploaded_files:
+            st.info("Por favor, faça o upload de um ou mais arquivos CSV, XLSX ou Parquet para começar a análise.")
+            return
+
+        # Limite de tamanho conferido antes de qualquer leitura (internos de .zip e .gz são conferidos na leitura)
+        try:
+            for arquivo in uploaded_files:
+                check_size(arquivo.name, arquivo.size, UPLOAD_MAX_BYTES)
+        except ValueError as e:
+            st.error(str(e))
+            return
+
+        if len(uploaded_files) > 1 or file_extension(uploaded_files[0].name) == '.zip':
+            remover_duplicadas = st.checkbox(
+                "Remover transações duplicadas entre arquivos", value=True,
+                help="Vendas idênticas repetidas em arquivos diferentes (exports sobrepostos) contam uma vez; "
+                     "vendas idênticas dentro do mesmo arquivo são mantidas.")
+        chave_dados = (upload_key(uploaded_files), remover_duplicadas)
+        tamanho_arquivos = sum(arquivo.size for arquivo in uploaded_files)
+
+        # Os arquivos enviados são gravados em disco em blocos e lidos de lá (memory map), sem cópias em memória
+        def carregar():
+            return load_sales_files(uploaded_files, dedupe=remover_duplicadas, add_source=True,
+                                    max_bytes=UPLOAD_MAX_BYTES)
+
+    # Admissão da análise: com muitas análises pesadas ao mesmo tempo, esta espera na fila
+    gerenciador = get_resource_manager()
+    gerenciador.spill_idle()
+    sessao = session_id()
+    tamanho_dados = gerenciador.dataset_bytes(sessao, chave_dados) or tamanho_arquivos
+    aviso_fila = st.empty()
+
+    def mostrar_fila(posicao, espera):
+        aviso_fila.info(f"Muitas análises em andamento. Sua análise está na posição {posicao} da fila "
+                        f"(aguardando há {espera:.0f}s).")
+
+    # A vaga continua reservada enquanto os trabalhos em segundo plano desta execução não terminam
+    with gerenciador.admit(sessao, ANALYSIS_MEMORY_FACTOR * tamanho_dados, on_wait=mostrar_fila) as admissao:
+        aviso_fila.empty()
+        if admissao.waited >= 1:
+            st.caption(f"Análise liberada após {admissao.waited:.0f}s na fila.")
+
+        # Motor DuckDB (opcional): CSV e Parquet enviados são consultados direto do disco
+        extensoes = {file_extension(arquivo.name) for arquivo in uploaded_files or []}
+        if (uploaded_files and ANALYSIS_ENGINE == 'duckdb'
+                and (extensoes <= {'.csv', '.csv.gz'} or extensoes == {'.parquet'})):
+            duckdb_app(uploaded_files, remover_duplicadas)
+        else:
+            pandas_app(chave_dados, carregar, gerenciador, sessao, espaco, admissao)
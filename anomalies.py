@@ -0,0 +1,86 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Janela da mediana móvel (dias, centrada no dia avaliado)
+DEFAULT_WINDOW = 28
+
+# Semanas da linha de base sazonal (mesmo dia da semana, centrada no dia avaliado)
+DEFAULT_SEASONAL_WEEKS = 8
+
+# Limiar do escore robusto (|x - mediana| / (1,4826 MAD)) a partir do qual o dia é atípico
+DEFAULT_THRESHOLD = 3.5
+
+# Fator que torna o MAD comparável ao desvio padrão em dados normais
+MAD_SCALE = 1.4826
+
+# Séries diárias avaliadas: coluna dos agregados diários -> (nome exibido, nome do valor esperado)
+SERIES = {'Receita': ('Receita', 'Receita Esperada'), 'Vendas': ('Transações', 'Transações Esperadas')}
+
+
+# Função para calcular mediana e MAD de janelas de vizinhos de cada dia: deslocamentos é a lista de
+# distâncias (em dias) dos vizinhos; vizinhos fora da série são ignorados
+# Uma matriz dias x vizinhos montada por índices: custo proporcional ao número de dias, não de vendas
+def _window_median_mad(valores, deslocamentos):
+    posicoes = np.arange(len(valores))[:, None] + np.asarray(deslocamentos)[None, :]
+    dentro = (posicoes >= 0) & (posicoes < len(valores))
+    janelas = np.where(dentro, valores[np.clip(posicoes, 0, len(valores) - 1)], np.nan)
+    # Dias sem nenhum vizinho ficam com NaN (sem aviso)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mediana = np.nanmedian(janelas, axis=1)
+        mad = np.nanmedian(np.abs(janelas - mediana[:, None]), axis=1)
+    return mediana, mad, dentro.sum(axis=1)
+
+
+# Linha de base móvel: mediana e MAD dos dias vizinhos (janela centrada, sem o próprio dia)
+def rolling_baseline(valores, janela=DEFAULT_WINDOW):
+    metade = janela // 2
+    deslocamentos = [d for d in range(-metade, metade + 1) if d != 0]
+    return _window_median_mad(np.asarray(valores, dtype=np.float64), deslocamentos)
+
+
+# Linha de base sazonal: mediana e MAD do mesmo dia da semana nas semanas vizinhas (sem o próprio dia)
+def seasonal_baseline(valores, semanas=DEFAULT_SEASONAL_WEEKS):
+    metade = semanas // 2
+    deslocamentos = [7 * s for s in range(-metade, metade + 1) if s != 0]
+    return _window_median_mad(np.asarray(valores, dtype=np.float64), deslocamentos)
+
+
+# Dias atípicos nas séries diárias de receita e de transações (diario: agregados diários indexados pelo
+# número do dia, sem lacunas); linha_de_base: 'sazonal' (mesmo dia da semana) ou 'movel' (mediana móvel)
+# Com poucos vizinhos (início da série) o dia não é avaliado; o MAD de cada dia tem como piso o MAD relativo
+# típico da série (mediana de MAD / esperado, no mínimo 1%): janelas curtas às vezes têm MAD quase zero
+# por acaso, e contagens pequenas oscilariam demais
+def detect_anomalies(diario, linha_de_base='sazonal', limiar=DEFAULT_THRESHOLD, janela=DEFAULT_WINDOW,
+                     semanas=DEFAULT_SEASONAL_WEEKS):
+    resultado = pd.DataFrame(index=pd.DatetimeIndex(diario.index.to_numpy().astype('datetime64[D]'), name='Data'))
+    atipico = np.zeros(len(diario), dtype=bool)
+    escore_maximo = np.zeros(len(diario))
+    for coluna, (nome, nome_esperado) in SERIES.items():
+        valores = diario[coluna].to_numpy(dtype=np.float64)
+        if linha_de_base == 'sazonal':
+            esperado, mad, vizinhos = seasonal_baseline(valores, semanas)
+            minimo_vizinhos = max(2, semanas // 2)
+        else:
+            esperado, mad, vizinhos = rolling_baseline(valores, janela)
+            minimo_vizinhos = max(3, janela // 2)
+        avaliado = vizinhos >= minimo_vizinhos
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relativo = np.abs(mad / esperado)[avaliado & (esperado != 0)]
+        piso = max(float(np.nanmedian(relativo)) if len(relativo) else 0.0, 0.01) * np.abs(esperado)
+        escala = MAD_SCALE * np.maximum(mad, piso)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            escore = np.where(escala > 0, (valores - esperado) / escala, 0.0)
+        escore = np.where(avaliado, np.nan_to_num(escore), 0.0)
+
+        resultado[nome] = valores
+        resultado[nome_esperado] = esperado
+        resultado[f"Escore {nome}"] = escore
+        atipico |= np.abs(escore) > limiar
+        escore_maximo = np.where(np.abs(escore) > np.abs(escore_maximo), escore, escore_maximo)
+
+    resultado['Atípico'] = atipico
+    resultado['Tipo'] = np.where(~atipico, '', np.where(escore_maximo > 0, 'Pico', 'Queda'))
+    return resultado
@@ -0,0 +1,158 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+ID = 'ID do Cliente'
+DATA = 'Data da Venda'
+VALOR = 'Valor da Venda'
+
+# Frequências do pandas dos períodos da análise (rótulo no fim do período; semanas terminam no domingo)
+PERIOD_FREQ = {'D': 'D', 'W': 'W-SUN', 'M': 'ME', 'Q': 'QE-DEC', 'Y': 'YE-DEC'}
+
+
+# Função para incluir os períodos sem vendas (zerados) entre o primeiro e o último, como faz o pd.Grouper
+def fill_periods(sales_agg, freq):
+    if sales_agg.empty:
+        return sales_agg
+    periodos = pd.date_range(sales_agg.index.min(), sales_agg.index.max(), freq=PERIOD_FREQ[freq],
+                             name=sales_agg.index.name)
+    return sales_agg.reindex(periodos, fill_value=0)
+
+
+# Interface dos motores de agregação usados pelo main_app (recebem o DataFrame completo e o intervalo de datas)
+# key: identificador opcional do conteúdo de df, para motores que guardam uma cópia convertida do conjunto
+class AnalysisBackend:
+    name = None
+
+    # Receita e número de transações por cliente (apenas vendas com ID de cliente)
+    def customer_totals(self, df, start_date, end_date, key=None):
+        raise NotImplementedError
+
+    # Vendas por período separadas entre primeira compra (Novo) e demais (Recorrente)
+    def sales_by_customer_type(self, df, start_date, end_date, freq, key=None):
+        raise NotImplementedError
+
+
+# Implementação de referência em pandas (o comportamento original do main_app)
+class PandasBackend(AnalysisBackend):
+    name = 'pandas'
+
+    def _filter(self, df, start_date, end_date):
+        datas = df[DATA].dt.date
+        return df.loc[(datas >= start_date) & (datas <= end_date), [ID, DATA, VALOR]]
+
+    def customer_totals(self, df, start_date, end_date, key=None):
+        filtrado = self._filter(df, start_date, end_date)
+        df_com_id = filtrado[filtrado[ID].notna() & (filtrado[ID] != '')]
+        return df_com_id.groupby(ID)[VALOR].agg(Receita='sum', Transacoes='size')
+
+    def sales_by_customer_type(self, df, start_date, end_date, freq, key=None):
+        filtrado = self._filter(df, start_date, end_date)
+        primeira = filtrado.groupby(ID)[DATA].transform('min')
+        tipo = np.where(filtrado[DATA] == primeira, 'Novo', 'Recorrente')
+        sales_agg = filtrado.assign(CustomerType=tipo).set_index(DATA).groupby(
+            [pd.Grouper(freq=PERIOD_FREQ[freq]), 'CustomerType'])[VALOR].sum().unstack(fill_value=0)
+        # O agrupamento por período e tipo só devolve os períodos com vendas
+        return fill_periods(sales_agg.reindex(columns=['Novo', 'Recorrente'], fill_value=0), freq)
+
+
+# Implementação com LazyFrames do Polars: o otimizador poda colunas e empurra o filtro de datas antes dos agrupamentos
+# O conjunto é convertido para o Polars uma vez por chave (key) e reaproveitado pelas consultas seguintes;
+# max_frames: conjuntos convertidos guardados (os menos usados recentemente saem primeiro)
+class PolarsBackend(AnalysisBackend):
+    name = 'polars'
+
+    def __init__(self, max_frames=4):
+        import polars as pl
+        self.pl = pl
+        self.max_frames = max_frames
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Conversão das colunas usadas para um DataFrame do Polars
+    def _convert(self, df):
+        pl = self.pl
+        colunas = df[[ID, DATA, VALOR]]
+        try:
+            return pl.from_pandas(colunas)
+        except Exception:
+            # IDs com tipos misturados (texto e número) não têm tipo Arrow único: comparar como texto
+            colunas = colunas.assign(**{ID: colunas[ID].where(colunas[ID].isna(), colunas[ID].astype(str))})
+            return pl.from_pandas(colunas)
+
+    # DataFrame do Polars do conjunto (da memória de conversões quando há chave)
+    def _frame(self, df, key):
+        if key is None:
+            return self._convert(df)
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                return frame
+        frame = self._convert(df)
+        with self._lock:
+            self._frames[key] = frame
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        return frame
+
+    def _lazy(self, df, start_date, end_date, key=None):
+        pl = self.pl
+        return self._frame(df, key).lazy().filter(pl.col(DATA).dt.date().is_between(start_date, end_date))
+
+    def customer_totals(self, df, start_date, end_date, key=None):
+        pl = self.pl
+        lf = self._lazy(df, start_date, end_date, key).filter(pl.col(ID).is_not_null())
+        if lf.collect_schema()[ID] == pl.String:
+            lf = lf.filter(pl.col(ID) != '')
+        totais = (lf.group_by(ID)
+                  .agg(pl.col(VALOR).sum().alias('Receita'), pl.len().alias('Transacoes'))
+                  .sort(ID)
+                  .collect())
+        return totais.to_pandas().set_index(ID)
+
+    # Rótulo do período igual ao do pd.Grouper (fim do período; semanas terminam no domingo)
+    def _bucket(self, freq):
+        pl = self.pl
+        data = pl.col(DATA)
+        if freq == 'D':
+            return data.dt.truncate('1d')
+        if freq == 'W':
+            return data.dt.truncate('1w').dt.offset_by('6d')
+        if freq == 'M':
+            return data.dt.truncate('1mo').dt.month_end()
+        if freq == 'Q':
+            return data.dt.truncate('1q').dt.offset_by('3mo').dt.offset_by('-1d')
+        return data.dt.truncate('1y').dt.offset_by('1y').dt.offset_by('-1d')
+
+    def sales_by_customer_type(self, df, start_date, end_date, freq, key=None):
+        pl = self.pl
+        # Vendas sem ID não têm primeira compra e contam como Recorrente, como no transform do pandas
+        primeira = pl.when(pl.col(ID).is_not_null()).then(pl.col(DATA).min().over(ID))
+        longo = (self._lazy(df, start_date, end_date, key)
+                 .with_columns(pl.when(pl.col(DATA) == primeira).then(pl.lit('Novo'))
+                               .otherwise(pl.lit('Recorrente')).alias('CustomerType'))
+                 .group_by(self._bucket(freq).alias(DATA), 'CustomerType')
+                 .agg(pl.col(VALOR).sum())
+                 .collect()
+                 .to_pandas())
+        sales_agg = longo.pivot_table(index=DATA, columns='CustomerType', values=VALOR,
+                                      aggfunc='sum', fill_value=0).sort_index()
+        sales_agg.index = pd.DatetimeIndex(sales_agg.index).astype('datetime64[ns]')
+        return fill_periods(sales_agg.reindex(columns=['Novo', 'Recorrente'], fill_value=0), freq)
+
+
+BACKENDS = {
+    'pandas': PandasBackend,
+    'polars': PolarsBackend,
+}
+
+
+# Função para obter o motor configurado para a implantação (cai para pandas se o Polars não estiver instalado)
+def get_backend(name):
+    try:
+        return BACKENDS.get(name, PandasBackend)()
+    except ImportError:
+        return PandasBackend()
@@ -0,0 +1,174 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Horizonte máximo de períodos por coorte nas granularidades finas, para limitar a memória das matrizes
+# (ANALISE_COORTE_MAX_DIAS e ANALISE_COORTE_MAX_SEMANAS); 1830 dias dão matrizes de até ~1830 x 1830 células
+MAX_PERIODS = {
+    'D': int(os.environ.get('ANALISE_COORTE_MAX_DIAS', 1830)),
+    'W': int(os.environ.get('ANALISE_COORTE_MAX_SEMANAS', 520)),
+}
+
+
+# Função para converter datas em números de dia (int32, dias desde 1970-01-01)
+def day_numbers(dates):
+    return np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int32)
+
+
+# Conversão vetorizada de números de dia em (ano, mês) com aritmética inteira (calendário civil)
+def _civil_from_days(days):
+    z = days.astype(np.int64) + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month
+
+
+# Função para converter números de dia em índices inteiros de período (mesmos ordinais do pandas para M/Q/Y)
+def period_index(days, period):
+    days = np.asarray(days, dtype=np.int32)
+    if period == 'D':
+        return days
+    if period == 'W':
+        # Semanas começando na segunda-feira (1970-01-01 foi uma quinta-feira)
+        return ((days + 3) // 7).astype(np.int32)
+    year, month = _civil_from_days(days)
+    if period == 'M':
+        return ((year - 1970) * 12 + month - 1).astype(np.int32)
+    if period == 'Q':
+        return ((year - 1970) * 4 + (month - 1) // 3).astype(np.int32)
+    if period == 'Y':
+        return (year - 1970).astype(np.int32)
+    raise ValueError(f"Granularidade não suportada: {period}")
+
+
+# Função para gerar os rótulos dos períodos a partir dos ordinais
+def period_labels(ordinals, period):
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    if period == 'D':
+        return ordinals.astype('datetime64[D]').astype(str).tolist()
+    if period == 'W':
+        return (ordinals * 7 - 3).astype('datetime64[D]').astype(str).tolist()
+    if period == 'M':
+        return [f"{1970 + o // 12}-{o % 12 + 1:02d}" for o in ordinals]
+    if period == 'Q':
+        return [f"{1970 + o // 4}Q{o % 4 + 1}" for o in ordinals]
+    return [str(1970 + o) for o in ordinals]
+
+
+# Códigos inteiros de cliente, período, coorte e primeira/última compra para cada transação
+def _cohort_layout(customer_ids, dates, period, max_periods=None):
+    cust, _ = pd.factorize(pd.Series(customer_ids).reset_index(drop=True))
+
+    # Vendas sem ID de cliente não entram nas coortes
+    valido = cust >= 0
+    cust = cust[valido].astype(np.int64)
+    if len(cust) == 0:
+        return None
+    per = period_index(day_numbers(dates)[valido], period)
+
+    n_clientes = int(cust.max()) + 1
+    primeiro = np.full(n_clientes, np.iinfo(np.int32).max, dtype=np.int32)
+    ultimo = np.full(n_clientes, np.iinfo(np.int32).min, dtype=np.int32)
+    np.minimum.at(primeiro, cust, per)
+    np.maximum.at(ultimo, cust, per)
+
+    # Linhas da matriz: apenas coortes que existem; colunas: deslocamento em períodos (com horizonte limitado)
+    coortes, linha_cliente = np.unique(primeiro, return_inverse=True)
+    fim = int(per.max())
+    if max_periods is None:
+        max_periods = MAX_PERIODS.get(period)
+    n_periodos = fim - int(coortes[0]) + 1
+    if max_periods is not None:
+        n_periodos = min(n_periodos, max_periods)
+
+    return {
+        'cust': cust,
+        'valido': valido,
+        'offset': (per - primeiro[cust]).astype(np.int64),
+        'primeiro': primeiro,
+        'ultimo': ultimo,
+        'linha_cliente': linha_cliente.astype(np.int64),
+        'coortes': coortes,
+        'fim': fim,
+        'n_periodos': n_periodos,
+    }
+
+
+# Matrizes densas coorte × período (retenção e receita), calculadas com bincount em uma única passada
+def cohort_matrices(customer_ids, dates, values, period, max_periods=None):
+    layout = _cohort_layout(customer_ids, dates, period, max_periods)
+    if layout is None:
+        return None
+
+    cust = layout['cust']
+    offset = layout['offset']
+    linha_cliente = layout['linha_cliente']
+    n_linhas = len(layout['coortes'])
+    n = layout['n_periodos']
+    tamanho = n_linhas * n
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64)[layout['valido']])
+
+    # Transações além do horizonte ficam fora das matrizes
+    dentro = offset < n
+    celula = linha_cliente[cust[dentro]] * n + offset[dentro]
+    revenue = np.bincount(celula, weights=values[dentro], minlength=tamanho).reshape(n_linhas, n)
+    pares = pd.unique(cust[dentro] * n + offset[dentro])
+    active = np.bincount(linha_cliente[pares // n] * n + pares % n, minlength=tamanho).reshape(n_linhas, n)
+    sizes = np.bincount(linha_cliente, minlength=n_linhas)
+
+    # Retenção: fração da coorte cuja última compra ocorreu no período p ou depois
+    ultimo_offset = np.minimum(layout['ultimo'] - layout['primeiro'], n - 1).astype(np.int64)
+    ultimos = np.bincount(linha_cliente * n + ultimo_offset, minlength=tamanho).reshape(n_linhas, n)
+
+    return assemble_cohort_matrices(layout['coortes'], layout['fim'], revenue, active, ultimos, sizes, period)
+
+
+# Função para montar os DataFrames finais a partir das matrizes densas (compartilhada entre os motores)
+# 'ages' é a idade de cada coorte no último período dos dados (fim - coorte) e 'truncated' marca as coortes
+# mais velhas que o horizonte: nelas a última coluna da matriz não é o período atual
+def assemble_cohort_matrices(coortes, fim, revenue, active, ultimos, sizes, period):
+    n = revenue.shape[1]
+    sobreviventes = np.cumsum(ultimos[:, ::-1], axis=1)[:, ::-1]
+
+    idades = fim - np.asarray(coortes, dtype=np.int64)
+    observado = np.arange(n)[None, :] <= idades[:, None]
+    cumulative_revenue = np.where(observado, np.cumsum(revenue, axis=1), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        revenue_retention = np.where(observado, revenue / revenue[:, :1], np.nan)
+    revenue_retention[~np.isfinite(revenue_retention)] = np.nan
+
+    index = pd.Index(period_labels(coortes, period), name='CohortDate')
+    columns = pd.RangeIndex(n, name='Periods')
+    frame = lambda m: pd.DataFrame(m, index=index, columns=columns)
+    return {
+        'sizes': pd.Series(sizes, index=index, name='CohortSize'),
+        'retention': frame(np.where(observado, sobreviventes / sizes[:, None], np.nan)),
+        'revenue': frame(np.where(observado, revenue, np.nan)),
+        'active': frame(np.where(observado, active, np.nan)),
+        'cumulative_revenue': frame(cumulative_revenue),
+        'cumulative_arpu': frame(cumulative_revenue / sizes[:, None]),
+        'revenue_retention': frame(revenue_retention),
+        'ages': pd.Series(idades, index=index, name='Idade'),
+        'truncated': pd.Series(idades >= n, index=index, name='Truncada'),
+    }
+
+
+# Curva média de retenção das coortes selecionadas (máscara de linhas), ponderada pelo tamanho das coortes;
+# medida escolhe outra matriz por cliente da coorte (ex.: 'cumulative_arpu')
+def average_retention(matrices, linhas=None, medida='retention'):
+    retencao = matrices[medida] if linhas is None else matrices[medida].loc[linhas]
+    tamanhos = matrices['sizes'].to_numpy(dtype=np.float64)
+    if linhas is not None:
+        tamanhos = tamanhos[linhas]
+    tamanhos = tamanhos[:, None]
+    observado = retencao.notna().to_numpy()
+    peso = (tamanhos * observado).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        curva = np.nansum(retencao.to_numpy() * tamanhos, axis=0) / peso
+    return pd.Series(curva, index=retencao.columns, name='Retenção').dropna()
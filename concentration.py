@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Limites da curva ABC: classe A até 80% da receita acumulada, B até 95%, C o restante
+ABC_THRESHOLDS = (0.8, 0.95)
+
+# Frações do topo de clientes exibidas ("os 1%, 5% e 20% que mais compram")
+TOP_FRACTIONS = [0.01, 0.05, 0.2]
+
+
+# Concentração de receita por cliente (Pareto / ABC): uma ordenação decrescente e uma soma acumulada dão
+# a curva de Pareto (Lorenz invertida), o índice de Gini, a participação do topo e os cortes das classes
+# Receitas negativas (devoluções maiores que as compras) entram como zero
+class RevenueConcentration:
+    def __init__(self, receitas, limites=ABC_THRESHOLDS):
+        receitas = pd.Series(receitas)
+        self.index = receitas.index
+        self.values = np.clip(np.nan_to_num(receitas.to_numpy(dtype=np.float64)), 0, None)
+        self.limites = tuple(limites)
+
+        # Receita acumulada dos k maiores clientes (k = 1..n), em uma única ordenação dos valores
+        ordenados = np.sort(self.values)[::-1]
+        self.cumulative = np.cumsum(ordenados)
+        self.total = float(self.cumulative[-1]) if len(ordenados) else 0.0
+
+        # Valor de corte de cada classe: receita do cliente em que a participação acumulada atinge o limite
+        # (empates no valor de corte ficam na classe de cima)
+        if self.total > 0:
+            posicoes = np.searchsorted(self.cumulative, np.array(self.limites) * self.total, side='left')
+            self.cortes = ordenados[np.minimum(posicoes, len(ordenados) - 1)]
+        else:
+            self.cortes = np.full(len(self.limites), np.inf)
+
+    def __len__(self):
+        return len(self.values)
+
+    # Participação na receita dos k maiores clientes
+    def _share(self, k):
+        k = np.asarray(k)
+        acumulado = np.where(k > 0, self.cumulative[np.maximum(k, 1) - 1], 0.0)
+        return acumulado / self.total if self.total else np.zeros(k.shape)
+
+    # Participação na receita da fração do topo (ex.: 0.2 = os 20% de clientes com maior receita)
+    def top_share(self, fracao):
+        return float(self._share(int(np.ceil(fracao * len(self)))))
+
+    # Índice de Gini pela soma das participações acumuladas (0 = receita igual entre clientes, 1 = um só cliente)
+    def gini(self):
+        n = len(self)
+        if n == 0 or not self.total:
+            return np.nan
+        return float((2 * (self.cumulative / self.total).sum() - (n + 1)) / n)
+
+    # Curva de Pareto em até `pontos` pontos: fração dos clientes (do maior para o menor) x fração da receita
+    def pareto_curve(self, pontos=200):
+        k = np.unique(np.round(np.linspace(0, len(self), pontos + 1)).astype(np.int64))
+        return pd.DataFrame({
+            '% dos Clientes': k / max(len(self), 1),
+            '% da Receita': self._share(k),
+        })
+
+    # Classe A/B/C de cada cliente, pelo valor de corte (sem ordenar os clientes)
+    def classes(self):
+        rotulos = np.array(['A', 'B', 'C'])
+        posicao = np.full(len(self), 2, dtype=np.int8)
+        posicao[self.values >= self.cortes[1]] = 1
+        posicao[self.values >= self.cortes[0]] = 0
+        return pd.Series(pd.Categorical.from_codes(posicao, categories=rotulos), index=self.index, name='Classe ABC')
+
+    # Resumo por classe: clientes, receita e participações
+    def summary(self):
+        classes = self.classes()
+        resumo = pd.DataFrame({
+            'Clientes': classes.value_counts(sort=False),
+            'Receita': pd.Series(self.values, index=self.index).groupby(classes, observed=False).sum(),
+        })
+        resumo['% dos Clientes'] = resumo['Clientes'] / max(len(self), 1)
+        resumo['% da Receita'] = resumo['Receita'] / self.total if self.total else 0.0
+        resumo.index.name = 'Classe ABC'
+        return resumo
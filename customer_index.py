@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from cohort_engine import day_numbers, period_index, period_labels
+
+NS_POR_DIA = 86_400_000_000_000
+
+
+# Tabela de clientes indexada: uma linha por código de cliente e as transações em layout CSR
+# (as vendas do cliente c são as posições order[offsets[c]:offsets[c + 1]] do DataFrame de origem)
+class CustomerIndex:
+    def __init__(self, customer_ids, dates, values):
+        customer_ids = pd.Series(customer_ids).reset_index(drop=True)
+        codes, uniques = pd.factorize(customer_ids)
+        datas = np.asarray(dates, dtype='datetime64[ns]').astype(np.int64)
+        valores = np.nan_to_num(np.asarray(values, dtype=np.float64))
+
+        # Vendas sem ID de cliente não entram na tabela
+        posicoes = np.flatnonzero(codes >= 0)
+        codes = codes[posicoes]
+        n = len(uniques)
+
+        # Índice CSR: ordenação estável por código mantém as vendas de cada cliente na ordem original
+        ordem = np.argsort(codes, kind='stable')
+        self.order = posicoes[ordem]
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=n), out=self.offsets[1:])
+
+        # Cada cliente é uma fatia contígua das datas em ordem CSR: primeira/última compra com reduceat
+        datas_cliente = datas[self.order]
+        inicio = self.offsets[:-1]
+        primeira = np.minimum.reduceat(datas_cliente, inicio) if n else np.empty(0, dtype=np.int64)
+        ultima = np.maximum.reduceat(datas_cliente, inicio) if n else np.empty(0, dtype=np.int64)
+        hoje = datas.max() if len(datas) else 0
+
+        # Dias distintos de compra e receita do primeiro dia (estatísticas do BG/NBD e do Gamma-Gamma:
+        # várias vendas no mesmo dia contam como uma única transação)
+        dias = datas[posicoes] // NS_POR_DIA
+        ordem_dias = np.lexsort((dias, codes))
+        c, d = codes[ordem_dias], dias[ordem_dias]
+        novo_dia = np.ones(len(c), dtype=bool)
+        novo_dia[1:] = (c[1:] != c[:-1]) | (d[1:] != d[:-1])
+        primeiro_dia = np.zeros(len(codes), dtype=bool)
+        if n:
+            primeiro_dia = dias == (primeira // NS_POR_DIA)[codes]
+
+        # Índice por hash sobre o ID original (busca O(1) do código do cliente)
+        self.ids = pd.Index(uniques, name='ID do Cliente')
+        self._ids_texto = None
+        self.summary = pd.DataFrame({
+            'ID do Cliente': uniques,
+            'FirstPurchase': primeira.astype('datetime64[ns]'),
+            'LastPurchase': ultima.astype('datetime64[ns]'),
+            'Frequency': np.diff(self.offsets),
+            'Monetary': np.bincount(codes, weights=valores[posicoes], minlength=n),
+            'PurchaseDays': np.bincount(c[novo_dia], minlength=n),
+            'FirstDayMonetary': np.bincount(codes[primeiro_dia], weights=valores[posicoes][primeiro_dia],
+                                            minlength=n),
+            'Recency': hoje // NS_POR_DIA - ultima // NS_POR_DIA,
+            'T': hoje // NS_POR_DIA - primeira // NS_POR_DIA,
+        })
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Tabela RFM (Recency, Frequency, Monetary, T, mais dias distintos de compra e receita do primeiro dia)
+    # indexada pelo ID original
+    def rfm(self):
+        return self.summary.set_index('ID do Cliente')[['Recency', 'Frequency', 'Monetary', 'T',
+                                                        'PurchaseDays', 'FirstDayMonetary']]
+
+    # Adiciona a coorte (período da primeira compra) na granularidade escolhida
+    def add_cohort(self, period):
+        primeiro = period_index(day_numbers(self.summary['FirstPurchase']), period)
+        self.summary['Cohort'] = period_labels(primeiro, period)
+
+    # Copia para a tabela colunas calculadas por cliente (scores R/F/M, segmento, LTV), alinhadas pelo ID
+    def attach(self, colunas):
+        alinhadas = colunas.reindex(self.ids)
+        for coluna in alinhadas.columns:
+            self.summary[coluna] = alinhadas[coluna].to_numpy()
+
+    # Código interno do cliente, aceitando o ID digitado como texto (ou None se não existir)
+    def code_of(self, customer_id):
+        if customer_id in self.ids:
+            return int(self.ids.get_loc(customer_id))
+        # IDs numéricos (inteiros ou float, quando a coluna tem vazios) digitados como texto
+        if self.ids.dtype.kind in 'iuf':
+            numero = pd.to_numeric(pd.Series([str(customer_id).strip()]), errors='coerce').iloc[0]
+            if pd.notna(numero) and numero in self.ids:
+                return int(self.ids.get_loc(numero))
+        if self._ids_texto is None:
+            self._ids_texto = pd.Index(self.ids.astype(str))
+        texto = str(customer_id).strip()
+        if texto in self._ids_texto:
+            codigo = self._ids_texto.get_loc(texto)
+            # IDs distintos podem ter o mesmo texto (por exemplo, 1 e '1'): usa o primeiro
+            if isinstance(codigo, slice):
+                return int(codigo.start)
+            if isinstance(codigo, np.ndarray):
+                return int(np.flatnonzero(codigo)[0])
+            return int(codigo)
+        return None
+
+    # Linha do resumo do cliente
+    def customer(self, code):
+        return self.summary.iloc[code]
+
+    # Posições (no DataFrame de origem) das vendas do cliente, em ordem original
+    def transaction_positions(self, code):
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Fator das cercas de Tukey para outliers de valor (Q3 + k * IQR); 3 marca apenas valores extremos
+OUTLIER_IQR_FACTOR = 3.0
+
+
+# Função para montar o relatório de qualidade dos dados em uma única passada vetorizada
+# datas_invalidas: linhas descartadas antes (data vazia ou impossível de converter)
+def quality_report(df, datas_invalidas=0, id_column='ID do Cliente', value_column='Valor da Venda'):
+    ids = df[id_column]
+    sem_id = ids.isna().to_numpy()
+    if ids.dtype == object:
+        sem_id |= (ids.astype(str).str.strip() == '').to_numpy() & ~sem_id
+
+    valores = pd.to_numeric(df[value_column], errors='coerce').to_numpy(dtype=np.float64)
+    valor_invalido = np.isnan(valores)
+    valores_limpos = np.where(valor_invalido, 0.0, valores)
+
+    # Outliers: apenas valores positivos acima da cerca superior de Tukey
+    positivos = valores[valores > 0]
+    limite_outlier = None
+    outliers = np.zeros(len(valores), dtype=bool)
+    if len(positivos) >= 4:
+        q1, q3 = np.percentile(positivos, [25, 75])
+        limite_outlier = float(q3 + OUTLIER_IQR_FACTOR * (q3 - q1))
+        outliers = valores > limite_outlier
+
+    duplicadas = pd.util.hash_pandas_object(df, index=False, categorize=False).duplicated().to_numpy()
+
+    return {
+        'linhas_lidas': int(len(df) + datas_invalidas),
+        'linhas_validas': int(len(df)),
+        'datas_invalidas': int(datas_invalidas),
+        'vendas_sem_id': int(sem_id.sum()),
+        'receita_sem_id': float(valores_limpos[sem_id].sum()),
+        'receita_total': float(valores_limpos.sum()),
+        'valores_invalidos': int(valor_invalido.sum()),
+        'valores_negativos': int((valores < 0).sum()),
+        'receita_negativa': float(valores_limpos[valores_limpos < 0].sum()),
+        'valores_zero': int((valores == 0).sum()),
+        'linhas_duplicadas': int(duplicadas.sum()),
+        'receita_duplicada': float(valores_limpos[duplicadas].sum()),
+        'limite_outlier': limite_outlier,
+        'outliers': int(outliers.sum()),
+        'receita_outliers': float(valores_limpos[outliers].sum()),
+    }
+
+
+# Função para gravar o relatório como artefato JSON (uso em lote)
+def write_report(relatorio, caminho):
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
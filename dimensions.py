@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+from sketches import DistinctSketch, SketchSet, hash_ids, precision_for_error, standard_error
+
+# Rótulo da categoria das vendas sem valor na coluna de dimensão
+EMPTY_CATEGORY = '(vazio)'
+
+
+# Cubo de dimensões: cada combinação de categorias (loja × canal × ...) vira um código inteiro,
+# e receita, vendas e sketches de clientes ficam pré-agregados por (combinação, dia)
+class DimensionCube:
+    def __init__(self, dimensoes, customer_ids, days, values, erro_relativo=0.01):
+        dimensoes = dimensoes.reset_index(drop=True)
+        self.names = list(dimensoes.columns)
+        self.categories = {}
+        codigos = []
+        for nome in self.names:
+            try:
+                codes, categorias = pd.factorize(dimensoes[nome], sort=True)
+            except TypeError:
+                # Colunas com tipos misturados não ordenam: categorias na ordem de aparição
+                codes, categorias = pd.factorize(dimensoes[nome])
+            rotulos = [str(c) for c in categorias]
+            if (codes < 0).any():
+                codes = np.where(codes < 0, len(rotulos), codes)
+                rotulos.append(EMPTY_CATEGORY)
+            self.categories[nome] = pd.Index(rotulos)
+            codigos.append(codes)
+
+        # Código da combinação de cada venda e a tabela combinação → código de cada dimensão
+        combinacoes = pd.MultiIndex.from_arrays(codigos, names=self.names)
+        self.row_combo, unicos = pd.factorize(combinacoes)
+        self.combo_codes = np.column_stack([unicos.get_level_values(i).to_numpy() for i in range(len(self.names))])
+
+        # Células (combinação, dia): a chave combo * n_dias + dia mantém cada combinação em uma faixa contígua
+        days = np.asarray(days, dtype=np.int64)
+        valores = np.nan_to_num(np.asarray(values, dtype=np.float64))
+        self.first_day = int(days.min())
+        self.n_days = int(days.max()) - self.first_day + 1
+        chave = self.row_combo.astype(np.int64) * self.n_days + (days - self.first_day)
+        celulas, inverso = np.unique(chave, return_inverse=True)
+        self.cell_combo = celulas // self.n_days
+        self.cell_day = celulas % self.n_days + self.first_day
+        self.cell_revenue = np.bincount(inverso, weights=valores, minlength=len(celulas))
+        self.cell_sales = np.bincount(inverso, minlength=len(celulas))
+
+        customer_ids = pd.Series(customer_ids).reset_index(drop=True)
+        com_id = customer_ids.notna().to_numpy()
+        self.cell_revenue_id = np.bincount(inverso, weights=valores * com_id, minlength=len(celulas))
+        self.cell_sales_id = np.bincount(inverso, weights=com_id, minlength=len(celulas))
+        clientes, uniques = pd.factorize(customer_ids[com_id])
+        self.sketches = SketchSet(chave[com_id], hash_ids(uniques)[clientes], precision_for_error(erro_relativo))
+
+    # Combinações selecionadas pelos filtros {dimensão: [categorias]} (lista vazia = todas)
+    def selected_combos(self, filtros):
+        selecionadas = np.ones(len(self.combo_codes), dtype=bool)
+        for i, nome in enumerate(self.names):
+            escolhidas = filtros.get(nome)
+            if escolhidas:
+                codigos = self.categories[nome].get_indexer(escolhidas)
+                selecionadas &= np.isin(self.combo_codes[:, i], codigos[codigos >= 0])
+        return selecionadas
+
+    # Máscara das vendas que passam nos filtros (comparação de códigos inteiros, sem varrer os textos)
+    def row_mask(self, filtros):
+        return self.selected_combos(filtros)[self.row_combo]
+
+    # Sketch dos clientes das combinações (índices) com compra entre start_day e end_day (inclusive)
+    def merge_customers(self, combos, start_day, end_day):
+        sketch = None
+        for combo in combos:
+            parcial = self.sketches.merge_range(combo * self.n_days + start_day - self.first_day,
+                                                combo * self.n_days + end_day - self.first_day)
+            sketch = parcial if sketch is None else sketch.merge(parcial)
+        return sketch
+
+    # Série diária das combinações selecionadas no intervalo de dias, do primeiro ao último dia com venda (mesmas
+    # colunas do daily_frame, exceto as de clientes novos, que dependem da primeira compra de cada cliente e não
+    # estão nas células); None se não há vendas
+    def daily_frame(self, filtros, start_day, end_day):
+        celulas = self.selected_combos(filtros)[self.cell_combo] & (self.cell_day >= start_day) & (self.cell_day <= end_day)
+        if not celulas.any():
+            return None
+        dias = self.cell_day[celulas]
+        base = int(dias.min())
+        n = int(dias.max()) - base + 1
+        colunas = {
+            'Receita': self.cell_revenue,
+            'Vendas': self.cell_sales,
+            'ReceitaComID': self.cell_revenue_id,
+            'VendasComID': self.cell_sales_id,
+        }
+        return pd.DataFrame({nome: np.bincount(dias - base, weights=valores[celulas], minlength=n)
+                             for nome, valores in colunas.items()},
+                            index=pd.RangeIndex(base, base + n, name='Dia'))
+
+    # Sketches de clientes das combinações selecionadas (interface do CustomerSketchStore)
+    def customer_sketches(self, filtros):
+        return CubeCustomerSketches(self, np.flatnonzero(self.selected_combos(filtros)))
+
+    # Totais por categoria da dimensão agrupada, no intervalo de dias e respeitando os filtros
+    def group_totals(self, filtros, dimensao, start_day, end_day):
+        i = self.names.index(dimensao)
+        selecionadas = self.selected_combos(filtros)
+        celulas = selecionadas[self.cell_combo] & (self.cell_day >= start_day) & (self.cell_day <= end_day)
+        grupo = self.combo_codes[self.cell_combo[celulas], i]
+        n = len(self.categories[dimensao])
+        totais = pd.DataFrame({
+            'Receita': np.bincount(grupo, weights=self.cell_revenue[celulas], minlength=n),
+            'Vendas': np.bincount(grupo, weights=self.cell_sales[celulas], minlength=n),
+        }, index=pd.Index(self.categories[dimensao], name=dimensao))
+
+        # Clientes únicos por categoria: união dos sketches das combinações da categoria no intervalo
+        clientes = np.zeros(n, dtype=np.int64)
+        for codigo in np.unique(grupo):
+            combos = np.flatnonzero(selecionadas & (self.combo_codes[:, i] == codigo))
+            sketch = self.merge_customers(combos, start_day, end_day)
+            clientes[codigo] = sketch.count() if sketch is not None else 0
+        totais['Clientes'] = clientes
+        totais = totais[totais['Vendas'] > 0]
+        totais['Ticket Médio'] = totais['Receita'] / totais['Vendas']
+        totais['Receita por Cliente'] = totais['Receita'] / totais['Clientes'].where(totais['Clientes'] > 0)
+        return totais.sort_values('Receita', ascending=False)
+
+    # Receita diária por categoria da dimensão agrupada (linhas = dias, colunas = categorias)
+    def group_daily(self, filtros, dimensao, start_day, end_day):
+        i = self.names.index(dimensao)
+        celulas = self.selected_combos(filtros)[self.cell_combo] & (self.cell_day >= start_day) & (self.cell_day <= end_day)
+        longo = pd.DataFrame({
+            'Dia': self.cell_day[celulas].astype('datetime64[D]').astype('datetime64[ns]'),
+            dimensao: self.categories[dimensao][self.combo_codes[self.cell_combo[celulas], i]],
+            'Receita': self.cell_revenue[celulas],
+        })
+        return longo.pivot_table(index='Dia', columns=dimensao, values='Receita', aggfunc='sum', fill_value=0)
+
+    # Categoria de aquisição de cada cliente (categoria da primeira compra)
+    # rows: posições, no DataFrame usado para construir o cubo, das vendas consideradas
+    def acquisition_category(self, dimensao, customer_ids, dates, rows):
+        i = self.names.index(dimensao)
+        codigos = self.combo_codes[self.row_combo[rows], i]
+        clientes, uniques = pd.factorize(pd.Series(customer_ids).reset_index(drop=True))
+        datas = np.asarray(dates, dtype='datetime64[ns]')
+        com_id = clientes >= 0
+        ordem = np.lexsort((datas[com_id], clientes[com_id]))
+        clientes_ordenados = clientes[com_id][ordem]
+        primeiras = ordem[np.r_[True, clientes_ordenados[1:] != clientes_ordenados[:-1]]]
+        return pd.Series(self.categories[dimensao][codigos[com_id][primeiras]], index=uniques, name=dimensao)
+
+
+# Contagem de clientes novos no intervalo: clientes até o fim do intervalo menos os clientes de antes dele
+class _NewCustomers:
+    def __init__(self, ate_fim, antes):
+        self.is_exact = ate_fim.is_exact and antes.is_exact
+        self._count = max(ate_fim.count() - antes.count(), 0)
+
+    def count(self):
+        return self._count
+
+
+# Clientes únicos e novos das combinações selecionadas, respondidos pelos sketches das células (combinação, dia),
+# sem varrer as vendas filtradas: um cliente é novo no intervalo se a primeira compra dele nas combinações
+# selecionadas cai no intervalo (contagem das coortes do intervalo)
+class CubeCustomerSketches:
+    def __init__(self, cube, combos):
+        self.cube = cube
+        self.combos = combos
+
+    @property
+    def standard_error(self):
+        return standard_error(self.cube.sketches.p)
+
+    def _merge(self, start_day, end_day):
+        sketch = self.cube.merge_customers(self.combos, start_day, end_day)
+        return sketch if sketch is not None else DistinctSketch(self.cube.sketches.p)
+
+    # Clientes únicos com compra entre start_day e end_day (inclusive)
+    def unique_customers(self, start_day, end_day):
+        return self._merge(start_day, end_day)
+
+    # Clientes cuja primeira compra (nas combinações selecionadas) ocorreu entre start_day e end_day (inclusive)
+    def new_customers(self, start_day, end_day):
+        return _NewCustomers(self._merge(self.cube.first_day, end_day),
+                             self._merge(self.cube.first_day, start_day - 1))
@@ -0,0 +1,297 @@
+import os
+import re
+import tempfile
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from backends import fill_periods
+from cohort_engine import MAX_PERIODS, assemble_cohort_matrices
+from ingestion import DATE_FORMATS
+
+# Número do dia (desde 1970-01-01) de cada venda, base de todos os períodos
+_DIA = "(CAST(data AS DATE) - DATE '1970-01-01')"
+
+# Ordinais de período em SQL, com as mesmas fórmulas inteiras do cohort_engine
+PERIOD_SQL = {
+    'D': _DIA,
+    'W': f"CAST(floor(({_DIA} + 3) / 7) AS INTEGER)",
+    'M': "(year(data) - 1970) * 12 + month(data) - 1",
+    'Q': "(year(data) - 1970) * 4 + quarter(data) - 1",
+    'Y': "year(data) - 1970",
+}
+
+# Rótulos dos períodos do gráfico de vendas, iguais aos do pd.Grouper (fim do período; semana termina no domingo)
+BUCKET_SQL = {
+    'D': "CAST(data AS DATE)",
+    'W': "CAST(date_trunc('week', data) AS DATE) + 6",
+    'M': "last_day(data)",
+    'Q': "CAST(date_trunc('quarter', data) + INTERVAL 3 MONTH - INTERVAL 1 DAY AS DATE)",
+    'Y': "make_date(year(data), 12, 31)",
+}
+
+
+# Função para citar identificadores (nomes de coluna) em SQL
+def quote_identifier(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+# Elementos aceitos em uma fórmula de valor (além dos aliases): números, operadores e parênteses
+_FORMULA_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d+)?)|([-+*/()]))")
+
+
+# Função para converter a fórmula do Valor da Venda (com aliases das colunas) em uma expressão SQL
+# A fórmula é reconstruída token a token: aliases viram colunas citadas, e qualquer outro texto é recusado
+def formula_expression(formula, column_inputs):
+    aliases = sorted(((alias, col) for col, alias in column_inputs.items() if alias), key=lambda item: -len(item[0]))
+    partes = []
+    posicao = 0
+    while posicao < len(formula):
+        if formula[posicao].isspace():
+            posicao += 1
+            continue
+        alias = next(((a, col) for a, col in aliases if formula.startswith(a, posicao)), None)
+        if alias is not None:
+            partes.append(quote_identifier(alias[1]))
+            posicao += len(alias[0])
+            continue
+        token = _FORMULA_TOKEN.match(formula, posicao)
+        if token is None:
+            raise ValueError(f"Fórmula inválida perto de: {formula[posicao:posicao + 20]}")
+        partes.append(token.group(1) or token.group(2))
+        posicao = token.end()
+    return ' '.join(partes)
+
+
+# Motor de consultas out-of-core: o arquivo enviado é lido direto pelo DuckDB, sem passar pelo pandas
+class DuckDBEngine:
+    def __init__(self, paths, threads=None, memory_limit=None, temp_directory=None, deduplicate=False):
+        # Configuração passada ao connect (valores vindos do ambiente não são interpolados em SQL)
+        config = {
+            'threads': int(threads or os.cpu_count() or 1),
+            'preserve_insertion_order': False,
+            'temp_directory': temp_directory or os.path.join(tempfile.gettempdir(), 'duckdb_spill'),
+        }
+        if memory_limit:
+            config['memory_limit'] = str(memory_limit)
+        self.con = duckdb.connect(config=config)
+
+        # Vários arquivos do mesmo formato são lidos em paralelo e alinhados pelo nome das colunas
+        if isinstance(paths, str):
+            paths = [paths]
+        # Em CSV as datas chegam como texto e são lidas pelos DATE_FORMATS (o detector de tipos do DuckDB poderia
+        # ler dd/mm/aaaa como mm/dd/aaaa, divergindo do pandas)
+        if paths[0].lower().endswith('.parquet'):
+            leitor, opcoes = 'read_parquet', "union_by_name = true"
+        else:
+            leitor, opcoes = 'read_csv_auto', ("union_by_name = true, "
+                                               "auto_type_candidates = ['BOOLEAN', 'BIGINT', 'DOUBLE', 'VARCHAR']")
+        caminhos = ', '.join("'" + path.replace("'", "''") + "'" for path in paths)
+        leitura = f"{leitor}([{caminhos}], {opcoes})"
+        if deduplicate and len(paths) > 1:
+            # Só repetições entre arquivos diferentes saem: a k-ésima ocorrência de uma linha em um arquivo é
+            # mantida apenas no primeiro arquivo que a tem (compras idênticas no mesmo arquivo continuam)
+            colunas = ', '.join(quote_identifier(linha[0])
+                                for linha in self.con.execute(f"DESCRIBE SELECT * FROM {leitura}").fetchall())
+            leitura = f"""(
+                SELECT * EXCLUDE (_arquivo, _ocorrencia) FROM (
+                    SELECT *, row_number() OVER (PARTITION BY {colunas}, _arquivo) AS _ocorrencia
+                    FROM (
+                        SELECT * EXCLUDE (filename), list_position([{caminhos}], filename) AS _arquivo
+                        FROM {leitor}([{caminhos}], {opcoes}, filename = true)
+                    )
+                )
+                QUALIFY row_number() OVER (PARTITION BY {colunas}, _ocorrencia ORDER BY _arquivo) = 1
+            )"""
+        self.con.execute(f"CREATE OR REPLACE VIEW origem AS SELECT * FROM {leitura}")
+
+    def columns(self):
+        return [linha[0] for linha in self.con.execute("DESCRIBE origem").fetchall()]
+
+    # Expressão SQL da coluna de data: colunas temporais (Parquet) são convertidas direto e textos são lidos pelos
+    # mesmos DATE_FORMATS do parse_dates do pandas (fora deles, NULL = data inválida)
+    def _date_expression(self, date_column):
+        tipos = dict((linha[0], linha[1]) for linha in self.con.execute("DESCRIBE origem").fetchall())
+        coluna = quote_identifier(date_column)
+        if tipos.get(date_column, '').startswith(('DATE', 'TIMESTAMP')):
+            return f"CAST({coluna} AS TIMESTAMP)"
+        formatos = ', '.join("'" + formato + "'" for formato in DATE_FORMATS)
+        return f"try_strptime(trim(CAST({coluna} AS VARCHAR)), [{formatos}])"
+
+    # Datas mínima e máxima válidas da coluna de data escolhida
+    def date_bounds(self, date_column):
+        data = self._date_expression(date_column)
+        return self.con.execute(f"SELECT CAST(min({data}) AS DATE), CAST(max({data}) AS DATE) FROM origem").fetchone()
+
+    # Cria a visão `vendas` com as colunas padronizadas (cliente, data, valor), descartando datas inválidas
+    def prepare(self, id_column, date_column, value_expression):
+        data = self._date_expression(date_column)
+        self.con.execute(f"""
+            CREATE OR REPLACE VIEW vendas AS
+            SELECT {quote_identifier(id_column)} AS cliente,
+                   {data} AS data,
+                   CAST({value_expression} AS DOUBLE) AS valor
+            FROM origem
+            WHERE {data} IS NOT NULL
+        """)
+
+    # Relatório de qualidade dos dados (mesmas chaves do data_quality.quality_report), em uma única varredura de `vendas`
+    def quality_report(self, date_column, outlier_factor=3.0):
+        data = self._date_expression(date_column)
+        linhas_lidas, datas_invalidas = self.con.execute(
+            f"SELECT count(*), count(*) FILTER (WHERE {data} IS NULL) FROM origem").fetchone()
+        distintas = self.con.execute(
+            f"SELECT count(*) FROM (SELECT DISTINCT * FROM origem WHERE {data} IS NOT NULL)").fetchone()[0]
+        q1, q3, positivos = self.con.execute(
+            "SELECT quantile_cont(valor, 0.25), quantile_cont(valor, 0.75), count(*) FROM vendas WHERE valor > 0").fetchone()
+        limite = float(q3 + outlier_factor * (q3 - q1)) if positivos >= 4 else None
+        sem_id = "(cliente IS NULL OR trim(CAST(cliente AS VARCHAR)) = '')"
+        linha = self.con.execute(f"""
+            SELECT count(*) FILTER (WHERE {sem_id}),
+                   coalesce(sum(valor) FILTER (WHERE {sem_id}), 0),
+                   coalesce(sum(valor), 0),
+                   count(*) FILTER (WHERE valor IS NULL),
+                   count(*) FILTER (WHERE valor < 0),
+                   coalesce(sum(valor) FILTER (WHERE valor < 0), 0),
+                   count(*) FILTER (WHERE valor = 0),
+                   count(*) FILTER (WHERE valor > {limite if limite is not None else 'NULL'}),
+                   coalesce(sum(valor) FILTER (WHERE valor > {limite if limite is not None else 'NULL'}), 0)
+            FROM vendas
+        """).fetchone()
+        relatorio = dict(zip(['vendas_sem_id', 'receita_sem_id', 'receita_total', 'valores_invalidos',
+                              'valores_negativos', 'receita_negativa', 'valores_zero', 'outliers',
+                              'receita_outliers'], linha))
+        relatorio.update({
+            'linhas_lidas': linhas_lidas,
+            'linhas_validas': linhas_lidas - datas_invalidas,
+            'datas_invalidas': datas_invalidas,
+            'linhas_duplicadas': linhas_lidas - datas_invalidas - distintas,
+            'receita_duplicada': None,
+            'limite_outlier': limite,
+        })
+        return relatorio
+
+    # Trecho SQL com as vendas do intervalo de datas (inclusive); as datas entram como parâmetros (?, ?)
+    _FILTERED = "SELECT * FROM vendas WHERE CAST(data AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)"
+
+    # Métricas principais (mesmas definições do bloco de métricas do pandas)
+    def key_metrics(self, start_date, end_date):
+        linha = self.con.execute(f"""
+            WITH f AS ({self._FILTERED}),
+            por_cliente AS (
+                SELECT cliente, coalesce(sum(valor), 0) AS receita, count(*) AS transacoes
+                FROM f
+                WHERE cliente IS NOT NULL AND CAST(cliente AS VARCHAR) <> ''
+                GROUP BY cliente
+            ),
+            primeiras AS (
+                SELECT min(data) AS primeira FROM vendas WHERE cliente IS NOT NULL GROUP BY cliente
+            )
+            SELECT
+                (SELECT coalesce(sum(valor), 0) FROM f),
+                (SELECT count(*) FROM f),
+                (SELECT count(DISTINCT cliente) FROM f),
+                (SELECT count(*) FROM primeiras
+                 WHERE CAST(primeira AS DATE) BETWEEN CAST(? AS DATE) AND CAST(? AS DATE)),
+                avg(receita), median(receita), avg(transacoes), median(transacoes)
+            FROM por_cliente
+        """, [start_date, end_date, start_date, end_date]).fetchone()
+        chaves = ['receita_total', 'numero_total_vendas', 'clientes_unicos', 'novos_clientes',
+                  'receita_media_cliente', 'receita_mediana_cliente',
+                  'numero_medio_transacoes', 'numero_mediano_transacoes']
+        # Intervalo sem vendas: métricas zeradas (médias e medianas vazias vêm como NULL)
+        metricas = {chave: 0 if valor is None else valor for chave, valor in zip(chaves, linha)}
+        metricas['ticket_medio'] = (metricas['receita_total'] / metricas['numero_total_vendas']
+                                    if metricas['numero_total_vendas'] else 0)
+        return metricas
+
+    # Vendas por período separadas entre primeira compra (Novo) e demais (Recorrente)
+    def new_vs_recurring(self, start_date, end_date, period):
+        longo = self.con.execute(f"""
+            WITH f AS ({self._FILTERED}),
+            primeiras AS (SELECT cliente, min(data) AS primeira FROM f WHERE cliente IS NOT NULL GROUP BY cliente)
+            SELECT CAST({BUCKET_SQL[period]} AS TIMESTAMP) AS "Data da Venda",
+                   CASE WHEN f.data = primeiras.primeira THEN 'Novo' ELSE 'Recorrente' END AS CustomerType,
+                   coalesce(sum(f.valor), 0) AS valor
+            FROM f LEFT JOIN primeiras ON f.cliente = primeiras.cliente
+            GROUP BY ALL
+        """, [start_date, end_date]).df()
+        sales_agg = longo.pivot_table(index='Data da Venda', columns='CustomerType', values='valor',
+                                      aggfunc='sum', fill_value=0)
+        sales_agg.index = pd.DatetimeIndex(sales_agg.index).astype('datetime64[ns]')
+        return fill_periods(sales_agg.reindex(columns=['Novo', 'Recorrente'], fill_value=0).sort_index(), period)
+
+    # Tabela RFM por cliente (Recency e T em dias de calendário até a última venda do intervalo, mais dias
+    # distintos de compra e receita do primeiro dia para o LTV preditivo)
+    def rfm(self, start_date, end_date):
+        rfm = self.con.execute(f"""
+            WITH f AS ({self._FILTERED}),
+            hoje AS (SELECT max(data) AS hoje FROM f),
+            c AS (
+                SELECT cliente, CAST(data AS DATE) AS dia, valor,
+                       min(CAST(data AS DATE)) OVER (PARTITION BY cliente) AS primeiro_dia
+                FROM f WHERE cliente IS NOT NULL
+            )
+            SELECT cliente AS "ID do Cliente",
+                   date_diff('day', max(dia), CAST(hoje AS DATE)) AS Recency,
+                   count(*) AS Frequency,
+                   coalesce(sum(valor), 0) AS Monetary,
+                   date_diff('day', min(dia), CAST(hoje AS DATE)) AS T,
+                   count(DISTINCT dia) AS PurchaseDays,
+                   coalesce(sum(valor) FILTER (WHERE dia = primeiro_dia), 0) AS FirstDayMonetary
+            FROM c, hoje
+            GROUP BY cliente, hoje
+            ORDER BY cliente
+        """, [start_date, end_date]).df()
+        return rfm.set_index('ID do Cliente')
+
+    # Matrizes coorte × período agregadas em SQL; só as células (pequenas) voltam para o Python
+    def cohort_matrices(self, start_date, end_date, period, max_periods=None):
+        self.con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE _transacoes AS
+            SELECT cliente, {PERIOD_SQL[period]} AS per, valor
+            FROM ({self._FILTERED})
+            WHERE cliente IS NOT NULL
+        """, [start_date, end_date])
+        self.con.execute("""
+            CREATE OR REPLACE TEMP TABLE _clientes AS
+            SELECT cliente, min(per) AS primeiro, max(per) AS ultimo FROM _transacoes GROUP BY cliente
+        """)
+        base, fim = self.con.execute("SELECT min(primeiro), max(ultimo) FROM _clientes").fetchone()
+        if base is None:
+            return None
+
+        if max_periods is None:
+            max_periods = MAX_PERIODS.get(period)
+        n = fim - base + 1
+        if max_periods is not None:
+            n = min(n, max_periods)
+
+        tamanhos = self.con.execute(
+            "SELECT primeiro, count(*) AS n FROM _clientes GROUP BY primeiro ORDER BY primeiro").df()
+        celulas = self.con.execute(f"""
+            SELECT c.primeiro, t.per - c.primeiro AS off,
+                   coalesce(sum(t.valor), 0) AS receita, count(DISTINCT t.cliente) AS ativos
+            FROM _transacoes t JOIN _clientes c ON t.cliente = c.cliente
+            WHERE t.per - c.primeiro < {n}
+            GROUP BY ALL
+        """).df()
+        ultimos_df = self.con.execute(f"""
+            SELECT primeiro, least(ultimo - primeiro, {n - 1}) AS off, count(*) AS n
+            FROM _clientes GROUP BY ALL
+        """).df()
+
+        # Densificar as células agregadas nas matrizes coorte × período
+        coortes = tamanhos['primeiro'].to_numpy()
+        sizes = tamanhos['n'].to_numpy()
+        revenue = np.zeros((len(coortes), n))
+        active = np.zeros((len(coortes), n))
+        ultimos = np.zeros((len(coortes), n), dtype=np.int64)
+        linhas = np.searchsorted(coortes, celulas['primeiro'].to_numpy())
+        revenue[linhas, celulas['off'].to_numpy()] = celulas['receita'].to_numpy()
+        active[linhas, celulas['off'].to_numpy()] = celulas['ativos'].to_numpy()
+        linhas = np.searchsorted(coortes, ultimos_df['primeiro'].to_numpy())
+        ultimos[linhas, ultimos_df['off'].to_numpy()] = ultimos_df['n'].to_numpy()
+
+        return assemble_cohort_matrices(coortes, fim, revenue, active, ultimos, sizes, period)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+
+# Função para calcular a impressão digital (hash) das entradas de um gráfico: DataFrames, Series,
+# arrays e opções de exibição (textos, números, tuplas); entradas iguais produzem a mesma chave
+def fingerprint(*partes):
+    h = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        if isinstance(parte, (pd.DataFrame, pd.Series)):
+            h.update(repr((type(parte).__name__, parte.shape, list(parte.index.names),
+                           list(parte.columns) if isinstance(parte, pd.DataFrame) else parte.name,
+                           [str(t) for t in np.atleast_1d(parte.dtypes)])).encode())
+            h.update(pd.util.hash_pandas_object(parte, index=True, categorize=False).to_numpy().tobytes())
+            if isinstance(parte, pd.DataFrame):
+                h.update(pd.util.hash_pandas_object(parte.columns.to_series(), index=False).to_numpy().tobytes())
+        elif isinstance(parte, np.ndarray):
+            h.update(repr((parte.dtype.str, parte.shape)).encode())
+            h.update(np.ascontiguousarray(parte).tobytes())
+        else:
+            h.update(repr(parte).encode())
+        h.update(b'|')
+    return h.hexdigest()
+
+
+# Cache de gráficos já serializados (JSON do Plotly), compartilhado pelas sessões e limitado em bytes
+# Os mais antigos (menos usados recentemente) saem primeiro quando o limite é atingido
+class FigureCache:
+    def __init__(self, max_bytes=64 * 1024 ** 2):
+        self.max_bytes = int(max_bytes)
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    # JSON guardado para a chave (ou None)
+    def get(self, chave):
+        with self._lock:
+            spec = self._entradas.get(chave)
+            if spec is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return spec
+
+    def put(self, chave, spec):
+        if len(spec) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[chave] = spec
+            self._bytes += len(spec)
+            while self._bytes > self.max_bytes:
+                _, removido = self._entradas.popitem(last=False)
+                self._bytes -= len(removido)
+
+    # Passa a registrar as chaves dos gráficos usados pela thread atual (uma execução da página)
+    # e devolve o conjunto onde elas são registradas
+    def track(self):
+        self._local.usadas = set()
+        return self._local.usadas
+
+    # JSON dos gráficos guardados para as chaves dadas ({chave: JSON})
+    def specs(self, chaves):
+        with self._lock:
+            return {chave: self._entradas[chave] for chave in chaves if chave in self._entradas}
+
+    # Gráfico pronto para exibição: o dicionário do JSON guardado, ou o resultado de build() (que é então
+    # serializado e guardado); as entradas devem incluir tudo de que o gráfico depende
+    def figure(self, entradas, build):
+        chave = fingerprint(*entradas)
+        usadas = getattr(self._local, 'usadas', None)
+        if usadas is not None:
+            usadas.add(chave)
+        spec = self.get(chave)
+        if spec is not None:
+            return json.loads(spec)
+        fig = build()
+        self.put(chave, pio.to_json(fig, validate=False))
+        return fig
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+from cohort_engine import period_labels
+
+# Horizonte padrão da previsão (em períodos) para cada granularidade
+DEFAULT_HORIZON = {'D': 30, 'W': 12, 'M': 12, 'Q': 4, 'Y': 2}
+
+# Mínimo de coortes observadas nas duas idades para um fator de desenvolvimento ser estimado; nas idades
+# com menos coortes (as mais antigas), vale o último fator confiável
+MIN_COHORTS_PER_FACTOR = 3
+
+# Simulações e quantis da faixa de incerteza (90%)
+SIMULATIONS = 500
+BAND = (0.05, 0.95)
+
+
+# Fatores de desenvolvimento (chain-ladder) da matriz acumulada coorte x idade (NaN = ainda não observado):
+# f_k = soma de C[i, k+1] / soma de C[i, k] nas coortes observadas nas duas idades, e a variância de Mack
+# sigma²_k = soma de C[i, k] (C[i, k+1] / C[i, k] - f_k)² / (n_k - 1)
+def development_factors(cumulativa, min_coortes=MIN_COHORTS_PER_FACTOR):
+    atual, proxima = cumulativa[:, :-1], cumulativa[:, 1:]
+    ambos = ~np.isnan(atual) & ~np.isnan(proxima) & (atual > 0)
+    n = ambos.sum(axis=0)
+    base = np.where(ambos, atual, 0.0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fatores = np.where((n >= min_coortes) & (base > 0), np.where(ambos, proxima, 0.0).sum(axis=0) / base, np.nan)
+        individuais = np.where(ambos, proxima / atual, 0.0)
+        desvios = np.where(ambos, atual * (individuais - np.nan_to_num(fatores)) ** 2, 0.0).sum(axis=0)
+        sigma2 = np.where((n >= 2) & ~np.isnan(fatores), desvios / (n - 1), np.nan)
+
+    # Idades sem fator confiável herdam o último (as primeiras idades sem fator não crescem)
+    fatores = pd.Series(fatores).ffill().fillna(1.0).to_numpy()
+    sigma2 = pd.Series(sigma2).ffill().fillna(0.0).to_numpy()
+    return fatores, sigma2, base
+
+
+# Previsão de receita das coortes existentes pelo método chain-ladder: o triângulo inferior direito da matriz
+# acumulada é preenchido com produtos acumulados dos fatores, e a receita projetada de cada período futuro
+# do calendário é a soma dos incrementos de todas as coortes
+# ages: idade de cada coorte no período atual (último período dos dados); sem ela, a última célula observada
+# de cada coorte é tomada como o período atual. Coortes mais velhas que a largura da matriz (truncadas pelo
+# horizonte máximo) não têm a receita recente na matriz: entram nos fatores, mas não na projeção nem na
+# receita realizada
+class ChainLadderForecast:
+    def __init__(self, cumulative_revenue, min_coortes=MIN_COHORTS_PER_FACTOR, ages=None):
+        self.cumulative = cumulative_revenue
+        matriz = cumulative_revenue.to_numpy(dtype=np.float64)
+        self.factors, self.sigma2, self.base = development_factors(matriz, min_coortes)
+
+        # Idade atual de cada coorte (pelo calendário) e receita acumulada até ela, nas coortes não truncadas
+        observado = ~np.isnan(matriz)
+        idades = observado.sum(axis=1) - 1 if ages is None else np.asarray(ages, dtype=np.int64)
+        self.truncated = idades >= matriz.shape[1]
+        self.age = idades
+        self.last_age = idades[~self.truncated]
+        linhas = np.flatnonzero(~self.truncated)
+        self.last_value = np.nan_to_num(matriz[linhas, np.maximum(self.last_age, 0)])
+
+        # Receita realizada por período do calendário, contada a partir do período atual (0 = atual, -1 = anterior...)
+        incrementos = np.diff(np.nan_to_num(matriz), axis=1, prepend=0.0)[linhas]
+        deslocamento = np.arange(matriz.shape[1])[None, :] - self.last_age[:, None]
+        celulas = observado[linhas]
+        self._realizada = np.bincount(-deslocamento[celulas], weights=incrementos[celulas])
+
+    # Fatores (e variâncias) estendidos até a idade necessária para o horizonte
+    def _extended(self, horizonte):
+        tamanho = int(self.last_age.max(initial=0)) + horizonte
+        extra = max(0, tamanho - len(self.factors))
+        fatores = np.concatenate([self.factors, np.repeat(self.factors[-1:] if len(self.factors) else [1.0], extra)])
+        sigma2 = np.concatenate([self.sigma2, np.repeat(self.sigma2[-1:] if len(self.sigma2) else [0.0], extra)])
+        base = np.concatenate([self.base, np.repeat(self.base[-1:] if len(self.base) else [0.0], extra)])
+        return fatores[:tamanho], sigma2[:tamanho], base[:tamanho]
+
+    # Matriz acumulada completa: células observadas e triângulo projetado (mesmo formato da matriz de entrada)
+    def completed(self):
+        matriz = self.cumulative.to_numpy(dtype=np.float64)
+        produto = np.concatenate([[1.0], np.cumprod(self.factors)])[:matriz.shape[1]]
+        projetada = matriz.copy()
+        linhas = np.flatnonzero(~self.truncated)
+        projetada[linhas] = self.last_value[:, None] * produto[None, :] / produto[self.last_age][:, None]
+        return pd.DataFrame(np.where(np.isnan(matriz), projetada, matriz),
+                            index=self.cumulative.index, columns=self.cumulative.columns)
+
+    # Receita projetada para os próximos `horizonte` períodos do calendário, com faixa de incerteza por simulação
+    # (erro de parâmetro: fatores sorteados com variância sigma²_k / base_k; erro de processo: variância
+    # sigma²_k C[i, k] em cada passo). A projeção pontual é o caminho chain-ladder sem ruído, e os caminhos
+    # simulados seguem o mesmo modelo sem cortes de um lado só (devoluções podem reduzir a receita acumulada),
+    # para a faixa ficar centrada na projeção
+    def project(self, horizonte, simulacoes=SIMULATIONS, banda=BAND, seed=0):
+        fatores, sigma2, base = self._extended(horizonte)
+        rng = np.random.default_rng(seed)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            erro_fator = np.where(base > 0, np.sqrt(sigma2 / base), 0.0)
+        fatores_sim = fatores[None, :] + erro_fator[None, :] * rng.standard_normal((simulacoes, len(fatores)))
+
+        pontual = self.last_value.copy()
+        simulada = np.broadcast_to(self.last_value, (simulacoes, len(self.last_value))).copy()
+        previsao, inferior, superior = [], [], []
+        for h in range(1, horizonte + 1):
+            idade = self.last_age + h - 1
+            novo = pontual * fatores[idade]
+            previsao.append((novo - pontual).sum())
+            pontual = novo
+
+            media = simulada * fatores_sim[:, idade]
+            desvio = np.sqrt(np.abs(simulada) * sigma2[idade][None, :])
+            nova = media + desvio * rng.standard_normal(simulada.shape)
+            total = (nova - simulada).sum(axis=1)
+            inferior.append(np.quantile(total, banda[0]))
+            superior.append(np.quantile(total, banda[1]))
+            simulada = nova
+
+        return pd.DataFrame({
+            'Receita Projetada': previsao,
+            'Limite Inferior': inferior,
+            'Limite Superior': superior,
+        }, index=pd.RangeIndex(1, horizonte + 1, name='Períodos à Frente'))
+
+    # Receita realizada nos últimos `periodos` períodos do calendário (do mais antigo para o atual)
+    def realized(self, periodos):
+        valores = self._realizada[:periodos][::-1]
+        return pd.Series(valores, index=pd.RangeIndex(1 - len(valores), 1, name='Períodos à Frente'),
+                         name='Receita Realizada')
+
+
+# Função para juntar a receita realizada e a projetada em uma tabela por período do calendário
+# ultimo_periodo: ordinal do período atual (o da última venda), na granularidade `period`
+def forecast_table(previsao, horizonte, ultimo_periodo, period, historico=None):
+    projetada = previsao.project(horizonte)
+    realizada = previsao.realized(historico or horizonte)
+    tabela = pd.concat([realizada.to_frame(), projetada], axis=1)
+    tabela.index = pd.Index(period_labels(ultimo_periodo + tabela.index.to_numpy(), period), name='Período')
+    return tabela
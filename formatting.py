@@ -0,0 +1,8 @@
+# Função para formatar números no padrão brasileiro (1.234,56), sem depender do locale do sistema operacional
+def format_br(valor):
+    if valor >= 1_000_000_000:
+        return f"{valor/1_000_000_000:.2f}B"
+    elif valor >= 1_000_000:
+        return f"{valor/1_000_000:.2f}M"
+    else:
+        return f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
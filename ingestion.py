@@ -0,0 +1,267 @@
+import argparse
+import functools
+import gzip
+import io
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Extensões aceitas (arquivos .zip são expandidos nos arquivos internos com estas extensões)
+SUPPORTED_EXTENSIONS = ('.csv', '.csv.gz', '.xlsx', '.parquet')
+
+# Coluna opcional com o nome do arquivo de origem de cada venda (quando há mais de um arquivo)
+SOURCE_COLUMN = 'Arquivo de Origem'
+
+# Tamanho dos blocos de cópia e descompactação (arquivos enviados e compactados não são lidos inteiros)
+CHUNK_BYTES = 1024 ** 2
+
+
+# Formatos aceitos na coluna de Data da Venda (ISO e dd/mm/aaaa, com ou sem horário), os mesmos nos motores
+# pandas e DuckDB: textos fora deles contam como datas inválidas
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y']
+
+
+# Função para converter a coluna de data: colunas já temporais (Excel, Parquet) são mantidas e textos são lidos
+# pelos DATE_FORMATS em ordem (cada formato só tenta as linhas que os anteriores não leram)
+def parse_dates(valores):
+    valores = pd.Series(valores)
+    if pd.api.types.is_datetime64_any_dtype(valores):
+        if getattr(valores.dt, 'tz', None) is not None:
+            valores = valores.dt.tz_localize(None)
+        return valores.astype('datetime64[ns]')
+    texto = valores.astype('string').str.strip()
+    datas = pd.Series(pd.NaT, index=valores.index, dtype='datetime64[ns]')
+    for formato in DATE_FORMATS:
+        faltando = datas.isna().to_numpy() & texto.notna().to_numpy()
+        if not faltando.any():
+            break
+        datas[faltando] = pd.to_datetime(texto[faltando], format=formato, errors='coerce')
+    return datas
+
+
+# Função para identificar a extensão suportada de um nome de arquivo (ou None)
+def file_extension(nome):
+    nome = nome.lower()
+    for extensao in SUPPORTED_EXTENSIONS + ('.zip',):
+        if nome.endswith(extensao):
+            return extensao
+    return None
+
+
+# Função para recusar um arquivo acima do limite de tamanho (em bytes; None = sem limite)
+def check_size(nome, tamanho, max_bytes):
+    if max_bytes is not None and tamanho > max_bytes:
+        raise ValueError(f"O arquivo {nome} passa do limite de {max_bytes / 1024 ** 2:.0f} MB.")
+
+
+# Função para copiar um fluxo para um arquivo em blocos, parando assim que passar do limite de tamanho
+def copy_stream(origem, destino, nome, max_bytes=None):
+    total = 0
+    while True:
+        bloco = origem.read(CHUNK_BYTES)
+        if not bloco:
+            return total
+        total += len(bloco)
+        check_size(nome, total, max_bytes)
+        destino.write(bloco)
+
+
+# Função para gravar um fluxo em um arquivo novo dentro de `pasta` (com a extensão do nome original)
+def spool_file(origem, nome, pasta, max_bytes=None):
+    descritor, caminho = tempfile.mkstemp(suffix=file_extension(nome) or '', dir=pasta)
+    with os.fdopen(descritor, 'wb') as destino:
+        copy_stream(origem, destino, nome, max_bytes)
+    return caminho
+
+
+# Leitura em fluxo de um arquivo descompactado que falha ao passar do limite de tamanho: o tamanho
+# declarado no .gz não é confiável, então o limite vale para os bytes efetivamente descompactados
+class _LimitedStream(io.RawIOBase):
+    def __init__(self, fluxo, nome, max_bytes):
+        self.fluxo = fluxo
+        self.nome = nome
+        self.max_bytes = max_bytes
+        self.lidos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.fluxo.readinto(buffer)
+        self.lidos += n
+        check_size(self.nome, self.lidos, self.max_bytes)
+        return n
+
+    def close(self):
+        self.fluxo.close()
+        super().close()
+
+
+# Função para expandir as entradas (arquivos enviados, pares (nome, bytes), caminhos e diretórios) em partes (nome, conteúdo)
+# O conteúdo é um caminho (str) ou bytes; arquivos enviados são gravados em `pasta` em blocos, e arquivos .zip
+# viram uma parte por arquivo interno suportado, descompactado em fluxo para `pasta`
+# Os tamanhos são conferidos antes da leitura (arquivo enviado ou em disco, e tamanho declarado no .zip)
+def expand_sources(fontes, pasta, max_bytes=None):
+    partes = []
+    for fonte in fontes:
+        if isinstance(fonte, (str, os.PathLike)):
+            caminho = os.fspath(fonte)
+            if os.path.isdir(caminho):
+                for raiz, _, arquivos in os.walk(caminho):
+                    for arquivo in sorted(arquivos):
+                        if file_extension(arquivo):
+                            partes.extend(expand_sources([os.path.join(raiz, arquivo)], pasta, max_bytes))
+                continue
+            nome, conteudo = caminho, caminho
+            if file_extension(nome) is not None:
+                check_size(nome, os.path.getsize(caminho), max_bytes)
+        elif isinstance(fonte, tuple):
+            nome, conteudo = fonte
+            if isinstance(conteudo, bytes):
+                check_size(nome, len(conteudo), max_bytes)
+        else:
+            # Arquivo enviado pelo Streamlit (UploadedFile) ou qualquer objeto com name e read(): gravado em
+            # disco em blocos, sem uma cópia extra do conteúdo em memória
+            nome = fonte.name
+            if file_extension(nome) is not None:
+                check_size(nome, getattr(fonte, 'size', 0), max_bytes)
+                fonte.seek(0)
+                conteudo = spool_file(fonte, nome, pasta, max_bytes)
+
+        extensao = file_extension(nome)
+        if extensao is None:
+            raise ValueError(f"Formato de arquivo não suportado: {nome}")
+        if extensao != '.zip':
+            partes.append((nome, conteudo))
+            continue
+
+        arquivo_zip = zipfile.ZipFile(conteudo if isinstance(conteudo, str) else io.BytesIO(conteudo))
+        with arquivo_zip:
+            internos = [info for info in sorted(arquivo_zip.infolist(), key=lambda info: info.filename)
+                        if not info.is_dir() and file_extension(info.filename) not in (None, '.zip')]
+            for info in internos:
+                check_size(f"{os.path.basename(nome)}/{info.filename}", info.file_size, max_bytes)
+            for info in internos:
+                nome_interno = f"{os.path.basename(nome)}/{info.filename}"
+                with arquivo_zip.open(info) as origem:
+                    partes.append((nome_interno, spool_file(origem, info.filename, pasta, max_bytes)))
+    return partes
+
+
+# Função para ler uma parte em um DataFrame, de acordo com a extensão
+# Caminhos de CSV e Parquet são lidos com memory map; .csv.gz é descompactado em fluxo durante a leitura
+def read_part(nome, conteudo, max_bytes=None):
+    caminho = isinstance(conteudo, str)
+    origem = conteudo if caminho else io.BytesIO(conteudo)
+    extensao = file_extension(nome)
+    if extensao == '.csv':
+        return pd.read_csv(origem, memory_map=caminho)
+    if extensao == '.csv.gz':
+        fluxo = gzip.open(origem) if caminho else gzip.GzipFile(fileobj=origem)
+        if max_bytes is not None:
+            fluxo = io.BufferedReader(_LimitedStream(fluxo, nome, max_bytes), CHUNK_BYTES)
+        with fluxo:
+            return pd.read_csv(fluxo)
+    if extensao == '.xlsx':
+        return pd.read_excel(origem)
+    return pd.read_parquet(origem, memory_map=caminho)
+
+
+# Função para normalizar os nomes de coluna, para que exports com cabeçalhos levemente diferentes se alinhem
+def _normalize_columns(df, column_mapping=None):
+    df = df.rename(columns=lambda coluna: str(coluna).strip())
+    if column_mapping:
+        df = df.rename(columns=column_mapping)
+    return df
+
+
+# Função para ler várias partes em paralelo (threads para bytes enviados; processos opcionais para caminhos)
+def read_parts(partes, max_workers=None, use_processes=False, max_bytes=None):
+    if not partes:
+        return []
+    max_workers = max_workers or min(len(partes), os.cpu_count() or 1)
+    if max_workers == 1 or len(partes) == 1:
+        return [read_part(nome, conteudo, max_bytes) for nome, conteudo in partes]
+    executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor(max_workers=max_workers) as pool:
+        return list(pool.map(functools.partial(read_part, max_bytes=max_bytes), *zip(*partes)))
+
+
+# Função para remover transações repetidas entre arquivos sobrepostos (hash de 64 bits por linha)
+# fontes: arquivo de origem de cada linha. Só repetições entre arquivos diferentes são removidas: a k-ésima
+# ocorrência de uma linha em um arquivo sai se outro arquivo anterior já tem a k-ésima ocorrência dela, então
+# compras idênticas legítimas dentro do mesmo arquivo (mesmo cliente, dia e valor) são mantidas
+def deduplicate(df, fontes, subset=None):
+    colunas = [c for c in (subset or df.columns) if c != SOURCE_COLUMN]
+    # Sem categorizar: as colunas de texto têm alta cardinalidade e o hash direto é mais rápido
+    hashes = pd.util.hash_pandas_object(df[colunas], index=False, categorize=False).to_numpy()
+    ocorrencia = pd.DataFrame({'hash': hashes, 'fonte': np.asarray(fontes)}).groupby(
+        ['hash', 'fonte'], sort=False).cumcount().to_numpy()
+    repetida = pd.DataFrame({'hash': hashes, 'ocorrencia': ocorrencia}).duplicated().to_numpy()
+    duplicadas = int(repetida.sum())
+    if duplicadas == 0:
+        return df, 0
+    return df.loc[~repetida].reset_index(drop=True), duplicadas
+
+
+# Função principal de ingestão: expande as fontes, lê em paralelo, alinha os esquemas e concatena
+# Devolve o DataFrame combinado e um resumo por arquivo (linhas lidas) com o total de duplicatas removidas
+# Arquivos enviados e internos de .zip passam por uma pasta temporária, apagada depois da leitura: o pico de
+# memória é o dos DataFrames lidos, não o dos arquivos; max_bytes: limite de cada arquivo (enviado ou descompactado)
+def load_sales_files(fontes, column_mapping=None, dedupe=False, add_source=False,
+                     max_workers=None, use_processes=False, max_bytes=None):
+    with tempfile.TemporaryDirectory(prefix='analise_ingestao_') as pasta:
+        partes = expand_sources(fontes, pasta, max_bytes)
+        if not partes:
+            raise ValueError("Nenhum arquivo suportado encontrado.")
+        frames = read_parts(partes, max_workers, use_processes, max_bytes)
+
+    # Colunas na ordem em que aparecem pela primeira vez; colunas ausentes em um arquivo ficam vazias
+    frames = [_normalize_columns(frame, column_mapping) for frame in frames]
+    if add_source and len(frames) > 1:
+        frames = [frame.assign(**{SOURCE_COLUMN: nome}) for (nome, _), frame in zip(partes, frames)]
+    df = pd.concat(frames, ignore_index=True, sort=False) if len(frames) > 1 else frames[0]
+
+    resumo = pd.DataFrame({'Arquivo': [nome for nome, _ in partes],
+                           'Linhas': [len(frame) for frame in frames]})
+    duplicadas = 0
+    if dedupe and len(frames) > 1:
+        df, duplicadas = deduplicate(df, np.repeat(np.arange(len(frames)), [len(frame) for frame in frames]))
+    return df, resumo, duplicadas
+
+
+# Uso pela linha de comando: combina arquivos e diretórios em um único cache Parquet (colunar)
+# python ingestion.py exports/ vendas_2023.zip -o vendas.parquet --dedupe
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Combina exports de vendas em um único arquivo Parquet.")
+    parser.add_argument('fontes', nargs='+', help="Arquivos (.csv, .csv.gz, .xlsx, .parquet, .zip) ou diretórios")
+    parser.add_argument('-o', '--saida', required=True, help="Arquivo Parquet de saída")
+    parser.add_argument('--dedupe', action='store_true', help="Remove transações repetidas entre arquivos diferentes")
+    parser.add_argument('--origem', action='store_true', help=f"Adiciona a coluna '{SOURCE_COLUMN}'")
+    parser.add_argument('--workers', type=int, default=None, help="Número de processos de leitura")
+    parser.add_argument('--relatorio', help="Grava o relatório de qualidade dos dados neste arquivo JSON")
+    parser.add_argument('--id', help="Coluna do ID do Cliente (para o relatório)")
+    parser.add_argument('--data', help="Coluna da Data da Venda (para o relatório)")
+    parser.add_argument('--valor', help="Coluna do Valor da Venda (para o relatório)")
+    args = parser.parse_args()
+
+    df, resumo, duplicadas = load_sales_files(args.fontes, dedupe=args.dedupe, add_source=args.origem,
+                                              max_workers=args.workers, use_processes=True)
+    df.to_parquet(args.saida, index=False)
+    print(resumo.to_string(index=False))
+    print(f"{len(df)} linhas gravadas em {args.saida} ({duplicadas} duplicadas removidas)")
+
+    if args.relatorio:
+        from data_quality import quality_report, write_report
+        if not (args.id and args.data and args.valor):
+            parser.error("--relatorio exige --id, --data e --valor")
+        datas = parse_dates(df[args.data])
+        validas = datas.notna()
+        relatorio = quality_report(df.loc[validas], int((~validas).sum()), args.id, args.valor)
+        write_report(relatorio, args.relatorio)
+        print(f"Relatório de qualidade gravado em {args.relatorio}")
@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Erro usado para interromper um trabalho cancelado entre uma etapa e outra
+class JobCancelled(Exception):
+    pass
+
+
+# Trabalho de análise em segundo plano: uma sequência de etapas (nome, rótulo, função) executadas em ordem
+# Cada função recebe o dicionário com os resultados das etapas anteriores; o resultado de cada etapa fica
+# disponível assim que ela termina, para a interface exibir as partes prontas enquanto o resto é calculado
+# Ao terminar, o trabalho solta as funções das etapas (que guardam referências aos DataFrames da sessão)
+class Job:
+    def __init__(self, key, stages):
+        self.key = key
+        self.stages = list(stages)
+        self.results = {}
+        self.error = None
+        self.current = None
+        self.done = False
+        self._cancel = threading.Event()
+        self._condition = threading.Condition()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    # Pede o cancelamento: a etapa em andamento termina, mas as seguintes não são executadas
+    def cancel(self):
+        self._cancel.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    # Fração das etapas concluídas
+    def progress(self):
+        return len(self.results) / len(self.stages) if self.stages else 1.0
+
+    # Rótulo da etapa em andamento (ou None)
+    def current_label(self):
+        for nome, rotulo, _ in self.stages:
+            if nome == self.current:
+                return rotulo
+        return None
+
+    # Registra uma função chamada (sem argumentos) quando o trabalho terminar; se já terminou, chama agora
+    def on_done(self, callback):
+        with self._condition:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    # Marca o trabalho como terminado: solta as funções das etapas e chama as funções registradas
+    def _finish(self):
+        with self._condition:
+            self.stages = [(nome, rotulo, None) for nome, rotulo, _ in self.stages]
+            self.current = None
+            self.done = True
+            callbacks, self._callbacks = self._callbacks, []
+            self._condition.notify_all()
+        for callback in callbacks:
+            callback()
+
+    # Espera até a etapa terminar (ou o trabalho falhar), por no máximo timeout segundos
+    # Devolve True se o resultado da etapa está disponível; gera JobCancelled se o trabalho foi cancelado
+    # antes de a etapa terminar (o resultado não vai chegar)
+    def wait(self, stage, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: stage in self.results or self.done or self.cancelled, timeout)
+            if stage not in self.results and self.cancelled:
+                raise JobCancelled()
+            return stage in self.results
+
+    def run(self):
+        try:
+            for nome, _, funcao in self.stages:
+                if self.cancelled:
+                    raise JobCancelled()
+                with self._condition:
+                    self.current = nome
+                resultado = funcao(self.results)
+                with self._condition:
+                    self.results[nome] = resultado
+                    self._condition.notify_all()
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self._finish()
+
+
+# Executor de trabalhos compartilhado pelo processo: no máximo um trabalho ativo por dono (sessão)
+# Um novo trabalho com outra chave (entradas diferentes) cancela o anterior; a mesma chave reaproveita o existente
+# max_jobs: trabalhos guardados; acima disso, os concluídos usados há mais tempo são esquecidos
+class JobRunner:
+    def __init__(self, max_workers=2, max_jobs=64):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='analise')
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Trabalho atual do dono, se puder ser reaproveitado para a chave (o anterior é cancelado se não puder)
+    def _reuse(self, owner, key):
+        atual = self._jobs.get(owner)
+        if atual is not None and atual.key == key and not atual.cancelled and atual.error is None:
+            self._jobs.move_to_end(owner)
+            return atual
+        if atual is not None:
+            atual.cancel()
+        return None
+
+    # Guarda o trabalho do dono e esquece os concluídos mais antigos acima do limite
+    def _register(self, owner, trabalho):
+        self._jobs[owner] = trabalho
+        self._jobs.move_to_end(owner)
+        excesso = len(self._jobs) - self.max_jobs
+        for antigo in [dono for dono, t in self._jobs.items() if t.done and dono != owner][:max(excesso, 0)]:
+            del self._jobs[antigo]
+
+    def submit(self, owner, key, stages):
+        with self._lock:
+            atual = self._reuse(owner, key)
+            if atual is not None:
+                return atual
+            trabalho = Job(key, stages)
+            self._register(owner, trabalho)
+        self._executor.submit(trabalho.run)
+        return trabalho
+
+    # Registra como concluído um trabalho cujos resultados já existem (ex.: espaço de trabalho reaberto),
+    # sem executar as etapas; um trabalho com a mesma chave já registrado é mantido
+    def restore(self, owner, key, stages, results):
+        with self._lock:
+            atual = self._reuse(owner, key)
+            if atual is not None:
+                return atual
+            trabalho = Job(key, stages)
+            trabalho.results.update(results)
+            trabalho._finish()
+            self._register(owner, trabalho)
+        return trabalho
+
+    # Cancela e esquece o trabalho do dono
+    def cancel(self, owner):
+        with self._lock:
+            trabalho = self._jobs.pop(owner, None)
+        if trabalho is not None:
+            trabalho.cancel()
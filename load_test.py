@@ -0,0 +1,257 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Percentis de latência exibidos no relatório
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+# Ações de cada usuário virtual depois da carga inicial (widget alterado e nova execução da página)
+ACTIONS = ['intervalo_de_datas', 'agregacao', 'margem']
+
+
+# Função para gerar um conjunto de vendas sintético (CSV em bytes), o mesmo para a mesma semente
+# Clientes com datas de entrada espalhadas e recompras em intervalos exponenciais, como um export real
+def synthetic_sales(linhas, seed=0):
+    rng = np.random.default_rng(seed)
+    clientes = max(1, linhas // 8)
+    cliente = rng.integers(0, clientes, linhas)
+    entrada = rng.integers(0, 900, clientes)
+    dias = entrada[cliente] + rng.exponential(120, linhas).astype(np.int64)
+    # Vendas que cairiam depois do fim dos dados são sorteadas de novo entre a entrada e o fim
+    fora = dias > 1000
+    dias[fora] = entrada[cliente[fora]] + rng.integers(0, 1001 - entrada[cliente[fora]])
+    vendas = pd.DataFrame({
+        'cliente': 'C' + pd.Series(cliente).astype(str),
+        'data': (np.datetime64('2021-01-01') + dias.astype('timedelta64[D]')).astype(str),
+        'valor': rng.gamma(2, 100, linhas).round(2),
+        'loja': rng.choice(['A', 'B', 'C'], linhas),
+        'canal': rng.choice(['web', 'loja'], linhas),
+    })
+    return vendas.to_csv(index=False).encode('utf-8')
+
+
+# Arquivo enviado simulado (o AppTest não tem upload de arquivos): mesmo nome, tamanho e getvalue()
+class SyntheticUpload(io.BytesIO):
+    def __init__(self, dados, name='vendas_sinteticas.csv'):
+        super().__init__(dados)
+        self.name = name
+        self.size = len(dados)
+
+
+# Resposta do webhook de leads no modo offline
+class OfflineResponse:
+    status_code = 200
+
+    def raise_for_status(self):
+        return None
+
+
+# Execução offline: o upload devolve o conjunto sintético, o webhook de leads não sai da máquina e
+# leads.csv, espaços de trabalho e dados descarregados ficam em uma pasta temporária
+@contextlib.contextmanager
+def offline_environment(dados):
+    import requests
+    import streamlit as st
+
+    uploader_original = st.file_uploader
+    post_original = requests.post
+    pasta_original = os.getcwd()
+
+    def file_uploader(*args, **kwargs):
+        arquivo = SyntheticUpload(dados)
+        return [arquivo] if kwargs.get('accept_multiple_files') else arquivo
+
+    espacos_original = os.environ.get('ANALISE_ESPACOS_DIR')
+
+    with tempfile.TemporaryDirectory(prefix='analise_carga_') as pasta:
+        if espacos_original is None:
+            os.environ['ANALISE_ESPACOS_DIR'] = os.path.join(pasta, 'espacos')
+        st.file_uploader = file_uploader
+        requests.post = lambda *args, **kwargs: OfflineResponse()
+        os.chdir(pasta)
+        try:
+            yield pasta
+        finally:
+            os.chdir(pasta_original)
+            requests.post = post_original
+            st.file_uploader = uploader_original
+            if espacos_original is None:
+                os.environ.pop('ANALISE_ESPACOS_DIR', None)
+
+
+# Memória residente do processo em bytes (Linux: /proc; outros sistemas: pico do processo)
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == 'darwin' else pico * 1024
+
+
+# Amostragem da memória residente em uma thread, para registrar o pico durante o teste
+class MemorySampler:
+    def __init__(self, intervalo=0.05):
+        self.intervalo = intervalo
+        self.inicial = rss_bytes()
+        self.pico = self.inicial
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, rss_bytes())
+
+
+# Usuário virtual: preenche o formulário de lead, envia o arquivo, escolhe as colunas e depois altera
+# intervalo de datas, agregação e margem; cada execução da página é cronometrada
+class VirtualUser:
+    def __init__(self, indice, acoes, timeout, seed=0):
+        self.indice = indice
+        self.acoes = acoes
+        self.timeout = timeout
+        self.random = random.Random(seed + indice)
+        self.tempos = []
+        self.erros = []
+
+    # verificar=False: execuções com as colunas padrão (a primeira do arquivo), que ainda não são as certas
+    def _run(self, at, acao, verificar=True):
+        inicio = time.perf_counter()
+        at.run(timeout=self.timeout)
+        self.tempos.append((acao, time.perf_counter() - inicio))
+        if verificar:
+            self.erros.extend(f"{acao}: {excecao.message}" for excecao in at.exception)
+
+    @staticmethod
+    def _widget(colecao, rotulo):
+        for widget in colecao:
+            if rotulo in widget.label:
+                return widget
+        raise LookupError(f"Widget não encontrado: {rotulo}")
+
+    def run(self, app_path):
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(app_path, default_timeout=self.timeout)
+        self._run(at, 'tela_de_lead')
+
+        # Formulário de lead
+        self._widget(at.text_input, 'Nome Completo').input(f"Usuário Virtual {self.indice}")
+        self._widget(at.text_input, 'Nome da Empresa').input("Teste de Carga")
+        self._widget(at.text_input, 'Email').input(f"usuario{self.indice}@teste-de-carga.com")
+        self._widget(at.text_input, 'Telefone').input(f"+55119{self.indice:08d}")
+        self._widget(at.button, 'Acessar Ferramenta').click()
+        self._run(at, 'upload', verificar=False)
+
+        # Colunas do conjunto sintético
+        self._widget(at.selectbox, 'ID do Cliente').set_value('cliente')
+        self._widget(at.selectbox, 'Data da Venda').set_value('data')
+        self._run(at, 'colunas', verificar=False)
+        self._widget(at.selectbox, 'Valor da Venda').set_value('valor')
+        self._run(at, 'analise_inicial')
+
+        for _ in range(self.acoes):
+            acao = self.random.choice(ACTIONS)
+            if acao == 'intervalo_de_datas':
+                datas = self._widget(at.date_input, 'Intervalo de Datas')
+                minimo, maximo = datas.min, datas.max
+                inicio = minimo + datetime.timedelta(days=self.random.randint(0, (maximo - minimo).days // 2))
+                datas.set_value((inicio, maximo))
+            elif acao == 'agregacao':
+                agregacao = self._widget(at.selectbox, 'nível de agregação')
+                agregacao.set_value(self.random.choice(agregacao.options))
+            else:
+                self._widget(at.slider, 'Margem de Contribuição').set_value(self.random.randint(10, 90))
+            self._run(at, acao)
+
+
+# Função para executar o teste: N usuários virtuais simultâneos (threads no mesmo processo, como as sessões
+# de um servidor Streamlit) e o relatório de latência das execuções, vazão e memória por usuário
+def load_test(usuarios, linhas, acoes, timeout=300, seed=0):
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    dados = synthetic_sales(linhas, seed)
+    virtuais = [VirtualUser(i, acoes, timeout, seed) for i in range(usuarios)]
+
+    def executar(usuario):
+        try:
+            usuario.run(app_path)
+        except Exception as e:
+            usuario.erros.append(f"{type(e).__name__}: {e}")
+
+    with offline_environment(dados), MemorySampler() as memoria:
+        inicio = time.perf_counter()
+        threads = [threading.Thread(target=executar, args=(u,), daemon=True) for u in virtuais]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+    tempos = pd.DataFrame([(acao, t) for u in virtuais for acao, t in u.tempos], columns=['Ação', 'Segundos'])
+
+    def percentis(segundos):
+        return {f"p{p}": round(float(np.percentile(segundos, p)), 3) for p in LATENCY_PERCENTILES}
+
+    return {
+        'usuarios': usuarios,
+        'linhas': linhas,
+        'execucoes': len(tempos),
+        'duracao_segundos': round(duracao, 3),
+        'execucoes_por_segundo': round(len(tempos) / duracao, 3) if duracao else None,
+        'latencia': percentis(tempos['Segundos']) if len(tempos) else {},
+        'latencia_por_acao': {acao: percentis(grupo) for acao, grupo in tempos.groupby('Ação')['Segundos']},
+        'memoria_pico_mb': round(memoria.pico / 1024 ** 2, 1),
+        'memoria_por_usuario_mb': round((memoria.pico - memoria.inicial) / usuarios / 1024 ** 2, 1),
+        'erros': [erro for u in virtuais for erro in u.erros],
+    }
+
+
+# Uso: python load_test.py --usuarios 8 --linhas 200000 --acoes 10 --max-p95 5 --json carga.json
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Teste de carga do app com usuários virtuais simultâneos (offline).")
+    parser.add_argument('--usuarios', type=int, default=4, help="Número de usuários virtuais simultâneos")
+    parser.add_argument('--linhas', type=int, default=50000, help="Número de vendas do conjunto sintético")
+    parser.add_argument('--acoes', type=int, default=10, help="Alterações de widgets por usuário depois da carga")
+    parser.add_argument('--timeout', type=float, default=300, help="Tempo máximo (s) de cada execução da página")
+    parser.add_argument('--seed', type=int, default=0, help="Semente do conjunto sintético e das ações")
+    parser.add_argument('--max-p95', type=float, help="Limite (s) para o p95 da latência; falha se exceder")
+    parser.add_argument('--json', help="Grava o relatório neste arquivo JSON")
+    args = parser.parse_args()
+
+    relatorio = load_test(args.usuarios, args.linhas, args.acoes, args.timeout, args.seed)
+    print(f"{relatorio['usuarios']} usuários, {relatorio['linhas']} vendas: {relatorio['execucoes']} execuções "
+          f"em {relatorio['duracao_segundos']:.1f}s ({relatorio['execucoes_por_segundo']} por segundo)")
+    print("Latência: " + ", ".join(f"{p} {t:.3f}s" for p, t in relatorio['latencia'].items()))
+    for acao, latencia in relatorio['latencia_por_acao'].items():
+        print(f"    {acao:20s} " + ", ".join(f"{p} {t:.3f}s" for p, t in latencia.items()))
+    print(f"Memória: pico {relatorio['memoria_pico_mb']} MB, {relatorio['memoria_por_usuario_mb']} MB por usuário")
+    for erro in relatorio['erros']:
+        print(f"Erro: {erro}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    if relatorio['erros'] or (args.max_p95 is not None and relatorio['latencia'].get('p95', 0) > args.max_p95):
+        sys.exit(1)
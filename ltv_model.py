@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import betaln, gammaln, hyp2f1
+
+# Unidade de tempo dos modelos: semanas (mantém os parâmetros em escalas parecidas)
+DIAS_POR_UNIDADE = 7.0
+
+
+# Função para extrair as estatísticas suficientes (x, t_x, T, m) a partir da tabela RFM
+# Transação = dia distinto de compra: x conta os dias de recompra e m é a média só das recompras
+# (a receita do primeiro dia fica fora, como no Gamma-Gamma); m = 0 para clientes sem recompra
+def rfm_to_summary(rfm):
+    x = (rfm['PurchaseDays'].to_numpy() - 1).astype(np.int64)
+    T = rfm['T'].to_numpy().astype(np.int64)
+    t_x = T - rfm['Recency'].to_numpy().astype(np.int64)
+    recompras = rfm['Monetary'].to_numpy() - rfm['FirstDayMonetary'].to_numpy()
+    m = np.where(x > 0, recompras / np.maximum(x, 1), 0.0)
+    return x, t_x, T, m
+
+
+# Função para deduplicar tuplas inteiras, devolvendo as tuplas únicas, os pesos e o índice inverso
+def compress(*colunas):
+    chave = pd.MultiIndex.from_arrays(colunas) if len(colunas) > 1 else pd.Index(colunas[0])
+    codes, uniques = pd.factorize(chave)
+    pesos = np.bincount(codes, minlength=len(uniques)).astype(np.float64)
+    if len(colunas) > 1:
+        unicos = [uniques.get_level_values(i).to_numpy() for i in range(len(colunas))]
+    else:
+        unicos = [uniques.to_numpy()]
+    return unicos, pesos, codes
+
+
+# Log-verossimilhança BG/NBD por tupla (Fader, Hardie & Lee, 2005)
+def _bgnbd_ll(params, x, t_x, T):
+    r, alpha, a, b = params
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = betaln(a, b + x) - betaln(a, b)
+    a3 = -(r + x) * np.log(alpha + T)
+    com_repeticao = x > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a4 = np.where(com_repeticao,
+                      np.log(a) - np.log(np.maximum(b + x - 1, 1e-12)) - (r + x) * np.log(alpha + t_x),
+                      -np.inf)
+    return a1 + a2 + np.logaddexp(a3, a4)
+
+
+# Log-verossimilhança Gamma-Gamma do valor médio por transação (apenas clientes com recompra)
+def _gamma_gamma_ll(params, x, m):
+    p, q, v = params
+    px = p * x
+    return (gammaln(px + q) - gammaln(px) - gammaln(q) + q * np.log(v)
+            + (px - 1) * np.log(m) + px * np.log(x) - (px + q) * np.log(x * m + v))
+
+
+# Ajuste por máxima verossimilhança ponderada, em log-parâmetros e com partida a quente opcional
+# Um ajuste que não converge gera ValueError (nome: modelo exibido na mensagem)
+def _fit(ll, n_params, pesos, initial, nome):
+    inicio = np.log(initial) if initial is not None else np.zeros(n_params)
+
+    def objetivo(log_params):
+        valores = ll(np.exp(log_params))
+        if not np.all(np.isfinite(valores)):
+            return np.inf
+        return -np.dot(pesos, valores) / pesos.sum()
+
+    resultado = minimize(objetivo, inicio, method='L-BFGS-B', bounds=[(-15, 15)] * n_params)
+    params = np.exp(resultado.x)
+    if not resultado.success or not np.isfinite(resultado.fun) or not np.all(np.isfinite(params)):
+        raise ValueError(f"o ajuste do {nome} não convergiu ({resultado.message}).")
+    return params
+
+
+# Função para ajustar o BG/NBD sobre as tuplas (x, t_x, T) deduplicadas
+def fit_bgnbd(x, t_x, T, initial=None):
+    (ux, ut, uT), pesos, _ = compress(x, t_x, T)
+    ux = ux.astype(np.float64)
+    ut = ut / DIAS_POR_UNIDADE
+    uT = uT / DIAS_POR_UNIDADE
+    params = _fit(lambda prm: _bgnbd_ll(prm, ux, ut, uT), 4, pesos, initial, 'BG/NBD')
+    # Com a <= 1 o número esperado de compras não é finito (divide por a - 1)
+    if params[2] <= 1:
+        raise ValueError(f"parâmetros do BG/NBD fora do intervalo válido (a = {params[2]:.3f} <= 1).")
+    return params
+
+
+# Função para ajustar o Gamma-Gamma sobre as tuplas (x, m) deduplicadas de clientes com recompra
+def fit_gamma_gamma(x, m, initial=None):
+    repetidos = (x > 0) & (m > 0)
+    (ux, um), pesos, _ = compress(x[repetidos], np.round(m[repetidos], 2))
+    params = _fit(lambda prm: _gamma_gamma_ll(prm, ux.astype(np.float64), um), 3, pesos, initial, 'Gamma-Gamma')
+    # Com q <= 1 o valor médio populacional não é finito (divide por q - 1)
+    if params[1] <= 1:
+        raise ValueError(f"parâmetros do Gamma-Gamma fora do intervalo válido (q = {params[1]:.3f} <= 1).")
+    return params
+
+
+# Número esperado de compras nos próximos `dias` dias, condicionado ao histórico (BG/NBD)
+def expected_purchases(params, x, t_x, T, dias):
+    r, alpha, a, b = params
+    (ux, ut, uT), _, inverso = compress(x, t_x, T)
+    ux = ux.astype(np.float64)
+    ut = ut / DIAS_POR_UNIDADE
+    uT = uT / DIAS_POR_UNIDADE
+    t = dias / DIAS_POR_UNIDADE
+
+    z = t / (alpha + uT + t)
+    termo = 1 - ((alpha + uT) / (alpha + uT + t)) ** (r + ux) * hyp2f1(r + ux, b + ux, a + b + ux - 1, z)
+    numerador = (a + b + ux - 1) / (a - 1) * termo
+    denominador = 1 + (ux > 0) * a / np.maximum(b + ux - 1, 1e-12) * ((alpha + uT) / (alpha + ut)) ** (r + ux)
+    return (numerador / denominador)[inverso]
+
+
+# Valor médio esperado por transação (Gamma-Gamma), com encolhimento para a média populacional
+def expected_average_value(params, x, m):
+    p, q, v = params
+    media_populacional = p * v / (q - 1)
+    peso = p * x / (p * x + q - 1)
+    return np.where(x > 0, (1 - peso) * media_populacional + peso * m, media_populacional)
+
+
+# Função para prever o valor esperado de cada cliente nos próximos `dias` dias
+def predict_customer_value(rfm, dias=365, bgnbd_initial=None, gg_initial=None):
+    x, t_x, T, m = rfm_to_summary(rfm)
+    bgnbd_params = fit_bgnbd(x, t_x, T, bgnbd_initial)
+    gg_params = fit_gamma_gamma(x, m, gg_initial)
+
+    compras = expected_purchases(bgnbd_params, x, t_x, T, dias)
+    ticket = expected_average_value(gg_params, x, m)
+    previsao = pd.DataFrame({
+        'ExpectedPurchases': compras,
+        'ExpectedAverageValue': ticket,
+        'ExpectedValue': compras * ticket,
+    }, index=rfm.index)
+    valores = previsao.to_numpy()
+    if not np.all(np.isfinite(valores)) or (valores < 0).any():
+        raise ValueError("o modelo ajustado gerou valores esperados inválidos (infinitos ou negativos).")
+    return previsao, bgnbd_params, gg_params
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Importações de cada etapa da inicialização (cada uma medida em um interpretador novo)
+STAGES = {
+    'tela_de_lead': 'import streamlit',
+    'tela_de_analise': 'import streamlit; import analysis_app',
+}
+
+# Limites (s) de cada etapa, usados pelo teste tests/test_startup.py e como padrão dos limites da linha de comando
+# (ANALISE_MAX_IMPORT_LEAD_S e ANALISE_MAX_IMPORT_ANALISE_S ajustam para máquinas mais lentas)
+LIMITS = {
+    'tela_de_lead': float(os.environ.get('ANALISE_MAX_IMPORT_LEAD_S', 2.0)),
+    'tela_de_analise': float(os.environ.get('ANALISE_MAX_IMPORT_ANALISE_S', 6.0)),
+}
+
+
+# Função para medir o tempo de importação de um trecho em um processo novo (-X importtime)
+# Devolve o tempo total em segundos e os módulos mais lentos (tempo acumulado)
+def measure(codigo, top=10):
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    resultado = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo],
+                               cwd=pasta, capture_output=True, text=True, check=True)
+    modulos = []
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha.split('|')
+        # Apenas módulos de primeiro nível (o acumulado já inclui os submódulos, que vêm indentados)
+        if not nome[1:].startswith(' '):
+            modulos.append((nome.strip(), int(acumulado) / 1e6))
+    total = sum(tempo for _, tempo in modulos)
+    return total, sorted(modulos, key=lambda item: -item[1])[:top]
+
+
+# Uso (por exemplo, em um passo de CI): python measure_startup.py --max-tela-de-lead 1.5 --json startup.json
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação de cada tela do app.")
+    parser.add_argument('--max-tela-de-lead', type=float, default=LIMITS['tela_de_lead'],
+                        help="Limite (s) para a tela de lead; falha se exceder")
+    parser.add_argument('--max-tela-de-analise', type=float, default=LIMITS['tela_de_analise'],
+                        help="Limite (s) para a tela de análise; falha se exceder")
+    parser.add_argument('--json', help="Grava os tempos medidos neste arquivo JSON")
+    parser.add_argument('--top', type=int, default=10, help="Número de módulos mais lentos exibidos por etapa")
+    args = parser.parse_args()
+
+    relatorio = {}
+    for etapa, codigo in STAGES.items():
+        total, lentos = measure(codigo, args.top)
+        relatorio[etapa] = {'segundos': round(total, 3), 'modulos_mais_lentos': [[n, round(t, 3)] for n, t in lentos]}
+        print(f"{etapa}: {total:.3f}s")
+        for nome, tempo in lentos:
+            print(f"    {tempo:7.3f}s  {nome}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    limites = {'tela_de_lead': args.max_tela_de_lead, 'tela_de_analise': args.max_tela_de_analise}
+    excedidos = [etapa for etapa, limite in limites.items()
+                 if limite is not None and relatorio[etapa]['segundos'] > limite]
+    if excedidos:
+        print(f"Tempo de importação acima do limite: {', '.join(excedidos)}")
+        sys.exit(1)
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from cohort_engine import average_retention, day_numbers, period_index, period_labels
+
+# Colunas dos agregados diários (somas aditivas: qualquer intervalo sai de duas leituras das somas acumuladas)
+DAILY_COLUMNS = ['Receita', 'Vendas', 'ReceitaComID', 'VendasComID', 'ReceitaNovos', 'VendasNovos']
+
+
+# Função para calcular os agregados por dia a partir das transações
+# Vendas "Novos" são as da primeira compra do cliente no conjunto completo
+def daily_frame(customer_ids, dates, values):
+    customer_ids = pd.Series(customer_ids).reset_index(drop=True)
+    codes, _ = pd.factorize(customer_ids)
+    datas = np.asarray(dates, dtype='datetime64[ns]')
+    dias = day_numbers(datas)
+    valores = np.nan_to_num(np.asarray(values, dtype=np.float64))
+
+    com_id = codes >= 0
+    primeira = np.full(int(codes.max()) + 1 if com_id.any() else 0, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(primeira, codes[com_id], datas.astype(np.int64)[com_id])
+    novo = np.zeros(len(codes), dtype=bool)
+    novo[com_id] = datas.astype(np.int64)[com_id] == primeira[codes[com_id]]
+
+    base = int(dias.min())
+    posicao = dias - base
+    n = int(posicao.max()) + 1
+    colunas = {
+        'Receita': np.bincount(posicao, weights=valores, minlength=n),
+        'Vendas': np.bincount(posicao, minlength=n),
+        'ReceitaComID': np.bincount(posicao, weights=valores * com_id, minlength=n),
+        'VendasComID': np.bincount(posicao, weights=com_id, minlength=n),
+        'ReceitaNovos': np.bincount(posicao, weights=valores * novo, minlength=n),
+        'VendasNovos': np.bincount(posicao, weights=novo, minlength=n),
+    }
+    return pd.DataFrame(colunas, index=pd.RangeIndex(base, base + n, name='Dia'))
+
+
+# Agregados diários densos com somas acumuladas: o total de qualquer intervalo custa O(1)
+class DailyAggregates:
+    def __init__(self, diario):
+        self.first_day = int(diario.index.min())
+        self.last_day = int(diario.index.max())
+        denso = diario.reindex(range(self.first_day, self.last_day + 1), fill_value=0)[DAILY_COLUMNS]
+        self.cumulative = np.vstack([np.zeros(len(DAILY_COLUMNS)), np.cumsum(denso.to_numpy(dtype=np.float64), axis=0)])
+
+    # Totais das colunas diárias entre start_day e end_day (inclusive)
+    def totals(self, start_day, end_day):
+        lo = min(max(int(start_day), self.first_day), self.last_day + 1) - self.first_day
+        hi = min(max(int(end_day) + 1, self.first_day), self.last_day + 1) - self.first_day
+        hi = max(hi, lo)
+        return dict(zip(DAILY_COLUMNS, self.cumulative[hi] - self.cumulative[lo]))
+
+
+# Intervalo de mesmo tamanho imediatamente anterior
+def previous_period(start_date, end_date):
+    dias = (end_date - start_date).days + 1
+    return start_date - pd.Timedelta(days=dias), start_date - pd.Timedelta(days=1)
+
+
+# Mesmo intervalo no ano anterior
+def same_period_last_year(start_date, end_date):
+    deslocamento = pd.DateOffset(years=1)
+    return (pd.Timestamp(start_date) - deslocamento).date(), (pd.Timestamp(end_date) - deslocamento).date()
+
+
+# Métricas principais de um intervalo a partir dos agregados diários e dos sketches de clientes
+def range_metrics(agregados, customer_sketches, start_date, end_date):
+    inicio = np.datetime64(start_date, 'D').astype(np.int64)
+    fim = np.datetime64(end_date, 'D').astype(np.int64)
+    totais = agregados.totals(inicio, fim)
+    clientes = customer_sketches.unique_customers(inicio, fim).count()
+    novos = customer_sketches.new_customers(inicio, fim).count()
+    dividir = lambda a, b: a / b if b else np.nan
+    return {
+        'receita_total': totais['Receita'],
+        'numero_total_vendas': totais['Vendas'],
+        'ticket_medio': dividir(totais['Receita'], totais['Vendas']),
+        'clientes_unicos': clientes,
+        'novos_clientes': novos,
+        'receita_media_cliente': dividir(totais['ReceitaComID'], clientes),
+        'numero_medio_transacoes': dividir(totais['VendasComID'], clientes),
+        'receita_novos': totais['ReceitaNovos'],
+        'receita_recorrentes': totais['Receita'] - totais['ReceitaNovos'],
+    }
+
+
+# Curva média de retenção (ponderada pelo tamanho) das coortes iniciadas dentro do intervalo
+def cohort_retention_curve(matrices, start_date, end_date, period):
+    if matrices is None:
+        return pd.Series(dtype=np.float64)
+    dias = day_numbers(pd.to_datetime([start_date, end_date]))
+    primeiro, ultimo = period_index(dias, period)
+    rotulos = period_labels(np.arange(primeiro, ultimo + 1), period)
+    return average_retention(matrices, matrices['retention'].index.isin(rotulos))
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from cohort_engine import day_numbers
+
+# Percentis exibidos na distribuição dos intervalos entre compras
+INTERVAL_PERCENTILES = [0.25, 0.5, 0.75, 0.9]
+
+
+# Intervalos entre dias de compra consecutivos de cada cliente, calculados em uma única ordenação por (cliente, dia)
+# seguida de diferenças; várias vendas do mesmo cliente no mesmo dia contam como uma compra (os itens de um
+# pedido não viram intervalos de 0 dias) e vendas sem ID de cliente são ignoradas
+class RepurchaseTiming:
+    def __init__(self, customer_ids, dates):
+        customer_ids = pd.Series(customer_ids).reset_index(drop=True)
+        codes, uniques = pd.factorize(customer_ids)
+        dias = day_numbers(np.asarray(dates, dtype='datetime64[ns]')).astype(np.int32)
+        com_id = codes >= 0
+        codes = codes[com_id].astype(np.int32)
+        dias = dias[com_id]
+        self.ids = pd.Index(uniques, name='ID do Cliente')
+        self.last_day = int(dias.max()) if len(dias) else 0
+
+        # Pares (cliente, dia) distintos com uma única chave inteira: ordena e deduplica os valores (sem argsort)
+        # e decodifica
+        primeiro_dia = int(dias.min()) if len(dias) else 0
+        amplitude = self.last_day - primeiro_dia + 1
+        chave = np.unique(codes.astype(np.int64) * amplitude + (dias - primeiro_dia))
+        codes = (chave // amplitude).astype(np.int32)
+        dias = (chave % amplitude + primeiro_dia).astype(np.int32)
+        mesmo_cliente = codes[1:] == codes[:-1]
+
+        # Um intervalo (>= 1 dia) para cada par de dias de compra consecutivos do mesmo cliente
+        self.interval_customer = codes[1:][mesmo_cliente]
+        self.intervals = (dias[1:] - dias[:-1])[mesmo_cliente]
+
+        # Para cada dia de compra: dias até a próxima compra do cliente (-1 se não houve) e dias até o fim dos dados
+        proxima = np.full(len(dias), -1, dtype=np.int32)
+        proxima[:-1][mesmo_cliente] = self.intervals
+        self.next_gap = proxima
+        self.exposure = self.last_day - dias
+
+    def __len__(self):
+        return len(self.intervals)
+
+    # Contagem de intervalos por número de dias (de 1 a max_days)
+    def distribution(self, max_days):
+        contagens = np.bincount(np.minimum(self.intervals, max_days + 1), minlength=max_days + 2)[1:max_days + 1]
+        return pd.Series(contagens, index=pd.RangeIndex(1, max_days + 1, name='Dias'), name='Intervalos')
+
+    # Percentis dos intervalos no geral e por grupo (rotulos: Series indexada pelo ID do cliente)
+    def percentiles(self, rotulos=None, qs=INTERVAL_PERCENTILES):
+        geral = pd.Series(np.quantile(self.intervals, qs), index=qs) if len(self.intervals) else pd.Series(np.nan, index=qs)
+        tabela = pd.DataFrame({'Todos': geral}).T
+        tabela.insert(0, 'Intervalos', len(self.intervals))
+        if rotulos is not None and len(self.intervals):
+            grupos = rotulos.reindex(self.ids).astype(str).to_numpy()[self.interval_customer]
+            por_grupo = pd.Series(self.intervals).groupby(grupos)
+            detalhe = por_grupo.quantile(qs).unstack()
+            detalhe.insert(0, 'Intervalos', por_grupo.size())
+            tabela = pd.concat([tabela, detalhe.sort_values('Intervalos', ascending=False)])
+        tabela.columns = ['Intervalos'] + [f"P{round(q * 100)}" for q in qs]
+        return tabela
+
+    # Probabilidade de um dia de compra ser seguido por outra compra do mesmo cliente em até N dias, para N = 1..max_days
+    # Só entram em cada N as compras com pelo menos N dias de dados depois delas (as mais recentes não contam
+    # como "sem recompra" antes da hora); com g = dias até a próxima e e = dias até o fim (g <= e sempre):
+    # #(g <= N e e >= N) = #(g <= N) - #(com recompra e e < N)
+    def repurchase_probability(self, max_days):
+        n = np.arange(1, max_days + 1)
+        com_recompra = self.next_gap >= 0
+        lacunas = np.sort(self.next_gap[com_recompra])
+        exposicoes = np.sort(self.exposure)
+        fora = np.searchsorted(exposicoes, n, side='left')
+        fora_com_recompra = np.searchsorted(np.sort(self.exposure[com_recompra]), n, side='left')
+        recompras = np.searchsorted(lacunas, n, side='right') - fora_com_recompra
+        em_observacao = len(exposicoes) - fora
+        with np.errstate(invalid='ignore', divide='ignore'):
+            probabilidade = np.where(em_observacao > 0, recompras / em_observacao, np.nan)
+        return pd.Series(probabilidade, index=pd.Index(n, name='Dias'), name='Probabilidade de Recompra')
@@ -0,0 +1,348 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Pico de memória de uma análise em relação ao tamanho do conjunto de dados (df, filtered_df e intermediários)
+ANALYSIS_MEMORY_FACTOR = 3
+
+# Intervalo entre as atualizações da posição na fila enquanto a análise espera
+WAIT_POLL_SECONDS = 0.5
+
+
+# Orçamento padrão de memória: metade da memória física (ou 4 GB quando não é possível descobrir)
+def default_budget_bytes():
+    try:
+        return int(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') * 0.5)
+    except (ValueError, OSError, AttributeError):
+        return 4 * 1024 ** 3
+
+
+# Função para estimar a memória ocupada por um DataFrame (inclui o conteúdo das colunas de texto)
+def estimate_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# Admissão concedida a uma análise: tempo de espera na fila e retenção da vaga por trabalhos em segundo plano
+# que continuam depois que a execução da página termina
+class Admission:
+    def __init__(self, manager, ticket, waited):
+        self.manager = manager
+        self.ticket = ticket
+        self.waited = waited
+
+    # Mantém a vaga (e a memória reservada) até a função devolvida ser chamada; chamadas repetidas não contam
+    def hold(self):
+        self.manager._retain(self.ticket)
+        liberada = threading.Event()
+
+        def release():
+            if not liberada.is_set():
+                liberada.set()
+                self.manager._release(self.ticket)
+        return release
+
+
+# Gerenciador de recursos do processo: memória dos conjuntos de dados de cada sessão, fila de admissão
+# das análises pesadas (semáforo com orçamento global) e descarga em disco (Parquet) dos dados de sessões ociosas
+# on_evict(session_id): chamado quando os dados de uma sessão são descarregados em disco ou apagados
+# A trava só protege a contabilidade (escolha das vítimas, estados, fila): leitura e gravação dos arquivos,
+# on_wait e on_evict rodam fora dela, para uma descarga lenta não parar as outras sessões
+class ResourceManager:
+    def __init__(self, budget_bytes=None, max_concurrent=2, spill_dir=None, idle_seconds=300, expire_seconds=86400,
+                 on_evict=None):
+        self.budget_bytes = int(budget_bytes or default_budget_bytes())
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), 'analise_spill')
+        self.idle_seconds = idle_seconds
+        self.expire_seconds = expire_seconds
+        self.on_evict = on_evict
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+        self._condition = threading.Condition()
+        self._datasets = {}
+        self._queue = deque()
+        self._running = {}
+        self._holds = {}
+
+    # Memória estimada em uso: conjuntos de dados em memória + análises em andamento
+    def memory_in_use(self):
+        with self._condition:
+            return self._memory_in_use()
+
+    # sem_sessao: ignora as análises dessa sessão (uma nova execução substitui a anterior da mesma sessão)
+    def _memory_in_use(self, sem_sessao=None):
+        em_memoria = sum(d['bytes'] for d in self._datasets.values() if d['frame'] is not None)
+        return em_memoria + sum(b for (sessao, _), b in self._running.items() if sessao != sem_sessao)
+
+    # Resumo do estado atual (para exibição)
+    def status(self):
+        with self._condition:
+            return {
+                'memoria_em_uso': self._memory_in_use(),
+                'orcamento': self.budget_bytes,
+                'analises_em_andamento': len(self._running),
+                'analises_na_fila': len(self._queue),
+                'sessoes_em_memoria': sum(1 for d in self._datasets.values() if d['frame'] is not None),
+                'sessoes_em_disco': sum(1 for d in self._datasets.values() if d['frame'] is None),
+            }
+
+    # Guarda o conjunto de dados da sessão (substitui o anterior) e descarrega outros se passar do orçamento
+    def store(self, session_id, key, df):
+        tamanho = estimate_bytes(df)
+        with self._condition:
+            pendente = self._discard(session_id)
+            self._datasets[session_id] = self._entry(key, df, tamanho)
+            pendente += self._enforce_budget(manter=session_id)
+            self._condition.notify_all()
+        self._finish(pendente)
+
+    def _entry(self, key, df, tamanho):
+        return {'key': key, 'frame': df, 'path': None, 'bytes': tamanho, 'last_access': time.monotonic(),
+                'writing': None, 'loading': False}
+
+    # Devolve o conjunto de dados da sessão para a chave dada (relendo do disco se foi descarregado) ou None
+    def load(self, session_id, key):
+        with self._condition:
+            while True:
+                dados = self._datasets.get(session_id)
+                if dados is None or dados['key'] != key:
+                    return None
+                if not dados['loading']:
+                    break
+                # Outra execução da mesma sessão já está relendo o arquivo
+                self._condition.wait()
+            dados['last_access'] = time.monotonic()
+            if dados['frame'] is not None:
+                return dados['frame']
+            dados['loading'] = True
+            caminho = dados['path']
+
+        try:
+            frame = read_spill(caminho)
+        finally:
+            with self._condition:
+                dados['loading'] = False
+                self._condition.notify_all()
+
+        with self._condition:
+            pendente = []
+            if self._datasets.get(session_id) is dados:
+                dados['frame'] = frame
+                dados['path'] = None
+                pendente = self._enforce_budget(manter=session_id)
+            self._condition.notify_all()
+        remove_file(caminho)
+        self._finish(pendente)
+        return frame
+
+    # Tamanho estimado do conjunto de dados guardado para a sessão (0 se não houver)
+    def dataset_bytes(self, session_id, key):
+        with self._condition:
+            dados = self._datasets.get(session_id)
+            return dados['bytes'] if dados is not None and dados['key'] == key else 0
+
+    # Descarrega em disco os dados das sessões ociosas e apaga os de sessões expiradas
+    def spill_idle(self):
+        agora = time.monotonic()
+        pendente = []
+        with self._condition:
+            em_andamento = self._running_sessions()
+            for session_id, dados in list(self._datasets.items()):
+                ocioso = agora - dados['last_access']
+                if session_id in em_andamento or dados['loading']:
+                    continue
+                if ocioso > self.expire_seconds:
+                    pendente += self._discard(session_id)
+                elif ocioso > self.idle_seconds and self._spillable(dados):
+                    pendente += self._spill(session_id)
+            self._condition.notify_all()
+        self._finish(pendente)
+
+    # Remove os dados de uma sessão (memória e disco)
+    def release(self, session_id):
+        with self._condition:
+            pendente = self._discard(session_id)
+            self._condition.notify_all()
+        self._finish(pendente)
+
+    # Posição (1 = próxima) da sessão na fila de admissão, ou 0 se não está esperando
+    def queue_position(self, session_id):
+        with self._condition:
+            return self._position(session_id)
+
+    def _position(self, session_id):
+        for posicao, (sessao, _) in enumerate(self._queue, start=1):
+            if sessao == session_id:
+                return posicao
+        return 0
+
+    # Sessões com análise em andamento (uma sessão pode ter duas execuções sobrepostas após um rerun)
+    def _running_sessions(self):
+        return {sessao for sessao, _ in self._running}
+
+    # Admissão de uma análise pesada: espera na fila (FIFO) até haver vaga e memória no orçamento
+    # on_wait(posicao, segundos_esperando) é chamado periodicamente enquanto a análise espera
+    # Devolve um Admission; a vaga é liberada na saída do bloco, ou depois, se algum trabalho a retiver (hold)
+    @contextmanager
+    def admit(self, session_id, estimated_bytes, on_wait=None):
+        inicio = time.monotonic()
+        ticket = (session_id, uuid.uuid4().hex)
+        admitida = False
+        with self._condition:
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._condition:
+                    admitida, pendente = self._try_admit(ticket, estimated_bytes)
+                    if admitida:
+                        self._queue.remove(ticket)
+                        self._running[ticket] = int(estimated_bytes)
+                        self._holds[ticket] = 1
+                        self._condition.notify_all()
+                    posicao = self._queue.index(ticket) + 1 if not admitida else 0
+                self._finish(pendente)
+                if admitida:
+                    break
+                # Descargas iniciadas agora liberam memória: verifica de novo antes de esperar
+                if pendente:
+                    continue
+                if on_wait is not None:
+                    on_wait(posicao, time.monotonic() - inicio)
+                with self._condition:
+                    self._condition.wait(WAIT_POLL_SECONDS)
+        finally:
+            if not admitida:
+                with self._condition:
+                    self._queue.remove(ticket)
+                    self._condition.notify_all()
+        try:
+            yield Admission(self, ticket, time.monotonic() - inicio)
+        finally:
+            self._release(ticket)
+
+    def _retain(self, ticket):
+        with self._condition:
+            self._holds[ticket] += 1
+
+    def _release(self, ticket):
+        with self._condition:
+            self._holds[ticket] -= 1
+            if self._holds[ticket] == 0:
+                del self._holds[ticket]
+                del self._running[ticket]
+                self._condition.notify_all()
+
+    # Análises de outras sessões não deixam entrar; as anteriores da mesma sessão (ainda terminando a
+    # etapa em andamento ou reaproveitadas pela nova execução) não contam contra ela
+    # Devolve (admitida, descargas a fazer fora da trava)
+    def _try_admit(self, ticket, estimated_bytes):
+        outras = sum(1 for sessao, _ in self._running if sessao != ticket[0])
+        if self._queue[0] != ticket or outras >= self.max_concurrent:
+            return False, []
+        if not outras:
+            # Sem outras análises em andamento, a primeira da fila sempre roda (mesmo acima do orçamento)
+            return True, []
+        pendente = self._enforce_budget(manter=ticket[0], extra=estimated_bytes)
+        return self._memory_in_use(sem_sessao=ticket[0]) + estimated_bytes <= self.budget_bytes, pendente
+
+    # Dados em memória que podem ir para o disco (nem sendo gravados, nem relidos)
+    def _spillable(self, dados):
+        return dados['frame'] is not None and dados['writing'] is None and not dados['loading']
+
+    # Escolhe os conjuntos de dados menos usados recentemente a descarregar até caber no orçamento
+    # (os que já estão sendo gravados contam como liberados)
+    def _enforce_budget(self, manter=None, extra=0):
+        em_andamento = self._running_sessions()
+        candidatos = sorted((d['last_access'], session_id) for session_id, d in self._datasets.items()
+                            if self._spillable(d) and session_id != manter and session_id not in em_andamento)
+        liberando = sum(d['bytes'] for d in self._datasets.values() if d['writing'] is not None)
+        pendente = []
+        for _, session_id in candidatos:
+            if self._memory_in_use(sem_sessao=manter) - liberando + extra <= self.budget_bytes:
+                break
+            liberando += self._datasets[session_id]['bytes']
+            pendente += self._spill(session_id)
+        return pendente
+
+    # Marca a descarga (sob a trava); a gravação fica para _finish
+    def _spill(self, session_id):
+        dados = self._datasets[session_id]
+        dados['writing'] = dados['last_access']
+        return [('gravar', session_id, dados)]
+
+    # Retira a sessão da contabilidade (sob a trava); o arquivo é apagado e on_evict chamado em _finish
+    def _discard(self, session_id):
+        dados = self._datasets.pop(session_id, None)
+        if dados is None:
+            return []
+        return [('apagar', session_id, dados['path'])]
+
+    # Executa, fora da trava, as gravações e remoções de arquivos e os avisos on_evict
+    def _finish(self, pendente):
+        for acao, session_id, alvo in pendente:
+            if acao == 'apagar':
+                remove_file(alvo)
+                self._evicted(session_id)
+            elif self._write(session_id, alvo):
+                self._evicted(session_id)
+
+    # Grava os dados em disco e só então solta o DataFrame; a descarga é desfeita se a sessão usou os dados
+    # durante a gravação, se eles foram substituídos/apagados ou se a gravação falhou (os dados ficam em memória)
+    def _write(self, session_id, dados):
+        try:
+            caminho = write_spill(dados['frame'], self.spill_dir)
+        except OSError:
+            caminho = None
+        with self._condition:
+            marcado = dados['writing']
+            dados['writing'] = None
+            valido = (caminho is not None and self._datasets.get(session_id) is dados
+                      and dados['last_access'] == marcado)
+            if valido:
+                dados['frame'] = None
+                dados['path'] = caminho
+            self._condition.notify_all()
+        if not valido:
+            remove_file(caminho)
+        return valido
+
+    # Avisa que os dados da sessão saíram da memória (ex.: para esquecer os trabalhos que os referenciam)
+    def _evicted(self, session_id):
+        if self.on_evict is not None:
+            self.on_evict(session_id)
+
+
+# Função para gravar um DataFrame descarregado em Parquet; sem pyarrow, ou com colunas que o Arrow não representa
+# (ex.: tipos misturados em uma coluna de texto), cai para pickle. Devolve o caminho gravado
+def write_spill(df, pasta):
+    base = os.path.join(pasta, uuid.uuid4().hex)
+    try:
+        df.to_parquet(base + '.parquet')
+        return base + '.parquet'
+    except (ImportError, TypeError, ValueError, NotImplementedError):
+        remove_file(base + '.parquet')
+    df.to_pickle(base + '.pkl')
+    return base + '.pkl'
+
+
+# Função para reler um DataFrame descarregado (Parquet ou pickle, pela extensão)
+def read_spill(caminho):
+    if caminho.endswith('.parquet'):
+        return pd.read_parquet(caminho)
+    return pd.read_pickle(caminho)
+
+
+# Função para apagar um arquivo que pode já não existir
+def remove_file(caminho):
+    if caminho is None:
+        return
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
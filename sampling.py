@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from cohort_engine import day_numbers, period_index
+from sketches import hash_ids
+
+# Quantil da normal padrão para intervalos de 95%
+Z_95 = 1.959963984540054
+
+# Mínimo de clientes sorteados por estrato (períodos pequenos entram com taxa maior, ou inteiros)
+MIN_CUSTOMERS_PER_STRATUM = 20
+
+
+# Amostra estratificada de clientes: estratos pelo período da primeira compra e sorteio pelo hash do ID,
+# então todas as vendas de um cliente sorteado entram juntas (e a mesma base sempre gera a mesma amostra)
+# Vendas sem ID de cliente entram por sorteio simples de linhas com a mesma fração
+class StratifiedCustomerSample:
+    def __init__(self, customer_ids, dates, fraction, period, min_por_estrato=MIN_CUSTOMERS_PER_STRATUM, seed=0):
+        customer_ids = pd.Series(customer_ids).reset_index(drop=True)
+        codes, uniques = pd.factorize(customer_ids)
+        dias = day_numbers(dates)
+        com_id = codes >= 0
+        self.fraction = float(fraction)
+
+        # Estrato de cada cliente: período da primeira compra
+        primeira = pd.Series(dias[com_id]).groupby(codes[com_id]).min().reindex(range(len(uniques))).to_numpy()
+        estratos, estrato_cliente = np.unique(period_index(primeira, period), return_inverse=True)
+        self.population = np.bincount(estrato_cliente, minlength=len(estratos))
+        taxas = np.minimum(1.0, np.maximum(self.fraction, min_por_estrato / self.population))
+
+        # Sorteio pelo hash: 53 bits do hash viram um número uniforme em [0, 1)
+        uniforme = (hash_ids(uniques) >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+        sorteados = uniforme < taxas[estrato_cliente]
+        self.sampled = np.bincount(estrato_cliente[sorteados], minlength=len(estratos))
+        pesos_estrato = self.population / np.maximum(self.sampled, 1)
+
+        # Clientes sorteados: estrato, peso e dia da primeira compra
+        self.customers = pd.DataFrame({
+            'Estrato': estrato_cliente[sorteados],
+            'Peso': pesos_estrato[estrato_cliente[sorteados]],
+            'PrimeiroDia': primeira[sorteados],
+        }, index=pd.Index(uniques[sorteados], name='ID do Cliente'))
+
+        # Linhas da amostra e peso de cada uma
+        sem_id = ~com_id
+        self.row_mask = np.zeros(len(codes), dtype=bool)
+        self.row_mask[com_id] = sorteados[codes[com_id]]
+        self.row_mask[sem_id] = np.random.default_rng(seed).random(int(sem_id.sum())) < self.fraction
+        pesos = np.full(len(codes), 1.0 / self.fraction)
+        pesos[com_id] = pesos_estrato[estrato_cliente[codes[com_id]]]
+        self.row_weight = pesos[self.row_mask]
+
+    @property
+    def total_customers(self):
+        return int(self.population.sum())
+
+    # Estimativa do total populacional de uma variável medida nos clientes sorteados, com a variância
+    # do estimador estratificado: soma de N_h² (1 - n_h/N_h) s_h² / n_h
+    def total(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        estrato = self.customers['Estrato'].to_numpy()
+        n = self.sampled.astype(np.float64)
+        soma = np.bincount(estrato, weights=valores, minlength=len(n))
+        soma2 = np.bincount(estrato, weights=valores ** 2, minlength=len(n))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = np.where(n > 0, soma / n, 0.0)
+            s2 = np.where(n > 1, (soma2 - n * media ** 2) / (n - 1), 0.0)
+            variancia = np.where(n > 0, self.population ** 2 * (1 - n / self.population) * s2 / n, 0.0)
+        return float((self.population * media).sum()), float(np.maximum(variancia, 0).sum())
+
+
+# Mediana ponderada (pesos = número de clientes representados por cada cliente sorteado)
+def weighted_median(valores, pesos):
+    valores = np.asarray(valores, dtype=np.float64)
+    if len(valores) == 0:
+        return np.nan
+    ordem = np.argsort(valores)
+    acumulado = np.cumsum(np.asarray(pesos, dtype=np.float64)[ordem])
+    return float(valores[ordem][np.searchsorted(acumulado, acumulado[-1] / 2)])
+
+
+# Métricas principais estimadas a partir da amostra, com intervalos de 95% (razões por linearização)
+# amostra_periodo: vendas da amostra dentro do intervalo de datas (colunas padronizadas do app)
+def sample_metrics(amostra, amostra_periodo, start_date, end_date):
+    clientes = amostra.customers
+    ids = amostra_periodo['ID do Cliente']
+    com_id = ids.notna().to_numpy()
+    valores = np.nan_to_num(amostra_periodo['Valor da Venda'].to_numpy(dtype=np.float64))
+
+    # Receita e vendas no período por cliente sorteado (zero para os inativos, que também entram na variância)
+    posicao = clientes.index.get_indexer(ids[com_id])
+    receita = np.bincount(posicao, weights=valores[com_id], minlength=len(clientes))
+    vendas = np.bincount(posicao, minlength=len(clientes)).astype(np.float64)
+    ativo = (vendas > 0).astype(np.float64)
+    inicio = np.datetime64(start_date, 'D').astype(np.int64)
+    fim = np.datetime64(end_date, 'D').astype(np.int64)
+    primeiro = clientes['PrimeiroDia'].to_numpy()
+    novo = ((primeiro >= inicio) & (primeiro <= fim)).astype(np.float64)
+
+    # Vendas sem ID: sorteio simples de linhas (Horvitz–Thompson)
+    f = amostra.fraction
+    receita_sem_id = valores[~com_id]
+    extra = {
+        'receita': (receita_sem_id.sum() / f, ((1 - f) / f ** 2 * receita_sem_id ** 2).sum()),
+        'vendas': (len(receita_sem_id) / f, (1 - f) / f ** 2 * len(receita_sem_id)),
+    }
+
+    def total(v, parte_sem_id=None):
+        estimativa, variancia = amostra.total(v)
+        if parte_sem_id is not None:
+            estimativa += extra[parte_sem_id][0]
+            variancia += extra[parte_sem_id][1]
+        return estimativa, variancia
+
+    def intervalo(estimativa, variancia):
+        meia = Z_95 * np.sqrt(variancia)
+        return estimativa - meia, estimativa + meia
+
+    # Razão Y/X: variância pelo total dos resíduos y - r x
+    def razao(y, x, y_sem_id=None, x_sem_id=None):
+        ty, _ = total(y, y_sem_id)
+        tx, _ = total(x, x_sem_id)
+        if not tx:
+            return np.nan, (np.nan, np.nan)
+        r = ty / tx
+        _, variancia = amostra.total(y - r * x)
+        if y_sem_id is not None:
+            residuo_sem_id = receita_sem_id - r
+            variancia += ((1 - f) / f ** 2 * residuo_sem_id ** 2).sum()
+        return r, intervalo(r, variancia / tx ** 2)
+
+    receita_total, var_receita = total(receita, 'receita')
+    vendas_total, var_vendas = total(vendas, 'vendas')
+    clientes_unicos, var_clientes = total(ativo)
+    novos_clientes, var_novos = total(novo)
+    ticket_medio, ic_ticket = razao(receita, vendas, 'receita', 'vendas')
+    receita_media, ic_receita_media = razao(receita, ativo)
+    transacoes_media, ic_transacoes = razao(vendas, ativo)
+    ativos = ativo > 0
+    pesos = clientes['Peso'].to_numpy()[ativos]
+
+    return {
+        'receita_total': receita_total,
+        'clientes_unicos': clientes_unicos,
+        'novos_clientes': novos_clientes,
+        'numero_total_vendas': vendas_total,
+        'ticket_medio': ticket_medio,
+        'numero_medio_transacoes': transacoes_media,
+        'numero_mediano_transacoes': weighted_median(vendas[ativos], pesos),
+        'receita_media_cliente': receita_media,
+        'receita_mediana_cliente': weighted_median(receita[ativos], pesos),
+        'erro_padrao': None,
+        'intervalos': {
+            'receita_total': intervalo(receita_total, var_receita),
+            'clientes_unicos': intervalo(clientes_unicos, var_clientes),
+            'novos_clientes': intervalo(novos_clientes, var_novos),
+            'numero_total_vendas': intervalo(vendas_total, var_vendas),
+            'ticket_medio': ic_ticket,
+            'numero_medio_transacoes': ic_transacoes,
+            'receita_media_cliente': ic_receita_media,
+        },
+    }
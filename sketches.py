@@ -0,0 +1,221 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Limite padrão abaixo do qual a contagem é mantida exata (conjunto de hashes)
+EXACT_THRESHOLD = 4096
+
+# Número de chaves consecutivas cobertas por cada bloco de registradores pré-agregados
+BLOCK_SIZE = 32
+
+
+# Função para converter o erro padrão relativo desejado na precisão do HyperLogLog
+def precision_for_error(erro_relativo):
+    erro_relativo = min(max(float(erro_relativo), 0.002), 0.26)
+    p = math.ceil(math.log2((1.04 / erro_relativo) ** 2))
+    return int(min(max(p, 4), 18))
+
+
+# Erro padrão relativo de um HyperLogLog com precisão p
+def standard_error(p):
+    return 1.04 / math.sqrt(1 << p)
+
+
+# Função para gerar hashes de 64 bits (vetorizado) para os IDs de cliente
+def hash_ids(ids):
+    valores = np.asarray(ids, dtype=object)
+    return pd.util.hash_array(valores, categorize=True).astype(np.uint64)
+
+
+# Número de zeros à esquerda + 1 dos (64 - p) bits restantes de cada hash
+def _rho(hashes, p):
+    w = hashes << np.uint64(p)
+    hi = (w >> np.uint64(32)).astype(np.float64)
+    lo = (w & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # frexp devolve o número de bits significativos para inteiros exatos em float64
+    bits_hi = np.frexp(hi)[1]
+    bits_lo = np.frexp(lo)[1]
+    lz = np.where(hi > 0, 32 - bits_hi, 64 - bits_lo)
+    return np.minimum(lz + 1, 64 - p + 1).astype(np.uint8)
+
+
+# Função para preencher os registradores HLL de várias linhas de uma vez
+def _registers(rows, hashes, n_rows, p):
+    m = 1 << p
+    regs = np.zeros(n_rows * m, dtype=np.uint8)
+    if len(hashes):
+        idx = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        np.maximum.at(regs, rows.astype(np.int64) * m + idx, _rho(hashes, p))
+    return regs.reshape(n_rows, m)
+
+
+# Estimativa de cardinalidade a partir dos registradores (com correção para cardinalidades pequenas)
+def _estimate(registers):
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimativa = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimativa <= 2.5 * m and zeros > 0:
+        estimativa = m * math.log(m / zeros)
+    return estimativa
+
+
+# Sketch de clientes distintos: exato (hashes únicos) para cardinalidades pequenas, HyperLogLog acima do limite
+class DistinctSketch:
+    def __init__(self, p, exact_threshold=EXACT_THRESHOLD, hashes=None, registers=None):
+        self.p = p
+        self.exact_threshold = exact_threshold
+        self.hashes = hashes
+        self.registers = registers
+        if self.hashes is None and self.registers is None:
+            self.hashes = np.empty(0, dtype=np.uint64)
+        if self.hashes is not None and len(self.hashes) > exact_threshold:
+            self._promote()
+
+    @property
+    def is_exact(self):
+        return self.registers is None
+
+    @property
+    def relative_error(self):
+        return 0.0 if self.is_exact else standard_error(self.p)
+
+    def _promote(self):
+        self.registers = self._as_registers()
+        self.hashes = None
+
+    def merge(self, other):
+        if self.is_exact and other.is_exact:
+            return DistinctSketch(self.p, self.exact_threshold,
+                                  hashes=np.union1d(self.hashes, other.hashes))
+        return DistinctSketch(self.p, self.exact_threshold,
+                              registers=np.maximum(self._as_registers(), other._as_registers()))
+
+    def _as_registers(self):
+        if self.is_exact:
+            return _registers(np.zeros(len(self.hashes), dtype=np.int64), self.hashes, 1, self.p)[0]
+        return self.registers
+
+    def count(self):
+        if self.is_exact:
+            return len(self.hashes)
+        return int(round(_estimate(self.registers)))
+
+
+# Conjunto de sketches indexados por uma chave inteira ordenada (por exemplo, dia da venda)
+class SketchSet:
+    def __init__(self, keys, hashes, p, exact_threshold=EXACT_THRESHOLD):
+        self.p = p
+        self.exact_threshold = exact_threshold
+
+        # Deduplicar os pares (chave, hash) com uma única ordenação
+        order = np.lexsort((hashes, keys))
+        k = keys[order]
+        h = hashes[order]
+        novo = np.ones(len(k), dtype=bool)
+        novo[1:] = (k[1:] != k[:-1]) | (h[1:] != h[:-1])
+        k = k[novo]
+        h = h[novo]
+
+        self.keys, codes = np.unique(k, return_inverse=True)
+        counts = np.bincount(codes, minlength=len(self.keys))
+
+        # Chaves com muitos clientes viram HyperLogLog; as demais guardam os hashes exatos
+        usa_hll = counts > exact_threshold
+        self.hll_row = np.full(len(self.keys), -1, dtype=np.int64)
+        self.hll_row[usa_hll] = np.arange(int(usa_hll.sum()))
+        em_hll = usa_hll[codes]
+        self.registers = _registers(self.hll_row[codes[em_hll]], h[em_hll], int(usa_hll.sum()), p)
+
+        exact_counts = np.where(usa_hll, 0, counts)
+        self.offsets = np.concatenate([[0], np.cumsum(exact_counts)])
+        self.hashes = h[~em_hll]
+
+        # Registradores pré-agregados por bloco de chaves, para consultas de intervalos longos
+        n_blocks = len(self.keys) // BLOCK_SIZE
+        no_bloco = codes < n_blocks * BLOCK_SIZE
+        self.block_registers = _registers(codes[no_bloco] // BLOCK_SIZE, h[no_bloco], n_blocks, p)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Junta os sketches das posições [lo, hi) em um único DistinctSketch
+    def _merge_slice(self, lo, hi):
+        # Se a soma das contagens exatas é pequena, a união também é: mantém o resultado exato
+        if not (self.hll_row[lo:hi] >= 0).any() and self.offsets[hi] - self.offsets[lo] <= 16 * self.exact_threshold:
+            return DistinctSketch(self.p, self.exact_threshold,
+                                  hashes=np.unique(self.hashes[self.offsets[lo]:self.offsets[hi]]))
+
+        bloco_lo = -(-lo // BLOCK_SIZE)
+        bloco_hi = hi // BLOCK_SIZE
+        if bloco_lo < bloco_hi:
+            # Blocos completos vêm prontos; só as bordas são combinadas chave a chave
+            regs = self.block_registers[bloco_lo:bloco_hi].max(axis=0)
+            for borda_lo, borda_hi in ((lo, bloco_lo * BLOCK_SIZE), (bloco_hi * BLOCK_SIZE, hi)):
+                if borda_lo < borda_hi:
+                    regs = np.maximum(regs, self._merge_slice(borda_lo, borda_hi)._as_registers())
+            return DistinctSketch(self.p, self.exact_threshold, registers=regs)
+
+        exatos = self.hashes[self.offsets[lo]:self.offsets[hi]]
+        linhas = self.hll_row[lo:hi]
+        linhas = linhas[linhas >= 0]
+        if len(linhas) == 0:
+            return DistinctSketch(self.p, self.exact_threshold, hashes=np.unique(exatos))
+        regs = self.registers[linhas].max(axis=0)
+        if len(exatos):
+            regs = np.maximum(regs, DistinctSketch(self.p, self.exact_threshold, hashes=exatos)._as_registers())
+        return DistinctSketch(self.p, self.exact_threshold, registers=regs)
+
+    # Sketch combinado de todas as chaves no intervalo fechado [start, end]
+    def merge_range(self, start, end):
+        lo = np.searchsorted(self.keys, start, side='left')
+        hi = np.searchsorted(self.keys, end, side='right')
+        return self._merge_slice(lo, hi)
+
+    # Sketch combinado por período: period_of_key mapeia cada chave para um código de período
+    def merge_by(self, period_of_key):
+        period_of_key = np.asarray(period_of_key)
+        # As chaves estão ordenadas e os períodos são monotônicos, então cada período é uma fatia contígua
+        periodos, inicio = np.unique(period_of_key, return_index=True)
+        fim = np.append(inicio[1:], len(self.keys))
+        return {periodo: self._merge_slice(lo, hi) for periodo, lo, hi in zip(periodos, inicio, fim)}
+
+
+# Sketches de clientes distintos por dia e por dia de coorte (primeira compra)
+class CustomerSketchStore:
+    def __init__(self, customer_ids, days, erro_relativo=0.01, exact_threshold=EXACT_THRESHOLD):
+        self.p = precision_for_error(erro_relativo)
+        customer_ids = pd.Series(customer_ids).reset_index(drop=True)
+        days = np.asarray(days, dtype=np.int32)
+
+        valido = customer_ids.notna().to_numpy()
+        customer_ids = customer_ids[valido]
+        days = days[valido]
+
+        codes, uniques = pd.factorize(customer_ids)
+        hashes_clientes = hash_ids(uniques)
+        hashes = hashes_clientes[codes]
+
+        # Dia da primeira compra de cada cliente (dia de coorte)
+        primeiro_dia = np.full(len(uniques), np.iinfo(np.int32).max, dtype=np.int32)
+        np.minimum.at(primeiro_dia, codes, days)
+
+        self.daily = SketchSet(days, hashes, self.p, exact_threshold)
+        self.cohorts = SketchSet(primeiro_dia, hashes_clientes, self.p, exact_threshold)
+
+    @property
+    def standard_error(self):
+        return standard_error(self.p)
+
+    # Clientes únicos com compra entre start_day e end_day (inclusive)
+    def unique_customers(self, start_day, end_day):
+        return self.daily.merge_range(start_day, end_day)
+
+    # Clientes cuja primeira compra ocorreu entre start_day e end_day (inclusive)
+    def new_customers(self, start_day, end_day):
+        return self.cohorts.merge_range(start_day, end_day)
+
+    # Clientes únicos por período, dado um período para cada dia com venda
+    def unique_customers_by(self, period_of_day):
+        return {periodo: s.count() for periodo, s in self.daily.merge_by(period_of_day).items()}
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# Dias sem compra a partir dos quais o cliente é considerado perdido (churn)
+DEFAULT_INACTIVITY_DAYS = 180
+
+
+# Função para montar, a partir do resumo por cliente (Recency e T em dias, datas da primeira e última compra),
+# o tempo de vida de cada cliente e se o churn foi observado
+# Churn: última compra há mais de inactivity_days; o tempo de vida é da primeira à última compra
+# Clientes ainda ativos são censurados à direita: tempo de vida até o fim dos dados (T)
+def survival_arrays(summary, inactivity_days=DEFAULT_INACTIVITY_DAYS):
+    churn = summary['Recency'].to_numpy() > inactivity_days
+    vida_ativa = ((summary['LastPurchase'] - summary['FirstPurchase']).dt.days).to_numpy()
+    duracoes = np.where(churn, vida_ativa, summary['T'].to_numpy()).astype(np.int64)
+    return duracoes, churn
+
+
+# Estimador de Kaplan–Meier de uma população: contagem de eventos por tempo com arrays ordenados
+# e produto acumulado de (1 - eventos / em risco)
+def kaplan_meier(duracoes, eventos):
+    duracoes = np.asarray(duracoes, dtype=np.int64)
+    eventos = np.asarray(eventos, dtype=bool)
+    tempos, inverso, saidas = np.unique(duracoes, return_inverse=True, return_counts=True)
+    mortes = np.bincount(inverso, weights=eventos, minlength=len(tempos))
+    em_risco = len(duracoes) - np.concatenate([[0], np.cumsum(saidas)[:-1]])
+    return pd.DataFrame({
+        'Em Risco': em_risco,
+        'Churns': mortes.astype(np.int64),
+        'Sobrevivência': np.cumprod(1 - mortes / em_risco),
+    }, index=pd.Index(tempos, name='Dias'))
+
+
+# Curvas de Kaplan–Meier por grupo (coorte, segmento...), todas de uma vez: agregação por (grupo, tempo)
+# e somas/produtos acumulados dentro de cada grupo, sem laços por cliente ou por grupo
+def kaplan_meier_by_group(duracoes, eventos, grupos):
+    contagens = pd.DataFrame({
+        'Grupo': np.asarray(grupos),
+        'Dias': np.asarray(duracoes, dtype=np.int64),
+        'Churns': np.asarray(eventos, dtype=np.int64),
+    }).groupby(['Grupo', 'Dias'], sort=True, observed=True)['Churns'].agg(['size', 'sum'])
+    por_grupo = contagens.groupby(level='Grupo', observed=True)
+    em_risco = por_grupo['size'].transform('sum') - por_grupo['size'].cumsum() + contagens['size']
+    curvas = pd.DataFrame({'Em Risco': em_risco, 'Churns': contagens['sum']})
+    curvas['Sobrevivência'] = (1 - curvas['Churns'] / curvas['Em Risco']).groupby(level='Grupo', observed=True).cumprod()
+    return curvas
+
+
+# Sobrevivência de cada curva nos dias pedidos (função escada: último valor com tempo <= dia)
+def survival_at(curvas, dias):
+    dias = np.asarray(dias)
+    if 'Grupo' not in (curvas.index.names or []):
+        curvas = pd.concat({'Todos': curvas}, names=['Grupo'])
+    linhas = {}
+    for grupo, curva in curvas['Sobrevivência'].groupby(level='Grupo', observed=True, sort=False):
+        tempos = curva.index.get_level_values('Dias').to_numpy()
+        posicao = np.searchsorted(tempos, dias, side='right') - 1
+        valores = np.where(posicao >= 0, curva.to_numpy()[np.maximum(posicao, 0)], 1.0)
+        linhas[grupo] = valores
+    return pd.DataFrame.from_dict(linhas, orient='index', columns=list(dias))
+
+
+# Tempo de vida mediano de cada curva (primeiro tempo com sobrevivência <= 50%; NaN se não for atingido)
+def median_survival(curvas):
+    abaixo = curvas[curvas['Sobrevivência'] <= 0.5]
+    if 'Grupo' not in (curvas.index.names or []):
+        return abaixo.index[0] if len(abaixo) else np.nan
+    medianas = abaixo.reset_index().groupby('Grupo', observed=True)['Dias'].min()
+    return medianas.reindex(curvas.index.get_level_values('Grupo').unique())
@@ -0,0 +1,78 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backends import DATA, ID, VALOR, PandasBackend
+
+pytest.importorskip('polars')
+from backends import PolarsBackend  # noqa: E402
+
+INICIO = datetime.date(2021, 3, 1)
+FIM = datetime.date(2023, 10, 31)
+
+
+# Vendas sintéticas com IDs ausentes e vazios, várias compras no mesmo dia e datas com horário
+@pytest.fixture(scope='module')
+def vendas():
+    rng = np.random.default_rng(42)
+    n = 5000
+    ids = pd.Series('C' + pd.Series(rng.integers(0, 600, n)).astype(str), dtype=object)
+    ids[rng.random(n) < 0.03] = None
+    ids[rng.random(n) < 0.02] = ''
+    datas = (pd.Timestamp('2021-01-01') + pd.to_timedelta(rng.integers(0, 1200, n), unit='D')
+             + pd.to_timedelta(rng.choice([0, 9, 15], n), unit='h'))
+    return pd.DataFrame({ID: ids, DATA: datas, VALOR: rng.gamma(2, 50, n).round(2)})
+
+
+@pytest.fixture(scope='module')
+def motores():
+    return PandasBackend(), PolarsBackend()
+
+
+def test_customer_totals(vendas, motores):
+    pandas_backend, polars_backend = motores
+    esperado = pandas_backend.customer_totals(vendas, INICIO, FIM).sort_index()
+    obtido = polars_backend.customer_totals(vendas, INICIO, FIM).sort_index()
+    assert list(obtido.index) == list(esperado.index)
+    np.testing.assert_allclose(obtido['Receita'], esperado['Receita'])
+    np.testing.assert_array_equal(obtido['Transacoes'], esperado['Transacoes'])
+
+
+# Primeira compra: receita "Novo" de cada dia é a das vendas no instante da primeira compra de cada cliente
+def test_first_purchase(vendas, motores):
+    pandas_backend, polars_backend = motores
+    filtrado = vendas[(vendas[DATA].dt.date >= INICIO) & (vendas[DATA].dt.date <= FIM)]
+    primeira = filtrado.groupby(ID)[DATA].transform('min')
+    novos = filtrado[filtrado[DATA] == primeira].groupby(filtrado[DATA].dt.normalize())[VALOR].sum()
+    for backend in motores:
+        obtido = backend.sales_by_customer_type(vendas, INICIO, FIM, 'D')['Novo']
+        np.testing.assert_allclose(obtido[obtido > 0], novos.reindex(obtido[obtido > 0].index))
+        assert obtido.sum() == pytest.approx(novos.sum())
+
+
+@pytest.mark.parametrize('freq', ['D', 'W', 'M', 'Q', 'Y'])
+def test_sales_by_customer_type(vendas, motores, freq):
+    pandas_backend, polars_backend = motores
+    esperado = pandas_backend.sales_by_customer_type(vendas, INICIO, FIM, freq)
+    obtido = polars_backend.sales_by_customer_type(vendas, INICIO, FIM, freq)
+    # Os dois incluem os períodos sem vendas (zerados) entre o primeiro e o último
+    if freq == 'D':
+        assert (esperado.sum(axis=1) == 0).any()
+    assert list(obtido.columns) == ['Novo', 'Recorrente']
+    pd.testing.assert_index_equal(obtido.index, esperado.index, check_names=False)
+    np.testing.assert_allclose(obtido.to_numpy(), esperado.to_numpy())
+
+
+# A conversão para o Polars é feita uma vez por chave e reaproveitada
+def test_polars_frame_cache(vendas):
+    backend = PolarsBackend(max_frames=1)
+    primeiro = backend.customer_totals(vendas, INICIO, FIM, key='a')
+    quadro = backend._frames['a']
+    segundo = backend.customer_totals(vendas, INICIO, FIM, key='a')
+    assert backend._frames['a'] is quadro
+    pd.testing.assert_frame_equal(primeiro, segundo)
+
+    backend.customer_totals(vendas, INICIO, FIM, key='b')
+    assert list(backend._frames) == ['b']
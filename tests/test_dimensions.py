@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dimensions import DimensionCube
+from period_comparison import daily_frame
+from sketches import CustomerSketchStore
+
+FILTROS = {'loja': ['A', 'C'], 'canal': ['web']}
+
+
+@pytest.fixture(scope='module')
+def vendas():
+    rng = np.random.default_rng(3)
+    n = 6000
+    ids = pd.Series('C' + pd.Series(rng.integers(0, 800, n)).astype(str), dtype=object)
+    ids[rng.random(n) < 0.03] = None
+    datas = (pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 500, n), unit='D')
+             + pd.to_timedelta(rng.choice([0, 10], n), unit='h'))
+    return pd.DataFrame({
+        'cliente': ids,
+        'data': datas,
+        'valor': rng.gamma(2, 30, n).round(2),
+        'loja': rng.choice(['A', 'B', 'C', None], n),
+        'canal': rng.choice(['web', 'loja'], n),
+    })
+
+
+@pytest.fixture(scope='module')
+def cubo(vendas):
+    dias = vendas['data'].values.astype('datetime64[D]').astype(np.int64)
+    return DimensionCube(vendas[['loja', 'canal']], vendas['cliente'], dias, vendas['valor'])
+
+
+# Os filtros respondidos pelo cubo coincidem com o recálculo sobre as vendas filtradas
+def test_filtered_views_match_raw(vendas, cubo):
+    filtrado = vendas[cubo.row_mask(FILTROS)]
+    inicio, fim = 19100, 19300
+    dias = filtrado['data'].values.astype('datetime64[D]').astype(np.int64)
+    no_intervalo = (dias >= inicio) & (dias <= fim)
+
+    esperado = daily_frame(filtrado['cliente'][no_intervalo], filtrado['data'][no_intervalo],
+                           filtrado['valor'][no_intervalo])
+    obtido = cubo.daily_frame(FILTROS, inicio, fim)
+    pd.testing.assert_frame_equal(obtido, esperado[obtido.columns], check_dtype=False)
+
+    bruto = CustomerSketchStore(filtrado['cliente'], dias)
+    sketches = cubo.customer_sketches(FILTROS)
+    assert sketches.unique_customers(inicio, fim).count() == bruto.unique_customers(inicio, fim).count()
+    assert sketches.new_customers(inicio, fim).count() == bruto.new_customers(inicio, fim).count()
+    assert sketches.new_customers(inicio, fim).is_exact
+
+
+def test_empty_selection(cubo):
+    assert cubo.daily_frame({'loja': ['inexistente']}, 0, 10 ** 6) is None
+    assert cubo.customer_sketches({'loja': ['inexistente']}).unique_customers(0, 10 ** 6).count() == 0
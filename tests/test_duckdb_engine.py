@@ -0,0 +1,118 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backends import DATA, ID, VALOR, PandasBackend
+from cohort_engine import cohort_matrices
+from customer_index import CustomerIndex
+from ingestion import parse_dates
+
+duckdb_engine = pytest.importorskip('duckdb_engine')
+
+INICIO = datetime.date(2022, 2, 1)
+FIM = datetime.date(2023, 11, 30)
+
+
+# CSV de vendas com datas dd/mm/aaaa (com e sem horário, dias <= 12 ambíguos), datas inválidas e IDs ausentes
+@pytest.fixture(scope='module')
+def arquivo(tmp_path_factory):
+    rng = np.random.default_rng(7)
+    n = 4000
+    ids = pd.Series('C' + pd.Series(rng.integers(0, 400, n)).astype(str), dtype=object)
+    ids[rng.random(n) < 0.03] = None
+    datas = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 730, n), unit='D')
+    texto = pd.Series(datas.strftime('%d/%m/%Y'))
+    com_horario = rng.random(n) < 0.3
+    texto[com_horario] = texto[com_horario] + ' ' + pd.Series(rng.choice(['09:30', '18:05'], n))[com_horario]
+    texto[rng.random(n) < 0.01] = '31/02/2023'
+    texto[rng.random(n) < 0.01] = 'sem data'
+    vendas = pd.DataFrame({'cliente': ids, 'data': texto, 'valor': rng.gamma(2, 40, n).round(2)})
+    caminho = tmp_path_factory.mktemp('vendas') / 'vendas.csv'
+    vendas.to_csv(caminho, index=False)
+    return str(caminho)
+
+
+# Caminho pandas do app: leitura, conversão de datas e descarte das datas inválidas
+@pytest.fixture(scope='module')
+def vendas(arquivo):
+    df = pd.read_csv(arquivo).rename(columns={'cliente': ID, 'data': DATA, 'valor': VALOR})
+    df[DATA] = parse_dates(df[DATA])
+    return df.dropna(subset=[DATA]).reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def filtrado(vendas):
+    datas = vendas[DATA].dt.date
+    return vendas[(datas >= INICIO) & (datas <= FIM)]
+
+
+@pytest.fixture(scope='module')
+def motor(arquivo):
+    motor = duckdb_engine.DuckDBEngine(arquivo, threads=2)
+    motor.prepare('cliente', 'data', '"valor"')
+    return motor
+
+
+def test_date_parsing(arquivo, vendas, motor):
+    linhas = len(pd.read_csv(arquivo))
+    quality = motor.quality_report('data')
+    assert quality['datas_invalidas'] == linhas - len(vendas)
+    assert motor.date_bounds('data') == (vendas[DATA].min().date(), vendas[DATA].max().date())
+    # 05/03/2022 é 5 de março (dd/mm), não 3 de maio
+    assert motor.con.execute("SELECT count(*) FROM vendas WHERE month(data) = 5 AND day(data) = 3").fetchone()[0] == \
+        int(((vendas[DATA].dt.month == 5) & (vendas[DATA].dt.day == 3)).sum())
+
+
+def test_key_metrics(vendas, filtrado, motor):
+    metricas = motor.key_metrics(INICIO, FIM)
+    totais = PandasBackend().customer_totals(vendas, INICIO, FIM)
+    primeiras = vendas.groupby(ID)[DATA].min().dt.date
+    esperado = {
+        'receita_total': filtrado[VALOR].sum(),
+        'numero_total_vendas': len(filtrado),
+        'clientes_unicos': filtrado[ID].nunique(),
+        'novos_clientes': int(((primeiras >= INICIO) & (primeiras <= FIM)).sum()),
+        'ticket_medio': filtrado[VALOR].sum() / len(filtrado),
+        'receita_media_cliente': totais['Receita'].mean(),
+        'receita_mediana_cliente': totais['Receita'].median(),
+        'numero_medio_transacoes': totais['Transacoes'].mean(),
+        'numero_mediano_transacoes': totais['Transacoes'].median(),
+    }
+    for chave, valor in esperado.items():
+        assert metricas[chave] == pytest.approx(valor), chave
+
+
+@pytest.mark.parametrize('period', ['D', 'W', 'M', 'Q', 'Y'])
+def test_new_vs_recurring(vendas, motor, period):
+    esperado = PandasBackend().sales_by_customer_type(vendas, INICIO, FIM, period)
+    obtido = motor.new_vs_recurring(INICIO, FIM, period)
+    pd.testing.assert_frame_equal(obtido, esperado, check_names=False, check_freq=False, check_dtype=False)
+
+
+@pytest.mark.parametrize('period', ['D', 'W', 'M', 'Q', 'Y'])
+def test_cohort_matrices(filtrado, motor, period):
+    esperado = cohort_matrices(filtrado[ID], filtrado[DATA], filtrado[VALOR], period)
+    obtido = motor.cohort_matrices(INICIO, FIM, period)
+    assert obtido.keys() == esperado.keys()
+    for chave in esperado:
+        if isinstance(esperado[chave], pd.DataFrame):
+            pd.testing.assert_frame_equal(obtido[chave], esperado[chave], check_dtype=False, obj=chave)
+        else:
+            pd.testing.assert_series_equal(obtido[chave], esperado[chave], check_dtype=False, obj=chave)
+
+
+def test_rfm(filtrado, motor):
+    esperado = CustomerIndex(filtrado[ID], filtrado[DATA], filtrado[VALOR]).rfm().sort_index()
+    obtido = motor.rfm(INICIO, FIM).sort_index()
+    pd.testing.assert_frame_equal(obtido[esperado.columns], esperado, check_dtype=False)
+
+
+# Configurações vindas do ambiente vão para o connect, sem interpolação em SQL
+def test_settings_are_not_interpolated(arquivo, tmp_path):
+    pasta = tmp_path / "spill'; SELECT 1; --"
+    motor = duckdb_engine.DuckDBEngine(arquivo, threads=1, memory_limit='512MB', temp_directory=str(pasta))
+    assert motor.con.execute("SELECT current_setting('temp_directory')").fetchone()[0] == str(pasta)
+    with pytest.raises(Exception):
+        duckdb_engine.DuckDBEngine(arquivo, memory_limit="1GB'; SELECT 1; --")
@@ -0,0 +1,25 @@
+import threading
+import time
+
+import pytest
+
+from job_runner import Job, JobCancelled
+
+
+# Um trabalho cancelado no meio de uma etapa faz a espera pelas etapas seguintes falhar na hora, sem girar
+def test_wait_on_cancelled_job():
+    liberar = threading.Event()
+    trabalho = Job('k', [('a', "A", lambda r: liberar.wait(5)), ('b', "B", lambda r: 2)])
+    thread = threading.Thread(target=trabalho.run)
+    thread.start()
+    while trabalho.current != 'a':
+        time.sleep(0.01)
+    trabalho.cancel()
+    inicio = time.monotonic()
+    with pytest.raises(JobCancelled):
+        trabalho.wait('b', timeout=5)
+    assert time.monotonic() - inicio < 1
+    liberar.set()
+    thread.join(5)
+    assert trabalho.done and 'b' not in trabalho.results
+    assert trabalho.wait('a')
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from resource_manager import ResourceManager
+
+
+# Verifica, de outra thread, se a trava do gerenciador está livre
+def lock_is_free(gerenciador):
+    livre = threading.Event()
+    thread = threading.Thread(target=lambda: (gerenciador.status(), livre.set()), daemon=True)
+    thread.start()
+    thread.join(2)
+    return livre.is_set()
+
+
+@pytest.fixture
+def quadro():
+    return pd.DataFrame({'ID do Cliente': [f'C{i}' for i in range(20000)], 'Valor da Venda': range(20000)})
+
+
+# A descarga vai para Parquet e o on_evict roda fora da trava
+def test_spill_outside_lock(tmp_path, quadro):
+    avisos = []
+    gerenciador = ResourceManager(budget_bytes=1, spill_dir=str(tmp_path),
+                                  on_evict=lambda sessao: avisos.append((sessao, lock_is_free(gerenciador))))
+    gerenciador.store('a', 'k', quadro)
+    gerenciador.store('b', 'k', quadro.copy())
+    assert avisos == [('a', True)]
+    assert [p.suffix for p in tmp_path.iterdir()] == ['.parquet']
+    pd.testing.assert_frame_equal(gerenciador.load('a', 'k'), quadro)
+    assert gerenciador.status()['sessoes_em_disco'] == 1
+
+
+# Colunas que o Arrow não representa (tipos misturados) são descarregadas com pickle
+def test_spill_mixed_types(tmp_path):
+    misturado = pd.DataFrame({'ID do Cliente': ['C1', 2, 3.5] * 100})
+    gerenciador = ResourceManager(budget_bytes=1, spill_dir=str(tmp_path))
+    gerenciador.store('a', 'k', misturado)
+    gerenciador.store('b', 'k', misturado.copy())
+    assert [p.suffix for p in tmp_path.iterdir()] == ['.pkl']
+    pd.testing.assert_frame_equal(gerenciador.load('a', 'k'), misturado)
+
+
+# on_wait é chamado com a trava livre enquanto a análise espera na fila
+def test_on_wait_outside_lock(tmp_path):
+    gerenciador = ResourceManager(max_concurrent=1, spill_dir=str(tmp_path))
+    chamadas = []
+
+    def esperar():
+        with gerenciador.admit('b', 0, on_wait=lambda posicao, _: chamadas.append(lock_is_free(gerenciador))):
+            pass
+
+    with gerenciador.admit('a', 0):
+        thread = threading.Thread(target=esperar)
+        thread.start()
+        time.sleep(1.0)
+    thread.join(5)
+    assert chamadas and all(chamadas)
+    assert gerenciador.status()['analises_em_andamento'] == 0
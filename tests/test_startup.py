@@ -0,0 +1,30 @@
+import ast
+import os
+
+import pytest
+
+from measure_startup import LIMITS, STAGES, measure
+
+pytest.importorskip('streamlit')
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# A tela de lead só importa o Streamlit e a biblioteca padrão no nível do módulo (a análise é importada sob demanda)
+def test_lead_screen_imports():
+    with open(os.path.join(RAIZ, 'app.py'), encoding='utf-8') as arquivo:
+        arvore = ast.parse(arquivo.read())
+    modulos = set()
+    for no in arvore.body:
+        if isinstance(no, ast.Import):
+            modulos.update(alias.name.split('.')[0] for alias in no.names)
+        elif isinstance(no, ast.ImportFrom):
+            modulos.add(no.module.split('.')[0])
+    assert modulos <= {'streamlit', 'datetime', 'os', 'threading'}
+
+
+# Tempo de importação de cada tela, em um interpretador novo, dentro do limite de measure_startup.LIMITS
+@pytest.mark.parametrize('etapa', list(STAGES))
+def test_import_time(etapa):
+    total, lentos = measure(STAGES[etapa], top=5)
+    assert total <= LIMITS[etapa], f"{etapa}: {total:.2f}s (mais lentos: {lentos})"
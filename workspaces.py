@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import pickle
+import secrets
+import shutil
+import threading
+import time
+import uuid
+
+# Pasta padrão dos espaços de trabalho (uma subpasta por lead, uma por espaço)
+DEFAULT_ROOT = os.path.join(os.path.expanduser('~'), '.ferramenta_analise', 'espacos')
+
+# Arquivos de cada espaço: metadados, dados em colunas (Arrow IPC sem compressão, lido com memory map),
+# resultados calculados (pickle) e gráficos já serializados (JSON do Plotly)
+METADATA_FILE = 'espaco.json'
+DATASET_FILE = 'dados.arrow'
+RESULTS_FILE = 'resultados.pkl'
+FIGURES_FILE = 'graficos.json'
+
+
+# Chave de acesso aos espaços de trabalho: segredo aleatório gerado por navegador (não deriva de dados do lead)
+ACCESS_TOKEN_BYTES = 24
+ACCESS_TOKEN_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_')
+
+
+def new_access_token():
+    return secrets.token_urlsafe(ACCESS_TOKEN_BYTES)
+
+
+# Aceita só chaves com o tamanho e o alfabeto das geradas aqui (chaves curtas seriam fáceis de adivinhar)
+def valid_access_token(token):
+    return (isinstance(token, str) and len(token) >= len(new_access_token())
+            and set(token) <= ACCESS_TOKEN_CHARS)
+
+
+# Identificador da pasta do dono (hash da chave de acesso, para a chave não aparecer no caminho)
+def owner_key(token):
+    if not valid_access_token(token):
+        raise ValueError("Chave de acesso inválida.")
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+
+# Função para converter o DataFrame em tabela Arrow; colunas de texto com tipos misturados viram texto
+def _to_arrow(df):
+    import pyarrow as pa
+
+    colunas = {}
+    for coluna in df.columns:
+        try:
+            colunas[str(coluna)] = pa.array(df[coluna], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            colunas[str(coluna)] = pa.array(df[coluna].astype('string'), from_pandas=True)
+    return pa.table(colunas)
+
+
+# Espaço de trabalho salvo: dados, mapeamento de colunas, resultados e gráficos de uma análise
+class Workspace:
+    def __init__(self, path, metadata):
+        self.path = path
+        self.metadata = metadata
+
+    @property
+    def id(self):
+        return self.metadata['id']
+
+    @property
+    def name(self):
+        return self.metadata['nome']
+
+    @property
+    def size_bytes(self):
+        return self.metadata['bytes']
+
+    # Dados com memory map: as colunas numéricas são lidas do cache de páginas do sistema, sem cópia na leitura
+    def load_dataset(self):
+        import pyarrow.feather as feather
+
+        tabela = feather.read_table(os.path.join(self.path, DATASET_FILE), memory_map=True)
+        return tabela.to_pandas(split_blocks=True)
+
+    # Resultados calculados guardados no espaço (dicionário vazio se não houver)
+    def load_results(self):
+        caminho = os.path.join(self.path, RESULTS_FILE)
+        if not os.path.exists(caminho):
+            return {}
+        with open(caminho, 'rb') as arquivo:
+            return pickle.load(arquivo)
+
+    # Gráficos serializados guardados no espaço ({chave: JSON})
+    def load_figures(self):
+        caminho = os.path.join(self.path, FIGURES_FILE)
+        if not os.path.exists(caminho):
+            return {}
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+
+
+# Armazenamento dos espaços de trabalho em disco local, com cota por lead e cota total
+# Quando uma cota é excedida, os espaços abertos há mais tempo são apagados primeiro (LRU)
+class WorkspaceStore:
+    def __init__(self, root=None, owner_quota_bytes=2 * 1024 ** 3, total_quota_bytes=20 * 1024 ** 3):
+        self.root = root or DEFAULT_ROOT
+        self.owner_quota_bytes = int(owner_quota_bytes)
+        self.total_quota_bytes = int(total_quota_bytes)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # Espaços do lead, do aberto mais recentemente para o mais antigo
+    def list(self, owner):
+        pasta = os.path.join(self.root, owner)
+        if not os.path.isdir(pasta):
+            return []
+        espacos = []
+        for nome in os.listdir(pasta):
+            # Pastas temporárias de gravações em andamento ou interrompidas
+            if nome.startswith('.'):
+                continue
+            caminho = os.path.join(pasta, nome)
+            try:
+                with open(os.path.join(caminho, METADATA_FILE), encoding='utf-8') as arquivo:
+                    espacos.append(Workspace(caminho, json.load(arquivo)))
+            except (OSError, ValueError):
+                continue
+        return sorted(espacos, key=lambda e: -e.metadata['ultimo_acesso'])
+
+    # Abre um espaço (e atualiza o último acesso, usado na limpeza LRU)
+    def open(self, owner, workspace_id):
+        for espaco in self.list(owner):
+            if espaco.id == workspace_id:
+                espaco.metadata['ultimo_acesso'] = time.time()
+                self._write_metadata(espaco.path, espaco.metadata)
+                return espaco
+        return None
+
+    # Grava um espaço; um espaço com o mesmo nome do mesmo lead é substituído
+    # Devolve o espaço gravado ou levanta ValueError se ele sozinho passa da cota do lead
+    def save(self, owner, name, df, metadata, results=None, figures=None, workspace_id=None):
+        import pyarrow.feather as feather
+
+        workspace_id = workspace_id or uuid.uuid4().hex
+        pasta = os.path.join(self.root, owner)
+        os.makedirs(pasta, exist_ok=True)
+
+        # Gravação em uma pasta temporária e renomeação no final: um espaço nunca fica pela metade
+        temporaria = os.path.join(pasta, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(temporaria)
+        try:
+            feather.write_feather(_to_arrow(df), os.path.join(temporaria, DATASET_FILE), compression='uncompressed')
+            if results:
+                with open(os.path.join(temporaria, RESULTS_FILE), 'wb') as arquivo:
+                    pickle.dump(results, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            if figures:
+                with open(os.path.join(temporaria, FIGURES_FILE), 'w', encoding='utf-8') as arquivo:
+                    json.dump(figures, arquivo)
+            tamanho = sum(os.path.getsize(os.path.join(temporaria, f)) for f in os.listdir(temporaria))
+            if tamanho > self.owner_quota_bytes:
+                raise ValueError(f"O espaço de trabalho ocupa {tamanho / 1024 ** 2:.0f} MB, acima da cota de "
+                                 f"{self.owner_quota_bytes / 1024 ** 2:.0f} MB por usuário.")
+            agora = time.time()
+            metadata = dict(metadata, id=workspace_id, nome=name, bytes=tamanho, criado_em=agora, ultimo_acesso=agora)
+            self._write_metadata(temporaria, metadata)
+        except Exception:
+            shutil.rmtree(temporaria, ignore_errors=True)
+            raise
+
+        with self._lock:
+            for anterior in self.list(owner):
+                if anterior.name == name:
+                    shutil.rmtree(anterior.path, ignore_errors=True)
+            destino = os.path.join(pasta, workspace_id)
+            os.replace(temporaria, destino)
+            self._enforce_quotas(owner, manter=workspace_id)
+        return Workspace(destino, metadata)
+
+    def delete(self, owner, workspace_id):
+        with self._lock:
+            for espaco in self.list(owner):
+                if espaco.id == workspace_id:
+                    shutil.rmtree(espaco.path, ignore_errors=True)
+
+    # Apaga os espaços menos usados recentemente até o lead e o armazenamento caberem nas cotas
+    def _enforce_quotas(self, owner, manter):
+        do_lead = [e for e in self.list(owner) if e.id != manter]
+        ocupado = sum(e.size_bytes for e in self.list(owner))
+        for espaco in sorted(do_lead, key=lambda e: e.metadata['ultimo_acesso']):
+            if ocupado <= self.owner_quota_bytes:
+                break
+            shutil.rmtree(espaco.path, ignore_errors=True)
+            ocupado -= espaco.size_bytes
+
+        todos = [e for lead in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, lead))
+                 for e in self.list(lead)]
+        ocupado = sum(e.size_bytes for e in todos)
+        for espaco in sorted(todos, key=lambda e: e.metadata['ultimo_acesso']):
+            if ocupado <= self.total_quota_bytes:
+                break
+            if espaco.id == manter:
+                continue
+            shutil.rmtree(espaco.path, ignore_errors=True)
+            ocupado -= espaco.size_bytes
+
+    def _write_metadata(self, pasta, metadata):
+        temporario = os.path.join(pasta, f".{METADATA_FILE}.tmp")
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(metadata, arquivo, ensure_ascii=False, indent=2, default=str)
+        os.replace(temporario, os.path.join(pasta, METADATA_FILE))